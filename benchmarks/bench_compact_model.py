@@ -0,0 +1,93 @@
+"""Compare the joblib pickle of the engagement model with its compact .npz export:
+artifact size, cold load time, per-title latency and agreement.
+
+    python benchmarks/bench_compact_model.py [--model models/engagement_predictor.pkl]
+                                             [--rows 100000] [--titles 2000]
+
+Without --model, a TF-IDF model is fitted on synthetic titles with a Zipf-like
+vocabulary of 30k words first. Cold loads run in a fresh interpreter and
+include the imports the loader needs.
+"""
+import sys
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from benchmarks.synthetic import synthetic_titles
+from pipeline.model_training import make_tfidf_pipeline
+from pipeline.compact_scorer import CompactScorer, compact_path, export_compact, max_deviation
+
+LOADERS = {
+    'pickle': "import joblib; joblib.load({path!r})",
+    'npz': "from pipeline.compact_scorer import CompactScorer; CompactScorer({path!r})",
+}
+
+
+def synthetic_model(path: str, rows: int):
+    titles = synthetic_titles(rows)
+    rng = np.random.default_rng(1)
+    signal = np.array([len(t) for t in titles]) > 40
+    y = (rng.random(rows) < np.where(signal, 0.6, 0.2)).astype(int)
+    joblib.dump(make_tfidf_pipeline().fit(titles, y), path)
+
+
+def cold_load(kind: str, path: str, repeats: int = 3):
+    code = f"import sys, time; sys.path.append({str(project_root)!r}); t = time.perf_counter(); " \
+           f"{LOADERS[kind].format(path=path)}; print(time.perf_counter() - t)"
+    return min(
+        float(subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout.split()[-1])
+        for _ in range(repeats)
+    )
+
+
+def latency(model, titles):
+    start = time.perf_counter()
+    for title in titles:
+        model.predict_proba([title])
+    single = (time.perf_counter() - start) / len(titles)
+    start = time.perf_counter()
+    model.predict_proba(titles)
+    batch = (time.perf_counter() - start) / len(titles)
+    return single, batch
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model')
+    parser.add_argument('--rows', type=int, default=100_000, help='synthetic training rows')
+    parser.add_argument('--titles', type=int, default=2000, help='titles scored for latency')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model_path = args.model or os.path.join(tmp, 'model.pkl')
+        if not args.model:
+            synthetic_model(model_path, args.rows)
+        npz_path = compact_path(model_path)
+        if not os.path.exists(npz_path):
+            npz_path = os.path.join(tmp, 'model.npz')
+            export_compact(joblib.load(model_path), npz_path)
+
+        pipeline = joblib.load(model_path)
+        scorer = CompactScorer(npz_path)
+        titles = synthetic_titles(args.titles, seed=7)
+
+        print(f"vocabulary: {len(pipeline.named_steps['tfidf'].vocabulary_):,} terms, "
+              f"{len(scorer.terms):,} kept in the compact artifact")
+        print(f"max probability deviation over {len(titles)} titles: {max_deviation(pipeline, npz_path, titles):.1e}")
+        for kind, path, model in (('pickle', model_path, pipeline), ('npz', npz_path, scorer)):
+            single, batch = latency(model, titles)
+            print(f"{kind:>7}: {os.path.getsize(path) / 1024:8.0f} KB  cold load {cold_load(kind, path) * 1000:7.1f} ms  "
+                  f"{single * 1e6:7.0f} us/title single  {batch * 1e6:6.1f} us/title batched")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Benchmark pipeline.counts.parse_counts against the row-by-row converters it
+replaced (tests/test_counts.py checks it against them and a scalar reference).
+
+    python benchmarks/bench_counts.py [--rows 10000000]
+"""
+import sys
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from benchmarks.synthetic import synthetic_counts
+from pipeline.counts import parse_counts
+
+
+# The three .apply converters parse_counts replaced, as they were written
+def legacy_storage(x):
+    # store_raw_data_to_db lambda; raised on "1.2K"/"3,400"/blanks, mapped to 0 here so it can run
+    try:
+        return int(float(str(x).replace('k', '')) * 1000 if 'k' in str(x).lower() else int(x))
+    except Exception:
+        return 0
+
+
+def legacy_transform(value):
+    # data_transformation.convert_claps
+    if isinstance(value, str) and 'k' in value.lower():
+        return int(float(value.lower().replace('k', '')) * 1000)
+    try:
+        return int(value)
+    except:
+        return 0
+
+
+def legacy_frontend(clap_str):
+    # frontend/app.convert_claps (truncated "1.2K" to 1000)
+    if isinstance(clap_str, (int, float)):
+        return int(clap_str)
+    clap_str = str(clap_str).upper().replace(',', '')
+    if 'K' in clap_str:
+        return int(float(clap_str.replace('K', ''))) * 1000
+    try:
+        return int(clap_str)
+    except:
+        return 0
+
+
+def bench(rows: int, seed: int):
+    values = synthetic_counts(rows, np.random.default_rng(seed))
+    print(f"benchmark: {rows:,} synthetic values")
+
+    timings = {}
+    for name, fn in (('storage .apply', legacy_storage),
+                     ('transform .apply', legacy_transform),
+                     ('frontend .apply', legacy_frontend)):
+        start = time.perf_counter()
+        values.apply(fn)
+        timings[name] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    parse_counts(values)
+    timings['parse_counts'] = time.perf_counter() - start
+
+    for name, seconds in timings.items():
+        speedup = timings['parse_counts'] and seconds / timings['parse_counts']
+        print(f"{name:>17}: {seconds:7.2f}s  {rows / seconds / 1e6:6.2f}M values/s  ({speedup:.1f}x parse_counts)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    bench(args.rows, args.seed)
+
+
+if __name__ == '__main__':
+    main()
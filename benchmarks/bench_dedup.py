@@ -0,0 +1,141 @@
+"""Near-duplicate title removal (pipeline/dedup.py) on synthetic titles.
+
+    python benchmarks/bench_dedup.py [--rows 1000000] [--dup-rate 0.1] [--new-fraction 0.1]
+
+Distinct synthetic titles get --dup-rate extra copies of random other rows,
+injected as exact copies, re-cased/re-punctuated copies or copies with one
+word appended. Reports the runtime at rows/10 and rows, the duplicate rate
+found, recall per kind of copy, flags outside the injected pairs, and the
+runtime of checking a new chunk against the saved signature index. An
+all-pairs Jaccard comparison is timed on a sample and extrapolated for scale.
+"""
+import sys
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from benchmarks.synthetic import synthetic_titles, vocabulary
+from pipeline.dedup import SHINGLES, SignatureIndex, near_duplicates
+from pipeline.text import preprocess
+from config import DEDUP_CONFIG
+
+KINDS = ['exact', 'recased', 'appended']
+
+
+def distinct_titles(rows: int, seed: int = 0):
+    titles = pd.Series(synthetic_titles(int(rows * 1.5), seed))
+    normalised = titles.map(lambda t: ' '.join(preprocess(t).split()))
+    return titles[~normalised.duplicated()].head(rows).tolist()
+
+
+def with_duplicates(rows: int, dup_rate: float, seed: int = 0) -> pd.DataFrame:
+    """`rows` titles, the last rows * dup_rate of which copy an earlier one"""
+    rng = np.random.default_rng(seed)
+    n_dup = int(rows * dup_rate)
+    titles = distinct_titles(rows - n_dup, seed)
+    n_distinct = len(titles)
+    sources = rng.integers(0, len(titles), n_dup)
+    kinds = rng.integers(0, len(KINDS), n_dup)
+    words = vocabulary()
+    for source, kind in zip(sources, kinds):
+        title = titles[source]
+        if KINDS[kind] == 'recased':
+            title = title.upper().replace('!', '?')
+        elif KINDS[kind] == 'appended':
+            title = f"{title[:-1]} {words[rng.integers(len(words))]}!"
+        titles.append(title)
+    return pd.DataFrame({
+        'id': np.arange(1, len(titles) + 1),
+        'title': titles,
+        'claps': np.floor(rng.pareto(1.1, len(titles)) * 40),
+        'source_id': np.concatenate([np.zeros(n_distinct, dtype=int), sources + 1]),
+        'kind': np.concatenate([np.full(n_distinct, -1), kinds])
+    })
+
+
+def timed(df, index=None):
+    start = time.perf_counter()
+    kept, signatures, shingles = near_duplicates(df, index)
+    return kept, signatures, shingles, time.perf_counter() - start
+
+
+def jaccard(titles_a, titles_b) -> np.ndarray:
+    a, b = SHINGLES.transform(titles_a), SHINGLES.transform(titles_b)
+    both = np.asarray(a.multiply(b).sum(axis=1)).ravel()
+    return both / (np.asarray(a.sum(axis=1)).ravel() + np.asarray(b.sum(axis=1)).ravel() - both)
+
+
+def pairwise_seconds(titles, sample: int = 5000) -> float:
+    """Exact all-pairs Jaccard over `sample` titles, extrapolated quadratically to len(titles)"""
+    shingles = SHINGLES.transform(titles[:sample]).tocsr()
+    start = time.perf_counter()
+    intersection = (shingles @ shingles.T).toarray()
+    sizes = np.asarray(shingles.sum(axis=1)).ravel()
+    _ = intersection / (sizes[:, None] + sizes[None, :] - intersection + 1e-9) >= 0.8
+    return (time.perf_counter() - start) * (len(titles) / sample) ** 2
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--dup-rate', type=float, default=0.1)
+    parser.add_argument('--new-fraction', type=float, default=0.1)
+    args = parser.parse_args()
+
+    # Shuffled so copies are spread over the id range, as they are in the archive
+    df = with_duplicates(args.rows, args.dup_rate).sample(frac=1, random_state=1).reset_index(drop=True)
+
+    small = df.head(len(df) // 10)
+    *_, small_seconds = timed(small)
+    kept, _, _, seconds = timed(df)
+    duplicate = kept != np.arange(len(df))
+    print(f"{len(small):>9,} titles: {small_seconds:6.1f} s")
+    print(f"{len(df):>9,} titles: {seconds:6.1f} s ({len(df) / seconds:,.0f} titles/s), "
+          f"all-pairs Jaccard would take ~{pairwise_seconds(df['title'].tolist()) / 3600:,.1f} h")
+    print(f"duplicates dropped: {duplicate.sum():,} ({duplicate.mean():.1%}), injected: {(df['kind'] >= 0).sum():,}")
+
+    # An injected copy is caught if it or the row it copies was dropped; only
+    # copies at or above the threshold are expected to be
+    position = pd.Series(np.arange(len(df)), index=df['id'])
+    copies = df[df['kind'] >= 0]
+    pairs = np.stack([position[copies['id']].to_numpy(), position[copies['source_id']].to_numpy()])
+    caught = duplicate[pairs].any(axis=0)
+    similar = jaccard(df['title'].to_numpy()[pairs[0]], df['title'].to_numpy()[pairs[1]]) >= DEDUP_CONFIG['threshold']
+    for kind, name in enumerate(KINDS):
+        mask = (copies['kind'] == kind).to_numpy() & similar
+        print(f"  recall, {name:<9} {caught[mask].mean():6.1%} of {mask.sum():,} copies with Jaccard >= threshold")
+
+    # Precision: how similar each dropped title is to the title kept for it
+    dropped = np.flatnonzero(duplicate)
+    similarity = jaccard(df['title'].to_numpy()[dropped], df['title'].to_numpy()[kept[dropped]])
+    print(f"  dropped titles with Jaccard >= threshold to the title kept: {(similarity >= DEDUP_CONFIG['threshold']).mean():.1%}"
+          f" (>= 0.6: {(similarity >= 0.6).mean():.1%})")
+
+    # Incremental: the last --new-fraction of ids checked against the rest's signatures
+    split = int(len(df) * (1 - args.new_fraction))
+    with tempfile.TemporaryDirectory() as path:
+        index = SignatureIndex(path)
+        old = df.iloc[:split]
+        old_kept, old_signatures, old_shingles, _ = timed(old)
+        old_kept = old_kept == np.arange(len(old))
+        index.save(old['id'].to_numpy()[old_kept], old_signatures[old_kept], old_shingles[old_kept], split)
+        start = time.perf_counter()
+        index = SignatureIndex(path, last_id=split)
+        load_seconds = time.perf_counter() - start
+        new_kept, _, _, new_seconds = timed(df.iloc[split:], index)
+    new_duplicate = new_kept != np.arange(len(new_kept))
+    print(f"new chunk of {len(df) - split:,} titles vs. an index of {len(index):,}: "
+          f"{new_seconds:.1f} s (+{load_seconds:.1f} s loading the index), "
+          f"{new_duplicate.sum():,} dropped ({new_duplicate.mean():.1%}, "
+          f"{(new_kept == -1).sum():,} of them as copies of indexed titles)")
+
+
+if __name__ == '__main__':
+    main()
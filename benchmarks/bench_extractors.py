@@ -0,0 +1,53 @@
+"""Check every archive-page extractor against the bs4 reference and report pages/sec.
+
+    python benchmarks/bench_extractors.py [--pages DIR] [--repeat N]
+
+Pages default to benchmarks/fixtures/*.html.
+"""
+import sys
+import argparse
+import time
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from config import SCRAPING_CONFIG
+from pipeline.extractors import EXTRACTORS
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', default=str(project_root / 'benchmarks' / 'fixtures'),
+                        help='Directory of saved archive pages (*.html)')
+    parser.add_argument('--repeat', type=int, default=50, help='Passes over the pages per backend')
+    args = parser.parse_args()
+
+    pages = [p.read_text(encoding='utf-8') for p in sorted(Path(args.pages).glob('*.html'))]
+    if not pages:
+        sys.exit(f"No *.html pages found in {args.pages}")
+    limit = SCRAPING_CONFIG['max_stories_per_day']
+
+    reference = [EXTRACTORS['bs4'](html, limit)[0] for html in pages]
+    print(f"{len(pages)} pages, {sum(map(len, reference))} stories, {args.repeat} passes")
+
+    failed = False
+    for name, extract in EXTRACTORS.items():
+        rows = [extract(html, limit)[0] for html in pages]
+        identical = rows == reference
+        failed |= not identical
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for html in pages:
+                extract(html, limit)
+        elapsed = time.perf_counter() - start
+
+        pages_per_sec = len(pages) * args.repeat / elapsed
+        print(f"{name:>10}: {pages_per_sec:8.1f} pages/sec  rows {'identical' if identical else 'DIFFER'}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
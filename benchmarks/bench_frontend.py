@@ -0,0 +1,66 @@
+"""Cold start and rerun latency of the Streamlit dashboard.
+
+    python benchmarks/bench_frontend.py [--reruns 5]
+
+Drives frontend/app.py with Streamlit's AppTest harness against the current
+database (run the pipeline first). Each measurement starts a fresh
+interpreter with Streamlit itself already imported:
+
+    landing   first run of the script, no section open (app imports)
+    sections  first run with Data Visualizations and Pipeline Health open
+    rerun     best of --reruns further runs with the same sections open,
+              i.e. a widget interaction while the data is unchanged
+"""
+import sys
+import argparse
+import json
+import subprocess
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+APP = project_root / 'frontend' / 'app.py'
+
+CHILD = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+
+def timed(at):
+    start = time.perf_counter()
+    at.run()
+    if at.exception:
+        sys.exit(at.exception[0].message)
+    return time.perf_counter() - start
+
+at = AppTest.from_file({app!r}, default_timeout=600)
+landing = timed(at)
+for checkbox in at.sidebar.checkbox:
+    if checkbox.label != 'Make Predictions':
+        checkbox.check()
+sections = timed(at)
+rerun = min(timed(at) for _ in range({reruns}))
+print(json.dumps({{'landing': landing, 'sections': sections, 'rerun': rerun}}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--reruns', type=int, default=5)
+    args = parser.parse_args()
+
+    if not (project_root / 'data' / 'medium_articles.db').exists():
+        sys.exit("No database at data/medium_articles.db; run the pipeline first")
+
+    out = subprocess.run(
+        [sys.executable, '-c', CHILD.format(app=str(APP), reruns=args.reruns)],
+        cwd=project_root, capture_output=True, text=True
+    )
+    if out.returncode:
+        sys.exit(out.stderr.strip() or out.stdout.strip())
+    r = json.loads(out.stdout.strip().splitlines()[-1])
+    print(f"landing page cold start: {r['landing'] * 1000:8.0f} ms")
+    print(f"sections, first open:    {r['sections'] * 1000:8.0f} ms")
+    print(f"rerun, unchanged data:   {r['rerun'] * 1000:8.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Compare load time and peak RSS of the processed dataset as CSV vs. typed Parquet.
+
+    python benchmarks/bench_processed_io.py [--rows 1000000]
+
+Each load runs in a fresh interpreter; RSS is the growth of its peak over the
+imported-but-idle interpreter.
+"""
+import sys
+import argparse
+import json
+import os
+import resource
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from benchmarks.synthetic import synthetic_processed
+from pipeline.processed_data import write_processed, read_processed
+
+
+def peak_rss_mb():
+    # ru_maxrss of an exec'd child starts at the forking parent's peak, so
+    # prefer the process's own high-water mark where /proc has it
+    try:
+        with open('/proc/self/status') as f:
+            return next(int(l.split()[1]) for l in f if l.startswith('VmHWM:')) / 1024
+    except (OSError, StopIteration):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def child(path: str, columns):
+    before = peak_rss_mb()
+    start = time.perf_counter()
+    df = read_processed(path, columns=columns or None)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        'seconds': elapsed,
+        'base_rss_mb': before,
+        'load_rss_mb': peak_rss_mb() - before,
+        'frame_mb': df.memory_usage(deep=True).sum() / 2 ** 20,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--child', nargs='+', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child[0], args.child[1:])
+        return
+
+    df = synthetic_processed(args.rows)
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = {
+            'csv': os.path.join(tmp, 'processed.csv'),
+            'parquet': os.path.join(tmp, 'processed.parquet'),
+        }
+        print(f"{args.rows:,} rows")
+        for fmt, path in paths.items():
+            size = write_processed(df, path, last_id=args.rows)
+            print(f"{fmt:>8} on disk: {size / 2 ** 20:8.1f} MB")
+
+        for label, columns in (('all columns', []), ('training columns', ['title', 'claps'])):
+            for fmt, path in paths.items():
+                out = subprocess.run(
+                    [sys.executable, __file__, '--child', path, *columns],
+                    capture_output=True, text=True, check=True
+                ).stdout.strip().splitlines()[-1]
+                r = json.loads(out)
+                print(f"{label:>16} {fmt:>8}: {r['seconds']:6.2f}s  peak RSS {r['base_rss_mb']:4.0f} +{r['load_rss_mb']:5.0f} MB  "
+                      f"frame {r['frame_mb']:7.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
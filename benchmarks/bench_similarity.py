@@ -0,0 +1,149 @@
+"""Similar-title lookup (pipeline/similarity.py) on a synthetic corpus.
+
+    python benchmarks/bench_similarity.py [--rows 1000000] [--queries 200]
+
+Fits the model's TF-IDF vectorizer on --rows synthetic titles, saves a
+similarity index over the high-engagement titles and one over every title,
+and times single-title searches against each (p50/p95/max, query
+vectorization included). A brute-force product of the query with every
+stored vector is timed alongside, and the top-5 similarities of the two must
+agree. The keyword prefilter is timed against an articles_fts index
+(pipeline/data_storage.py) over the same titles, stored in one articles
+partition of a temporary SQLite file, after measuring what keeping it in step
+adds to inserts.
+"""
+import sys
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from benchmarks.synthetic import synthetic_titles, vocabulary
+from pipeline.model_training import make_tfidf_pipeline
+from pipeline.similarity import SimilarityIndex, build_similarity_index, min_claps
+from pipeline.data_storage import create_partition, create_partition_registry, create_title_search, index_new_titles
+from frontend.data_access import TITLE_SEARCH_QUERY, keyword_search, title_search_expression
+from config import DB_CONFIG, SIMILARITY_CONFIG
+
+
+def percentiles(seconds) -> str:
+    ms = np.array(seconds) * 1000
+    return f"p50 {np.percentile(ms, 50):6.2f} ms  p95 {np.percentile(ms, 95):6.2f} ms  max {ms.max():6.2f} ms"
+
+
+def brute_force(X, q, k: int):
+    scores = X @ q
+    top = np.argpartition(-scores, k - 1)[:k]
+    return np.sort(scores[top])[::-1]
+
+
+def bench_index(name, tfidf, X, ids, queries, Q, path):
+    start = time.perf_counter()
+    size = build_similarity_index(tfidf, X, ids, path)
+    build_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    index = SimilarityIndex(path)
+    load_seconds = time.perf_counter() - start
+    print(f"{name}: {len(index):,} titles, {size / 1024 ** 2:.0f} MB, "
+          f"built in {build_seconds:.1f} s, loaded in {load_seconds * 1000:.0f} ms")
+
+    k = SIMILARITY_CONFIG['top_k']
+    search, brute, mismatches = [], [], 0
+    for title, q in zip(queries, Q):
+        start = time.perf_counter()
+        _, scores = index.search(title, k)
+        search.append(time.perf_counter() - start)
+        q = q.toarray().ravel()
+        start = time.perf_counter()
+        expected = brute_force(X, q, k)
+        brute.append(time.perf_counter() - start)
+        expected = expected[expected > 0]
+        mismatches += len(scores) != len(expected) or not np.allclose(scores, expected, atol=1e-5)
+    print(f"  index search: {percentiles(search)}")
+    print(f"  brute force:  {percentiles(brute)}")
+    print(f"  top-{k} similarities differing from brute force: {mismatches} of {len(queries)} queries")
+    return index
+
+
+def bench_title_search(titles, ids, index, queries, path):
+    conn = sqlite3.connect(path)
+    for pragma, value in DB_CONFIG['pragmas'].items():
+        conn.execute(f"PRAGMA {pragma} = {value}")
+    with conn:
+        create_partition_registry(conn)
+        partition = create_partition(conn, 'technology', None)
+    insert = f"INSERT INTO {partition} (id, title) VALUES (?, ?)"
+    rows = list(zip(ids.tolist(), titles))
+    split = len(rows) * 9 // 10
+
+    start = time.perf_counter()
+    with conn:
+        conn.executemany(insert, rows[:split])
+    plain = (time.perf_counter() - start) / split
+    start = time.perf_counter()
+    with conn:
+        create_title_search(conn)
+    rebuild_seconds = time.perf_counter() - start
+    # The rest in batches of the size store_raw_data_to_db writes per tag/year file
+    start = time.perf_counter()
+    for batch in range(split, len(rows), 10_000):
+        with conn:
+            conn.executemany(insert, rows[batch:batch + 10_000])
+            index_new_titles(conn, rows[batch][0] - 1)
+    indexed = (time.perf_counter() - start) / (len(rows) - split)
+    print(f"articles_fts: indexing {split:,} stored titles took {rebuild_seconds:.1f} s; inserts cost "
+          f"{indexed * 1e6:.1f} us/row including index_new_titles vs. {plain * 1e6:.1f} us/row without")
+
+    # Words from the most common to rare ones, by the synthetic Zipf ranks
+    words = vocabulary()
+    k = SIMILARITY_CONFIG['top_k']
+    for rank in (0, 10, 100, 1000):
+        keywords = words[rank]
+        start = time.perf_counter()
+        n_titles = len(conn.execute(TITLE_SEARCH_QUERY, (title_search_expression(keywords),)).fetchall())
+        fetch = time.perf_counter() - start
+        search = []
+        for title in queries:
+            start = time.perf_counter()
+            keyword_search(conn, index, title, keywords, k)
+            search.append(time.perf_counter() - start)
+        print(f"  keyword of rank {rank:>4} ({n_titles:>7,} titles, all fetched in {fetch * 1000:6.1f} ms): "
+              f"{percentiles(search)}")
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    titles = synthetic_titles(args.rows)
+    claps = np.floor(rng.pareto(1.1, args.rows) * 40)
+    ids = np.arange(1, args.rows + 1)
+    queries = synthetic_titles(args.queries, seed=1)
+
+    start = time.perf_counter()
+    tfidf = make_tfidf_pipeline().named_steps['tfidf']
+    X = tfidf.fit_transform(titles)
+    print(f"TF-IDF over {args.rows:,} titles: {time.perf_counter() - start:.1f} s, {X.shape[1]:,} terms")
+    Q = tfidf.transform(queries)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        high = np.flatnonzero(claps > min_claps())
+        index = bench_index(f"claps > {min_claps()}", tfidf, X[high], ids[high], queries, Q,
+                            os.path.join(tmp, 'high.npz'))
+        bench_index("every title", tfidf, X, ids, queries, Q, os.path.join(tmp, 'all.npz'))
+        bench_title_search(titles, ids, index, queries, os.path.join(tmp, 'articles.db'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""Load test the prediction endpoint: concurrent clients, with and without
+micro-batching and the result cache, sending single titles and then batches.
+Reports p50/p99 request latency and titles/sec.
+
+    python benchmarks/load_test_predictor.py [--model models/engagement_predictor.pkl]
+                                             [--clients 16] [--requests 500] [--repeat 0.5]
+                                             [--batch-size 32]
+
+Without --model, a TF-IDF model is fitted on synthetic titles first.
+"""
+import sys
+import argparse
+import http.client
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from benchmarks.synthetic import synthetic_processed
+from pipeline.model_training import make_tfidf_pipeline
+from pipeline.predictor import EngagementPredictor, make_server
+
+
+def synthetic_model(path: str):
+    df = synthetic_processed(50_000)
+    joblib.dump(make_tfidf_pipeline().fit(df['title'], (df['claps'] > 500).astype(int)), path)
+
+
+def client_titles(n: int, repeat: float, seed: int):
+    """`n` titles of which about `repeat` are drawn from a small popular set"""
+    rng = np.random.default_rng(seed)
+    unique = synthetic_processed(n, seed=seed + 1)['title'].tolist()
+    popular = unique[:50]
+    return [popular[rng.integers(50)] if rng.random() < repeat else t for t in unique]
+
+
+def client(port: int, requests: int, repeat: float, seed: int, per_request: int = 1):
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    titles = client_titles(requests * per_request, repeat, seed)
+    latencies = []
+    for i in range(0, len(titles), per_request):
+        body = json.dumps({'titles': titles[i:i + per_request]})
+        start = time.perf_counter()
+        conn.request('POST', '/predict', body, {'Content-Type': 'application/json'})
+        response = conn.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+        assert response.status == 200
+    conn.close()
+    return latencies
+
+
+def run_clients(port: int, clients: int, requests: int, repeat: float, per_request: int = 1):
+    # Clients run in their own processes so they don't share the server's GIL
+    with ProcessPoolExecutor(clients) as pool:
+        list(pool.map(client_titles, [1] * clients, [0] * clients, range(clients)))  # warm up workers
+        start = time.perf_counter()
+        latencies = list(pool.map(client, [port] * clients, [requests] * clients, [repeat] * clients,
+                                  range(clients), [per_request] * clients))
+        elapsed = time.perf_counter() - start
+    return np.concatenate(latencies) * 1000, elapsed, clients * requests * per_request
+
+
+def per_title_baseline(model_path: str, n: int, repeat: float):
+    """The old frontend path: predict and predict_proba, one title at a time"""
+    model = joblib.load(model_path)
+    titles = client_titles(n, repeat, seed=0)
+    latencies = []
+    start = time.perf_counter()
+    for title in titles:
+        t0 = time.perf_counter()
+        model.predict([title])[0]
+        model.predict_proba([title])[0][1]
+        latencies.append(time.perf_counter() - t0)
+    return np.array(latencies) * 1000, time.perf_counter() - start, n
+
+
+def report(label: str, latencies, elapsed: float, titles: int):
+    print(f"{label:>32}: p50 {np.percentile(latencies, 50):7.2f} ms  p99 {np.percentile(latencies, 99):7.2f} ms  "
+          f"{titles / elapsed:8.0f} titles/s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=500, help='requests per client')
+    parser.add_argument('--repeat', type=float, default=0.5, help='share of requests for popular titles')
+    parser.add_argument('--batch-size', type=int, default=32, help='titles per request in the batched-client run')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model_path = args.model
+        if not model_path:
+            model_path = os.path.join(tmp, 'model.pkl')
+            synthetic_model(model_path)
+
+        print(f"{args.clients} clients x {args.requests} requests, {args.repeat:.0%} repeated titles")
+        report('in-process, per title', *per_title_baseline(model_path, args.requests, args.repeat))
+
+        # Latencies are per request
+        for label, max_batch, cache_size, per_request in (
+                ('http, no batching, no cache', 1, 0, 1),
+                ('http, micro-batched', None, 0, 1),
+                ('http, micro-batched + cache', None, None, 1),
+                (f"http, {args.batch_size} titles/request + cache", None, None, args.batch_size)):
+            server = make_server(EngagementPredictor(model_path, cache_size=cache_size), port=0, max_batch=max_batch)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            report(label, *run_clients(server.server_address[1], args.clients, args.requests, args.repeat, per_request))
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == '__main__':
+    main()
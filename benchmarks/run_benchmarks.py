@@ -0,0 +1,215 @@
+"""Time and memory-profile every pipeline stage on synthetic data of growing size.
+
+    python benchmarks/run_benchmarks.py [--sizes 10k,100k,1m,10m] [--output results.json]
+                                        [--baseline previous.json] [--threshold 1.25]
+    python benchmarks/run_benchmarks.py --compare previous.json results.json
+
+For each size a raw CSV of Medium-like rows (see benchmarks/synthetic.py) is
+written to a scratch directory, then the stages run one after another, each
+in a fresh interpreter with that directory as its working directory, so the
+database, processed data, feature store and models are all throwaway:
+
+    store      store_raw_data_to_db   raw CSV -> SQLite
+    load       load_data_from_db      SQLite -> DataFrame
+    transform  clean_and_transform_data (after an untimed load)
+    train      train_model            cold feature store
+    predict    EngagementPredictor.predict_batch, micro-batches of PREDICTOR_CONFIG['max_batch']
+    score      score_articles         bulk scoring into predictions
+
+Tasks are called through `.fn` with Prefect's run logger disabled, so no
+Prefect server or flow run is involved. Peak RSS is the stage's own
+high-water mark (reset after setup where /proc allows it); scoring workers
+run in separate processes and are not included. Results are written as JSON;
+with --baseline, stages that got slower or bigger than --threshold times the
+baseline are reported and the exit status is 1.
+"""
+import sys
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+from benchmarks.bench_processed_io import peak_rss_mb
+from benchmarks.synthetic import write_raw_csv
+
+STAGES = ['store', 'load', 'transform', 'train', 'predict', 'score']
+SUFFIXES = {'k': 1_000, 'm': 1_000_000}
+PREDICT_TITLES = 20_000
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().lower()
+    if text[-1:] in SUFFIXES:
+        return int(float(text[:-1]) * SUFFIXES[text[-1]])
+    return int(text)
+
+
+def reset_peak_rss():
+    # Writing 5 to clear_refs resets VmHWM to the current RSS (Linux only)
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def run_stage(stage: str):
+    """Run one stage in the current directory and return its measurements"""
+    from prefect.logging import disable_run_logger
+    from config import PREDICTOR_CONFIG
+    from pipeline.data_storage import create_database_tables, store_raw_data_to_db, load_data_from_db
+    from pipeline.data_transformation import clean_and_transform_data
+    from pipeline.model_training import train_model, model_file
+    from pipeline.processed_data import processed_path
+    from pipeline.predictor import EngagementPredictor
+    from pipeline.batch_scoring import score_articles
+
+    with disable_run_logger():
+        # Untimed setup: whatever the stage needs that isn't on disk yet
+        if stage == 'store':
+            create_database_tables.fn()
+        elif stage == 'transform':
+            df = load_data_from_db.fn()
+        elif stage == 'predict':
+            predictor = EngagementPredictor(model_file('tfidf'), cache_size=0)
+            titles = load_data_from_db.fn()['title'].fillna('').tolist()[:PREDICT_TITLES]
+            batch = PREDICTOR_CONFIG['max_batch']
+
+        reset_peak_rss()
+        base_rss = peak_rss_mb()
+        start = time.perf_counter()
+        if stage == 'store':
+            result = store_raw_data_to_db.fn('raw.csv', 'technology')
+            rows = result and result['inserted']
+        elif stage == 'load':
+            rows = len(load_data_from_db.fn()) or None
+        elif stage == 'transform':
+            clean_and_transform_data.fn(df)
+            rows = len(df)
+        elif stage == 'train':
+            model_path = train_model.fn(processed_path())
+            rows = model_path and os.path.getsize(model_path)
+        elif stage == 'predict':
+            for i in range(0, len(titles), batch):
+                predictor.predict_batch(titles[i:i + batch])
+            rows = len(titles)
+        elif stage == 'score':
+            rows = score_articles.fn(model_file('tfidf'))
+        seconds = time.perf_counter() - start
+
+    if not rows:
+        raise RuntimeError(f"stage {stage} failed; its task logged the error to the disabled Prefect logger")
+    result = {'seconds': seconds, 'peak_rss_mb': peak_rss_mb(), 'stage_rss_mb': peak_rss_mb() - base_rss}
+    if stage == 'train':
+        result['model_bytes'] = rows
+    else:
+        result['rows'] = rows
+        result['rows_per_second'] = rows / seconds
+    return result
+
+
+def benchmark_size(rows: int, stages, seed: int):
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        start = time.perf_counter()
+        size = write_raw_csv(os.path.join(workdir, 'raw.csv'), rows, seed=seed)
+        print(f"{rows:,} rows: generated {size / 2 ** 20:.1f} MB of raw CSV in {time.perf_counter() - start:.1f}s")
+        for stage in STAGES:
+            if stage not in stages:
+                continue
+            out = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--stage', stage],
+                cwd=workdir, capture_output=True, text=True
+            )
+            if out.returncode:
+                print(out.stderr.strip().splitlines()[-1])
+                print(f"{stage:>10}: failed, skipping the remaining stages")
+                break
+            results[stage] = r = json.loads(out.stdout.strip().splitlines()[-1])
+            print(f"{stage:>10}: {r['seconds']:8.2f}s  peak RSS {r['peak_rss_mb']:7.0f} MB (+{r['stage_rss_mb']:.0f})"
+                  + (f"  {r['rows_per_second']:10,.0f} rows/s" if 'rows' in r else ''))
+    return results
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> bool:
+    """Print current vs. baseline per size and stage; True if nothing regressed past `threshold`"""
+    ok = True
+    for size, stages in current['results'].items():
+        for stage, r in stages.items():
+            old = baseline['results'].get(size, {}).get(stage)
+            if old is None:
+                continue
+            flags = [metric for metric in ('seconds', 'peak_rss_mb') if r[metric] > old[metric] * threshold]
+            ok = ok and not flags
+            print(f"{int(size):>10,} {stage:>10}: {old['seconds']:8.2f}s -> {r['seconds']:8.2f}s "
+                  f"({r['seconds'] / old['seconds']:5.2f}x)  RSS {old['peak_rss_mb']:6.0f} -> {r['peak_rss_mb']:6.0f} MB"
+                  + (f"  REGRESSED: {', '.join(flags)}" if flags else ''))
+    return ok
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=project_root,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='10k,100k', help='comma-separated row counts, e.g. 10k,100k,1m,10m')
+    parser.add_argument('--stages', default=','.join(STAGES))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='results file (default: benchmark-<timestamp>.json)')
+    parser.add_argument('--baseline', help='earlier results file to compare against')
+    parser.add_argument('--threshold', type=float, default=1.25, help='slowdown/growth ratio reported as a regression')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'), help='compare two results files and exit')
+    parser.add_argument('--stage', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.stage:
+        print(json.dumps(run_stage(args.stage)))
+        return
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        with open(args.compare[1]) as f:
+            current = json.load(f)
+        sys.exit(0 if compare(baseline, current, args.threshold) else 1)
+
+    stages = args.stages.split(',')
+    current = {**environment(), 'results': {}}
+    for size in args.sizes.split(','):
+        rows = parse_size(size)
+        current['results'][str(rows)] = benchmark_size(rows, stages, args.seed)
+
+    output = args.output or f"benchmark-{datetime.now():%Y%m%d-%H%M%S}.json"
+    with open(output, 'w') as f:
+        json.dump(current, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if not compare(baseline, current, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
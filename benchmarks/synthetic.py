@@ -0,0 +1,105 @@
+"""Synthetic Medium-like data shared by the benchmarks.
+
+Titles draw words from a fixed 30k-word vocabulary with a Zipf-like
+frequency, claps follow a heavy-tailed (Pareto) distribution that depends on
+the title's leading word, and raw counts are formatted the way archive pages
+show them ("57", "1.2K", "3,400", "2.1M", blanks).
+"""
+import os
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+TAGS = ['business', 'technology', 'ai']
+RAW_COLUMNS = ['date', 'title', 'claps', 'responses', 'author_name', 'followers', 'reading_time_mins']
+
+WORDS = ('ai data startup growth business guide future remote team product design money '
+         'market python code leadership simple truth lessons learning machine why how the').split()
+
+
+@lru_cache(maxsize=4)
+def vocabulary(size: int = 30_000):
+    rng = np.random.default_rng(12345)
+    letters = np.array(list('abcdefghijklmnopqrstuvwxyz'))
+    return [''.join(rng.choice(letters, rng.integers(3, 10))) for _ in range(size)]
+
+
+def _title_ranks(n: int, rng: np.random.Generator, vocab_size: int):
+    return np.minimum(rng.zipf(1.3, (n, 8)), vocab_size) - 1, rng.integers(3, 9, n)
+
+
+def _titles(ranks, lengths, vocab_size: int):
+    words = vocabulary(vocab_size)
+    return [' '.join(words[r] for r in row[:k]).capitalize() + '!' for row, k in zip(ranks, lengths)]
+
+
+def synthetic_titles(n: int, seed: int = 0, vocab_size: int = 30_000):
+    ranks, lengths = _title_ranks(n, np.random.default_rng(seed), vocab_size)
+    return _titles(ranks, lengths, vocab_size)
+
+
+def format_counts(counts: np.ndarray, rng: np.random.Generator) -> pd.Series:
+    """Integer counts as archive-page strings: plain, "1.2K", "2.1M", some "3,400" and blanks."""
+    values = counts.astype(str).astype(object)
+    big = counts >= 1000
+    values[big] = [f"{c / 1000:.1f}K" for c in counts[big]]
+    huge = counts >= 1_000_000
+    values[huge] = [f"{c / 1_000_000:.1f}M" for c in counts[huge]]
+    commas = rng.random(len(counts)) < 0.02
+    values[commas] = [f"{c:,}" for c in counts[commas]]
+    values[rng.random(len(counts)) < 0.01] = ''
+    return pd.Series(values)
+
+
+def synthetic_counts(n: int, rng: np.random.Generator):
+    """Medium-like clap strings: mostly small integers, a heavy K tail, some M, commas and blanks."""
+    return format_counts(np.floor(rng.pareto(1.1, n) * 40).astype(np.int64), rng)
+
+
+def synthetic_raw(n: int, seed: int = 0, vocab_size: int = 30_000) -> pd.DataFrame:
+    """Rows in the layout `parse_archive_page` writes to data/raw CSVs.
+
+    About one title in five starts with a "popular" word and gets four times
+    the claps, so a title model has something to learn.
+    """
+    rng = np.random.default_rng(seed)
+    ranks, lengths = _title_ranks(n, rng, vocab_size)
+    popular = ranks[:, 0] % 5 == 0
+    claps = np.floor(rng.pareto(1.1, n) * np.where(popular, 160, 40)).astype(np.int64)
+    responses = np.floor(claps * rng.uniform(0, 0.02, n)).astype(np.int64)
+    days = pd.to_datetime('2020-01-01') + pd.to_timedelta(rng.integers(0, 6 * 365, n), unit='D')
+    authors = np.minimum(rng.zipf(1.5, n), max(n // 10, 1))
+    return pd.DataFrame({
+        'date': days.strftime('%m/%d/%Y'),
+        'title': _titles(ranks, lengths, vocab_size),
+        'claps': format_counts(claps, rng),
+        'responses': format_counts(responses, rng),
+        'author_name': [f"Writer {a}" for a in authors],
+        'followers': 'N/A',
+        'reading_time_mins': rng.integers(1, 25, n).astype(str),
+    }, columns=RAW_COLUMNS)
+
+
+def write_raw_csv(path: str, rows: int, seed: int = 0, chunk_size: int = 500_000) -> int:
+    """Write `rows` synthetic raw rows to `path` a chunk at a time; returns the file size"""
+    for i, start in enumerate(range(0, rows, chunk_size)):
+        chunk = synthetic_raw(min(chunk_size, rows - start), seed=seed * 1_000_003 + i)
+        chunk.to_csv(path, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+    return os.path.getsize(path)
+
+
+def synthetic_processed(rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    words = np.array(WORDS)
+    title_words = words[rng.integers(0, len(words), (rows, 6))]
+    return pd.DataFrame({
+        'id': np.arange(1, rows + 1),
+        'date': pd.to_datetime('2020-01-01') + pd.to_timedelta(rng.integers(0, 2000, rows), unit='D'),
+        'title': [' '.join(t) for t in title_words],
+        'claps': np.floor(rng.pareto(1.1, rows) * 40).astype(np.int64),
+        'responses': rng.integers(0, 200, rows),
+        'author_name': [f"writer{i}" for i in rng.integers(0, rows // 20 + 1, rows)],
+        'reading_time_mins': rng.integers(1, 20, rows),
+        'tag': rng.choice(TAGS, rows),
+    }).assign(date=lambda d: d['date'].dt.strftime('%Y-%m-%d'))
@@ -7,7 +7,15 @@ BASE_DIR = Path(__file__).parent.parent
 # Database configuration (SQLite)
 DB_CONFIG = {
     'db_path':  'data/medium_articles.db',
-    'table_name': 'articles'
+    'table_name': 'articles',  # a view over one table per tag and year, see pipeline/data_storage.py
+    'batch_size': 10000,  # rows per executemany call
+    'timeout': 300,  # seconds a writer waits for another's transaction (one writer at a time per file)
+    'pragmas': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'temp_store': 'MEMORY',
+        'cache_size': -64000  # KiB
+    }
 }
 
 # Scraping configuration
@@ -16,20 +24,113 @@ SCRAPING_CONFIG = {
     'tags': ['business', 'technology', 'ai'],
     'years': [2020, 2021, 2022, 2023, 2024, 2025],
     'max_stories_per_day': 20,
-    'request_delay': 2  # seconds
+    'extractor': 'lxml',  # see pipeline/extractors.py; 'bs4' is the reference parser
+    'concurrency': 8,            # archive pages in flight per tag/year
+    'ingest_workers': 6,         # tag/year jobs scraped in parallel
+    'max_concurrent_requests': 16,  # cap across all jobs
+    'requests_per_second': 2.0,  # token-bucket refill rate, per host
+    'burst': 4,                  # token-bucket capacity
+    'max_retries': 5,
+    'backoff_factor': 1,
+    'timeout': 10,  # seconds
+    'clap_settle_days': 30  # days fetched sooner than this are re-fetched with --refetch-recent
+}
+
+# Raw HTML cache configuration
+CACHE_CONFIG = {
+    'max_bytes': 2 * 1024 ** 3,  # LRU eviction above this size
+    'zstd_level': 10,  # used when `zstandard` is installed
+    'gzip_level': 6,   # fallback
+    'reparse_workers': None  # defaults to os.cpu_count()
+}
+
+# Transformation configuration
+TRANSFORM_CONFIG = {
+    'chunk_size': 50000,  # rows per chunk in incremental mode
+    'output_format': 'parquet'  # or 'csv'
+}
+
+# Near-duplicate title removal in the transform stage (pipeline/dedup.py)
+DEDUP_CONFIG = {
+    'enabled': True,
+    'threshold': 0.8,  # estimated Jaccard similarity of the titles' word 1-2-gram sets
+    'bands': 16,  # LSH bands; a pair is compared if it agrees on all values of any band
+    'rows_per_band': 4  # MinHash values per band
 }
 
 # Model configuration
 MODEL_CONFIG = {
     'clap_threshold': 500,
     'test_size': 0.2,
-    'random_state': 42
+    'random_state': 42,
+    'engine': 'tfidf',  # 'tfidf' (full refit) or 'sgd' (incremental, out-of-core)
+    'chunk_size': 50000,  # rows per partial_fit call for the sgd engine
+    'hash_features': 2 ** 18,
+    'sgd_alpha': 1e-5,
+    'holdout_sample': 100000,  # most recent holdout rows the sgd engine is evaluated on
+    'compact_tolerance': 1e-4,  # max probability deviation of the .npz export from the pickle
+    'rollup_features': False,  # also train a model on title + author/tag rollup features (pipeline/rollups.py)
+    'rollup_folds': 5  # training rows are encoded out-of-fold so their own claps never feed their features
+}
+
+# Hyperparameter search configuration (run_pipeline.py --tune)
+TUNING_CONFIG = {
+    'param_grid': {
+        'tfidf__ngram_range': [(1, 1), (1, 2)],
+        'tfidf__min_df': [1, 2],
+        'tfidf__sublinear_tf': [False, True],
+        'clf__C': [0.1, 1.0, 10.0]
+    },
+    'cv_folds': 5,
+    'scoring': 'f1',
+    'n_jobs': -1,  # all cores
+    'cache_bytes_limit': '1G'  # fitted vectorizers kept between searches
+}
+
+# Prediction service configuration (python -m pipeline.predictor)
+PREDICTOR_CONFIG = {
+    'host': '127.0.0.1',
+    'port': 8765,
+    'cache_size': 10000,  # titles kept in the LRU result cache
+    'max_batch': 256,  # titles per micro-batch
+    'max_wait_ms': 0  # extra wait for a micro-batch to fill; requests queued while
+                      # the previous batch was scored are always batched together
+}
+
+# Bulk scoring configuration
+SCORING_CONFIG = {
+    'chunk_size': 20000,  # titles per predict_proba call
+    'workers': None,  # scoring processes; defaults to os.cpu_count()
+    'keep_versions': 2  # model versions whose predictions are kept
+}
+
+# Similar high-engagement titles on the predictor page (pipeline/similarity.py)
+SIMILARITY_CONFIG = {
+    'enabled': True,  # train_model saves the index to PATHS['models']/index_file
+    'index_file': 'similar_titles.npz',
+    'min_claps': None,  # titles indexed have more claps than this; defaults to MODEL_CONFIG['clap_threshold']
+    'top_k': 5
+}
+
+# Feature store configuration (pipeline/feature_store.py)
+FEATURE_STORE_CONFIG = {
+    'max_bytes': 1024 ** 3  # least recently used count matrices are evicted above this size
+}
+
+# Pipeline telemetry (pipeline/telemetry.py)
+TELEMETRY_CONFIG = {
+    'profile': False  # write a cProfile dump per stage to PATHS['profiles'] (run_pipeline.py --profile)
 }
 
 # Path configuration
 PATHS = {
     'raw_data': 'data/raw',
     'processed_data': 'data/processed',
+    'html_cache': 'data/html_cache',
+    'feature_store': 'data/feature_store',
+    'dedup_index': 'data/dedup_index',
+    'profiles': 'data/profiles',
+    'tuning_cache': 'data/tuning_cache',
     'models': 'models'
 }
 
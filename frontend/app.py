@@ -1,171 +1,200 @@
 import sys
-import os
 from pathlib import Path
-import sqlite3
-import pandas as pd
-import joblib
 import streamlit as st
-import matplotlib.pyplot as plt
-import numpy as np
 
 # Add project root to Python path
 project_root = Path(__file__).parent.parent
 sys.path.append(str(project_root))
 
-@st.cache_resource
-def get_db_connection():
-    db_path = project_root / "data" / "medium_articles.db"
-    return sqlite3.connect(db_path, check_same_thread=False)
+# Heavy modules (pandas, matplotlib, sklearn) are imported by the sections that use them
+from config import PATHS
+from pipeline.model_files import model_file, model_version, served_engine, title_model_file
+from frontend.data_access import (
+    data_version, has_articles, article_tags, top_articles, top_authors, tag_year_stats, distribution_png,
+    stage_trends, latest_run, throughput_regressions, health_png, similar_articles, SIMILARITY_INDEX_PATH
+)
+
+def served_model_path(title_only=False):
+    """The model of the engine the pipeline last scored with, or with
+    `title_only` the one of its models that predicts from a title alone"""
+    engine = served_engine(project_root / PATHS['models'])
+    return project_root / (title_model_file(engine) if title_only else model_file(engine))
+
+def model_mtime(model_path):
+    """Latest mtime of the model's pickle and compact export, None if neither exists"""
+    files = [f for f in (model_path, model_path.with_suffix('.npz')) if f.exists()]
+    return max((f.stat().st_mtime for f in files), default=None)
 
 @st.cache_resource
-def load_model():
-    model_path = project_root / "models" / "engagement_predictor.pkl"
-    if not model_path.exists():
+def load_predictor(model_path, mtime):
+    """Predictor for the model at `model_path`; `mtime` reloads it when the pipeline retrains the model"""
+    if not model_path.exists() and not model_path.with_suffix('.npz').exists():
         st.error(f"Model not found at: {model_path}\nPlease run the training pipeline first.")
         return None
     try:
-        return joblib.load(model_path)
+        from pipeline.predictor import EngagementPredictor
+        return EngagementPredictor(str(model_path))
     except Exception as e:
         st.error(f"Failed to load model: {str(e)}")
         return None
 
-def convert_claps(clap_str):
-    """Convert clap strings (like '1.2K') to integers"""
-    if isinstance(clap_str, (int, float)):
-        return int(clap_str)
-    clap_str = str(clap_str).upper().replace(',', '')
-    if 'K' in clap_str:
-        return int(float(clap_str.replace('K', ''))) * 1000
+@st.cache_data
+def current_model_version(model_path, mtime):
+    """Version tag of the served model; `mtime` invalidates it when the file changes"""
+    return model_version(str(model_path))
+
+def show_similar_articles(title, version):
+    """The stored high-engagement articles closest to `title`, optionally only
+    those whose titles contain given words"""
+    if version is None or not SIMILARITY_INDEX_PATH.exists():
+        st.info("No similarity index yet; run the training pipeline to build it")
+        return
+    keywords = st.text_input("Only titles containing (optional, word* for a prefix):", "")
     try:
-        return int(clap_str)
-    except:
-        return 0
+        similar = similar_articles(title, keywords, SIMILARITY_INDEX_PATH.stat().st_mtime, version)
+    except Exception as e:
+        st.error(f"Similar article search failed: {str(e)}")
+        return
+    if similar.empty:
+        if keywords.strip():
+            st.info("No similar high-engagement article contains those words")
+        else:
+            st.info("No high-engagement article shares a word with this title")
+        return
+    
+    display = similar.copy()
+    display['claps'] = display['claps'].apply(lambda x: f"{x:,}")
+    display['similarity'] = display['similarity'].apply(lambda x: f"{x:.0%}")
+    st.dataframe(display.rename(columns={
+        'title': 'Title',
+        'claps': 'Claps',
+        'similarity': 'Similarity'
+    }))
+
+def show_pipeline_health(version):
+    """Per-stage throughput and memory across pipeline runs, from stage_metrics"""
+    trends = stage_trends(version)
+    if trends.empty:
+        st.info("No pipeline telemetry yet; run the pipeline to record stage metrics")
+        return
+
+    for stage, now, before in throughput_regressions(trends):
+        st.warning(f"⚠️ {stage}: {now:,.0f} rows/s in the latest run vs. a median of {before:,.0f} before")
 
-def show_data_visualizations(conn):
+    st.image(health_png(version))
+
+    st.subheader("Latest Run")
+    latest = latest_run(version)
+    st.dataframe(latest.dropna(axis=1, how='all').rename(columns={
+        'stage': 'Stage',
+        'label': 'Job',
+        'seconds': 'Seconds',
+        'rows_in': 'Rows In',
+        'rows_out': 'Rows Out',
+        'rows_per_second': 'Rows/s',
+        'peak_rss_mb': 'Peak RSS (MB)',
+        'bytes_written': 'Bytes Written',
+        'http_requests': 'HTTP Requests',
+        'http_bytes': 'HTTP Bytes',
+        'http_retries': 'HTTP Retries',
+        'http_errors': 'HTTP Errors',
+        'status': 'Status'
+    }))
+
+def show_data_visualizations(version):
     """Display data visualizations including top articles and distributions"""
     try:
-        # Load all data
-        query = "SELECT title, claps, responses, author_name, reading_time_mins FROM articles"
-        df = pd.read_sql(query, conn)
+        import pandas as pd
         
-        # Convert claps and responses to numeric
-        df['claps'] = df['claps'].apply(convert_claps)
-        df['responses'] = pd.to_numeric(df['responses'], errors='coerce').fillna(0).astype(int)
-        
-        if df.empty:
+        if not has_articles(version):
             st.warning("No data found in database")
             return
         
         # Create tabs for different views
-        tab1, tab2 = st.tabs(["Top Articles", "Distributions"])
+        tab1, tab2, tab3 = st.tabs(["Top Articles", "Distributions", "Authors & Tags"])
         
         with tab1:
-            # Show top 10 articles by claps
-            st.subheader("Top 10 Articles by Claps")
-            top_claps = df.sort_values('claps', ascending=False).head(10)
-            
-            # Create display dataframe with proper formatting
-            display_claps = top_claps.copy()
-            display_claps['claps'] = display_claps['claps'].apply(lambda x: f"{x:,}")
-            display_claps['responses'] = display_claps['responses'].apply(lambda x: f"{x:,}")
-            
-            # Rename columns for display
-            display_claps = display_claps.rename(columns={
-                'title': 'Title',
-                'claps': 'Claps',
-                'responses': 'Responses',
-                'author_name': 'Author',
-                'reading_time_mins': 'Reading Time (mins)'
-            })
-            
-            # Display the table
-            st.dataframe(display_claps[[
-                'Title', 
-                'Claps', 
-                'Responses', 
-                'Author', 
-                'Reading Time (mins)'
-            ]])
-            
-            # Show top 10 articles by responses
-            st.subheader("Top 10 Articles by Responses")
-            top_responses = df.sort_values('responses', ascending=False).head(10)
+            model_path = served_model_path()
+            model = current_model_version(model_path, model_path.stat().st_mtime) if model_path.exists() else None
+            tag = st.selectbox("Tag", ["All tags"] + article_tags(version))
+            tag = None if tag == "All tags" else tag
             
-            # Create display dataframe with proper formatting
-            display_responses = top_responses.copy()
-            display_responses['claps'] = display_responses['claps'].apply(lambda x: f"{x:,}")
-            display_responses['responses'] = display_responses['responses'].apply(lambda x: f"{x:,}")
-            
-            # Rename columns for display
-            display_responses = display_responses.rename(columns={
-                'title': 'Title',
-                'claps': 'Claps',
-                'responses': 'Responses',
-                'author_name': 'Author',
-                'reading_time_mins': 'Reading Time (mins)'
-            })
-            
-            # Display the table
-            st.dataframe(display_responses[[
-                'Title', 
-                'Responses', 
-                'Claps', 
-                'Author', 
-                'Reading Time (mins)'
-            ]])
+            for heading, column, order in (
+                ("Top 10 Articles by Claps", 'claps', ['Title', 'Claps', 'Responses']),
+                ("Top 10 Articles by Responses", 'responses', ['Title', 'Responses', 'Claps']),
+                ("Top 10 Articles by Predicted Engagement", 'probability', ['Title', 'Predicted Engagement', 'Claps', 'Responses']),
+            ):
+                st.subheader(heading)
+                top = top_articles(column, model, version, tag)
+                if top.empty:
+                    st.info("No stored predictions yet; run the pipeline to score articles")
+                    continue
+                
+                # Create display dataframe with proper formatting
+                display = top.copy()
+                display['claps'] = display['claps'].apply(lambda x: f"{x:,}")
+                display['responses'] = display['responses'].apply(lambda x: f"{x:,}")
+                # Stored scores from the batch scoring stage, not recomputed here
+                display['probability'] = display['probability'].apply(lambda x: "–" if pd.isna(x) else f"{x:.0%}")
+                
+                # Rename columns for display
+                display = display.rename(columns={
+                    'title': 'Title',
+                    'claps': 'Claps',
+                    'responses': 'Responses',
+                    'author_name': 'Author',
+                    'reading_time_mins': 'Reading Time (mins)',
+                    'probability': 'Predicted Engagement'
+                })
+                
+                # Display the table
+                columns = order + [c for c in ['Claps', 'Responses', 'Author', 'Reading Time (mins)', 'Predicted Engagement'] if c not in order]
+                st.dataframe(display[columns])
         
         with tab2:
-            # Claps distribution visualization
+            # Histograms and box plots are rendered once per data version
             st.subheader("Claps Distribution")
-            
-            # Create bins for better visualization
-            clap_bins = [0, 100, 500, 1000, 2000, 5000, 10000, 20000, 50000, 100000, np.inf]
+            clap_bins = [0, 100, 500, 1000, 2000, 5000, 10000, 20000, 50000, 100000, float('inf')]
             clap_labels = ['0-100', '101-500', '501-1K', '1K-2K', '2K-5K', '5K-10K', '10K-20K', '20K-50K', '50K-100K', '100K+']
-            df['clap_range'] = pd.cut(df['claps'], bins=clap_bins, labels=clap_labels, right=False)
-            
-            # Plot histogram
-            fig1, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 5))
-            
-            # Histogram of clap ranges
-            clap_counts = df['clap_range'].value_counts().sort_index()
-            ax1.bar(clap_counts.index.astype(str), clap_counts.values)
-            ax1.set_title("Clap Count Frequency")
-            ax1.set_xlabel("Clap Range")
-            ax1.set_ylabel("Number of Articles")
-            ax1.tick_params(axis='x', rotation=45)
-            
-            # Box plot (log scale)
-            ax2.boxplot(np.log1p(df['claps']))
-            ax2.set_title("Clap Distribution (log scale)")
-            ax2.set_ylabel("log(claps + 1)")
-            
-            st.pyplot(fig1)
+            st.image(distribution_png('claps', 'Clap', clap_bins, clap_labels, version))
             
-            # Responses distribution visualization
             st.subheader("Responses Distribution")
-            
-            # Create bins for responses
-            response_bins = [0, 5, 10, 20, 50, 100, 200, 500, 1000, np.inf]
+            response_bins = [0, 5, 10, 20, 50, 100, 200, 500, 1000, float('inf')]
             response_labels = ['0-5', '6-10', '11-20', '21-50', '51-100', '101-200', '201-500', '501-1000', '1000+']
-            df['response_range'] = pd.cut(df['responses'], bins=response_bins, labels=response_labels, right=False)
-            
-            # Plot histogram
-            fig2, (ax3, ax4) = plt.subplots(1, 2, figsize=(15, 5))
-            
-            # Histogram of response ranges
-            response_counts = df['response_range'].value_counts().sort_index()
-            ax3.bar(response_counts.index.astype(str), response_counts.values)
-            ax3.set_title("Response Count Frequency")
-            ax3.set_xlabel("Response Range")
-            ax3.set_ylabel("Number of Articles")
-            ax3.tick_params(axis='x', rotation=45)
-            
-            # Box plot (log scale)
-            ax4.boxplot(np.log1p(df['responses']))
-            ax4.set_title("Response Distribution (log scale)")
-            ax4.set_ylabel("log(responses + 1)")
+            st.image(distribution_png('responses', 'Response', response_bins, response_labels, version))
+        
+        with tab3:
+            # Read from the author_stats and tag_day_stats rollups, not the articles table
+            st.subheader("Top 10 Authors by Median Claps (5+ articles)")
+            authors = top_authors(version)
+            if authors.empty:
+                st.info("No author rollups yet; run the pipeline to build them")
+            else:
+                display = authors.copy()
+                display['median_claps'] = display['median_claps'].apply(lambda x: f"~{x:,.0f}")
+                display['engagement_rate'] = display['engagement_rate'].apply(lambda x: f"{x:.0%}")
+                st.dataframe(display.rename(columns={
+                    'author_name': 'Author',
+                    'median_claps': 'Median Claps',
+                    'articles': 'Articles',
+                    'engagement_rate': 'High Engagement',
+                    'claps_sum': 'Total Claps'
+                })[['Author', 'Median Claps', 'Articles', 'High Engagement', 'Total Claps']])
             
-            st.pyplot(fig2)
+            st.subheader("Engagement Rate by Tag and Year")
+            tags = tag_year_stats(version)
+            if not tags.empty:
+                st.line_chart(tags.pivot(index='year', columns='tag', values='engagement_rate'))
+                display = tags.copy()
+                display['median_claps'] = display['median_claps'].apply(lambda x: f"~{x:,.0f}")
+                display['engagement_rate'] = display['engagement_rate'].apply(lambda x: f"{x:.0%}")
+                st.dataframe(display.rename(columns={
+                    'tag': 'Tag',
+                    'year': 'Year',
+                    'articles': 'Articles',
+                    'engagement_rate': 'High Engagement',
+                    'median_claps': 'Median Claps'
+                })[['Tag', 'Year', 'Articles', 'High Engagement', 'Median Claps']])
         
     except Exception as e:
         st.error(f"Error processing data: {str(e)}")
@@ -173,25 +202,38 @@ def show_data_visualizations(conn):
 def main():
     st.title("Medium Author Success Predictor")
     
-    # Load resources
-    model = load_model()
-    conn = get_db_connection()
+    # One cheap check per rerun; cached results stay valid until it changes
+    version = data_version()
     
     # Sidebar options
     st.sidebar.header("Options")
     show_visualizations = st.sidebar.checkbox("Data Visualizations")
     make_predictions = st.sidebar.checkbox("Make Predictions")
+    show_health = st.sidebar.checkbox("Pipeline Health")
     
     # Data Visualizations
     if show_visualizations:
         st.header("Data Visualizations")
-        show_data_visualizations(conn)
+        if version is None:
+            st.warning("No database found; run the pipeline first")
+        else:
+            show_data_visualizations(version)
+    
+    # Pipeline Health
+    if show_health:
+        st.header("Pipeline Health")
+        if version is None:
+            st.warning("No database found; run the pipeline first")
+        else:
+            show_pipeline_health(version)
     
     # Prediction Section
     if make_predictions:
         st.header("Article Engagement Predictor")
         
-        if not model:
+        model_path = served_model_path(title_only=True)
+        predictor = load_predictor(model_path, model_mtime(model_path))
+        if not predictor:
             st.warning("Model not available - cannot make predictions")
             return
             
@@ -205,8 +247,7 @@ def main():
         if st.button("Predict Engagement"):
             with st.spinner("Analyzing..."):
                 try:
-                    prediction = model.predict([title_input])[0]
-                    proba = model.predict_proba([title_input])[0][1]
+                    prediction, proba = predictor.predict(title_input)
                     
                     if prediction == 1:
                         st.success(f"✅ High engagement predicted ({proba:.0%} confidence)")
@@ -215,6 +256,10 @@ def main():
                 except Exception as e:
                     st.error(f"Prediction failed: {str(e)}")
         
+        # Comparable articles that did well, from the index saved at training time
+        st.subheader("Similar High-Engagement Articles")
+        show_similar_articles(title_input, version)
+        
         # Example predictions
         st.subheader("Example Predictions")
         examples = [
@@ -224,14 +269,13 @@ def main():
             "The Complete Guide to Machine Learning in 2025"
         ]
         
-        for example in examples:
-            try:
-                pred = model.predict([example])[0]
-                proba = model.predict_proba([example])[0][1]
+        try:
+            # All examples in one batch
+            for example, (pred, proba) in zip(examples, predictor.predict_batch(examples)):
                 emoji = "🔥" if pred == 1 else "💤"
                 st.write(f"{emoji} {example} → {'High' if pred == 1 else 'Low'} engagement ({proba:.0%})")
-            except:
-                st.write(f"⚠️ Could not process example: {example}")
+        except:
+            st.write("⚠️ Could not process examples")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,403 @@
+"""Cached, read-only access to the pipeline database for the Streamlit app.
+
+Every cached function takes `version`, a cheap stamp of the database's state
+(see `data_version`), so a Streamlit rerun reuses query results and rendered
+figures until the pipeline writes new data. pandas and matplotlib are only
+imported when a query or figure is first computed.
+"""
+import io
+import json
+import math
+import os
+import sqlite3
+import threading
+from pathlib import Path
+import streamlit as st
+from config import PATHS, SIMILARITY_CONFIG
+
+project_root = Path(__file__).parent.parent
+DB_PATH = project_root / "data" / "medium_articles.db"
+SIMILARITY_INDEX_PATH = project_root / PATHS['models'] / SIMILARITY_CONFIG['index_file']
+
+_local = threading.local()
+
+# Per partition: ORDER BY over the articles view would sort every row of it
+TOP_IN_TABLE_QUERY = """
+SELECT id, title, claps, responses, author_name, reading_time_mins
+FROM {table}
+ORDER BY {column} DESC
+LIMIT ?
+"""
+
+# A join would make SQLite materialise the articles view; as an IN filter and
+# correlated subqueries, each lookup is a primary-key probe per partition
+TOP_PREDICTED_QUERY = """
+SELECT a.title, a.claps, a.responses, a.author_name, a.reading_time_mins,
+       (SELECT p.probability FROM predictions p WHERE p.article_id = a.id AND p.model_version = ?1) AS probability
+FROM articles a
+WHERE a.id IN (
+    SELECT p.article_id FROM predictions p
+    WHERE p.model_version = ?1 AND EXISTS (SELECT 1 FROM articles a WHERE a.id = p.article_id{tag_filter})
+    ORDER BY p.probability DESC
+    LIMIT ?2
+)
+ORDER BY probability DESC
+"""
+
+STAGE_TRENDS_QUERY = """
+SELECT m.run_id, m.stage,
+       SUM(m.seconds) AS seconds,
+       SUM(COALESCE(m.rows_in, m.rows_out)) AS rows,
+       MAX(m.peak_rss_mb) AS peak_rss_mb
+FROM stage_metrics m
+WHERE m.status = 'ok' AND m.run_id > (SELECT COALESCE(MAX(id), 0) FROM pipeline_runs) - ?
+GROUP BY m.run_id, m.stage
+ORDER BY m.run_id
+"""
+
+LATEST_RUN_QUERY = """
+SELECT stage, label, seconds, rows_in, rows_out, rows_per_second, peak_rss_mb, bytes_written,
+       http_requests, http_bytes, http_retries, http_errors, status
+FROM stage_metrics
+WHERE run_id = (SELECT MAX(id) FROM pipeline_runs)
+ORDER BY id
+"""
+
+TOP_AUTHORS_QUERY = """
+SELECT author_name, articles, high_engagement, claps_sum, clap_sketch
+FROM author_stats
+WHERE articles >= ?
+"""
+
+TAG_DAY_QUERY = """
+SELECT tag, substr(day, 1, 4) AS year, articles, high_engagement, claps_sum, clap_sketch
+FROM tag_day_stats
+"""
+
+TITLE_SEARCH_QUERY = "SELECT rowid FROM articles_fts WHERE articles_fts MATCH ?"
+KEYWORD_PREFETCH = 20_000  # matches fetched outright for the similar-articles keyword filter
+
+
+def get_connection():
+    """This thread's read-only connection to the pipeline database"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(f"{DB_PATH.as_uri()}?mode=ro", uri=True)
+        _local.conn = conn
+    return conn
+
+
+def data_version():
+    """Stamp that changes whenever the pipeline writes to the database: the
+    largest article and prediction ids plus the modification times of the
+    database file and its WAL. None if there is no database yet."""
+    if not DB_PATH.exists():
+        return None
+    wal = DB_PATH.with_name(DB_PATH.name + '-wal')
+    stamp = [os.stat(DB_PATH).st_mtime_ns, os.stat(wal).st_mtime_ns if wal.exists() else 0]
+    for table in ('articles', 'predictions'):
+        try:
+            # Not MAX(id), which the articles view can only answer by reading every partition
+            row = get_connection().execute(f"SELECT id FROM {table} ORDER BY id DESC LIMIT 1").fetchone()
+            stamp.append(row and row[0])
+        except sqlite3.Error:
+            stamp.append(None)
+    return '-'.join(map(str, stamp))
+
+
+@st.cache_data(max_entries=4)
+def has_articles(version):
+    try:
+        return get_connection().execute("SELECT 1 FROM articles LIMIT 1").fetchone() is not None
+    except sqlite3.Error:
+        return False
+
+
+@st.cache_data(max_entries=4)
+def article_tags(version):
+    """Tags with stored articles, from the partition list"""
+    try:
+        return [tag for tag, in get_connection().execute("SELECT DISTINCT tag FROM article_partitions ORDER BY tag")]
+    except sqlite3.Error:
+        return []
+
+
+@st.cache_data(max_entries=16)
+def top_articles(column, model_version, version, tag=None, limit=10):
+    """Top `limit` articles by `column`, read straight off its index in each
+    partition (only `tag`'s, if given), with the stored high-engagement
+    probability from `model_version`"""
+    import pandas as pd
+    from pipeline.counts import parse_counts
+    conn = get_connection()
+    if column == 'probability':
+        query = TOP_PREDICTED_QUERY.format(tag_filter=' AND a.tag = ?3' if tag else '')
+        df = pd.read_sql(query, conn, params=(model_version, limit, tag) if tag else (model_version, limit))
+    else:
+        frames = [pd.read_sql(TOP_IN_TABLE_QUERY.format(table=table, column=column), conn, params=(limit,))
+                  for table in article_tables(tag)]
+        if not frames:
+            return pd.DataFrame()
+        df = pd.concat(frames, ignore_index=True).sort_values(column, ascending=False).head(limit)
+        ids = df['id'].tolist()
+        probabilities = dict(conn.execute(
+            f"SELECT article_id, probability FROM predictions "
+            f"WHERE model_version = ? AND article_id IN ({', '.join('?' * len(ids))})", (model_version, *ids)
+        ))
+        df = df.assign(probability=df.pop('id').map(probabilities)).reset_index(drop=True)
+    if not df.empty:
+        df['claps'] = parse_counts(df['claps'])
+        df['responses'] = parse_counts(df['responses'])
+    return df
+
+
+@st.cache_data(max_entries=4)
+def top_authors(version, min_articles=5, limit=10):
+    """Authors with at least `min_articles` stories ranked by median claps,
+    estimated from the clap sketches in author_stats"""
+    import pandas as pd
+    from pipeline.rollups import sketch_quantile
+    try:
+        df = pd.read_sql(TOP_AUTHORS_QUERY, get_connection(), params=(min_articles,))
+    except (sqlite3.Error, pd.errors.DatabaseError):
+        return pd.DataFrame()
+    df['median_claps'] = [sketch_quantile(json.loads(sketch), 0.5) for sketch in df.pop('clap_sketch')]
+    df['engagement_rate'] = df['high_engagement'] / df['articles']
+    return df.nlargest(limit, 'median_claps')
+
+
+@st.cache_data(max_entries=4)
+def tag_year_stats(version):
+    """Articles, high-engagement rate and median claps per tag and year, from tag_day_stats"""
+    import pandas as pd
+    from pipeline.rollups import merge_sketches, sketch_quantile
+    try:
+        days = pd.read_sql(TAG_DAY_QUERY, get_connection())
+    except (sqlite3.Error, pd.errors.DatabaseError):
+        return pd.DataFrame()
+    groups = days.groupby(['tag', 'year'])
+    df = groups[['articles', 'high_engagement', 'claps_sum']].sum()
+    df['median_claps'] = groups['clap_sketch'].agg(lambda s: sketch_quantile(merge_sketches(s), 0.5))
+    df['engagement_rate'] = df['high_engagement'] / df['articles']
+    return df.reset_index()
+
+
+@st.cache_resource(max_entries=1)
+def similarity_index(mtime):
+    """The saved similar-titles index; `mtime` reloads it when training rewrites the file"""
+    from pipeline.similarity import SimilarityIndex
+    return SimilarityIndex(str(SIMILARITY_INDEX_PATH))
+
+
+def title_search_expression(keywords):
+    """FTS5 query matching titles that contain every word of `keywords`;
+    a trailing * makes a word a prefix"""
+    words = []
+    for word in keywords.split():
+        phrase = '"' + word.rstrip('*').replace('"', '""') + '"'
+        words.append(phrase + ' *' if word.endswith('*') else phrase)
+    return ' '.join(words)
+
+
+def _best_matching(conn, index, title, expression, k, n):
+    """The top `k` of `index.search(title, n)` whose titles match `expression`,
+    and whether those n candidates were all there are"""
+    import numpy as np
+    ids, scores = index.search(title, n)
+    found = set()
+    for start in range(0, len(ids), 10_000):
+        chunk = ids[start:start + 10_000].tolist()
+        found.update(row[0] for row in conn.execute(
+            f"{TITLE_SEARCH_QUERY} AND rowid IN ({', '.join('?' * len(chunk))})", (expression, *chunk)
+        ))
+    keep = np.array([i in found for i in ids.tolist()], dtype=bool)
+    return ids[keep][:k], scores[keep][:k], len(ids) < n
+
+
+def keyword_search(conn, index, title, keywords, k):
+    """Top `k` of `index.search(title)` among the titles containing `keywords`,
+    using articles_fts. Keywords matching at most KEYWORD_PREFETCH titles are
+    fetched outright and the search restricted to those; commoner ones are
+    checked against the best candidates, more of them each round, until k pass."""
+    import numpy as np
+    expression = title_search_expression(keywords)
+    matches = conn.execute(TITLE_SEARCH_QUERY + " LIMIT ?", (expression, KEYWORD_PREFETCH + 1)).fetchall()
+    if len(matches) <= KEYWORD_PREFETCH:
+        return index.search(title, k, among=np.array([row[0] for row in matches], dtype=np.int64))
+
+    n = 50 * k
+    while True:
+        ids, scores, exhausted = _best_matching(conn, index, title, expression, k, n)
+        if len(ids) >= k or exhausted:
+            return ids, scores
+        # Enough candidates for k matches at the rate seen so far
+        n = int(n * min(2 * k / max(len(ids), 0.5), 8))
+
+
+@st.cache_data(max_entries=256)
+def similar_articles(title, keywords, index_mtime, version, limit=None):
+    """The indexed high-engagement articles most similar to `title`, with
+    their current claps, optionally only those whose titles contain `keywords`"""
+    import pandas as pd
+    from pipeline.counts import parse_counts
+    index = similarity_index(index_mtime)
+    # A few spares, in case articles were deleted since the index was built
+    limit = limit or SIMILARITY_CONFIG['top_k']
+    if keywords.strip():
+        ids, scores = keyword_search(get_connection(), index, title, keywords, limit + 5)
+    else:
+        ids, scores = index.search(title, limit + 5)
+    if not len(ids):
+        return pd.DataFrame(columns=['title', 'claps', 'similarity'])
+    rows = get_connection().execute(
+        f"SELECT id, title, claps FROM articles WHERE id IN ({', '.join('?' * len(ids))})", ids.tolist()
+    ).fetchall()
+    df = pd.DataFrame(rows, columns=['id', 'title', 'claps']).set_index('id')
+    df['similarity'] = pd.Series(scores, index=ids)
+    df = df.reindex([i for i in ids.tolist() if i in df.index]).head(limit)
+    df['claps'] = parse_counts(df['claps'])
+    return df.reset_index(drop=True)
+
+
+def article_tables(tag=None):
+    """Tables holding the articles (only `tag`'s, if given): one per tag and
+    year (see pipeline.data_storage), or the single articles table of a
+    database the pipeline hasn't partitioned yet"""
+    try:
+        return [name for name, in get_connection().execute(
+            "SELECT name FROM article_partitions WHERE ?1 IS NULL OR tag = ?1 ORDER BY name", (tag,)
+        )]
+    except sqlite3.Error:
+        return ['articles']
+
+
+def bucket_counts(column, bins, labels):
+    """Article counts per [bins[i], bins[i+1]) range, from one CASE/GROUP BY
+    aggregate per partition; over the articles view it would be materialised"""
+    cases = ' '.join(f"WHEN {column} < {upper} THEN {i}" for i, upper in enumerate(bins[1:-1]))
+    counts = [0] * len(labels)
+    for table in article_tables():
+        for bucket, n in get_connection().execute(f"""
+        SELECT CASE {cases} ELSE {len(labels) - 1} END AS bucket, COUNT(*) AS n
+        FROM {table}
+        WHERE {column} >= {bins[0]}
+        GROUP BY bucket
+        """):
+            counts[bucket] += n
+    return counts
+
+
+def log_box_stats(column):
+    """Box-plot statistics of log1p(column) from a handful of order-statistic
+    lookups; ORDER BY over the articles view merges the partitions' indexes"""
+    conn = get_connection()
+    n = sum(conn.execute(f"SELECT COUNT({column}) FROM {table}").fetchone()[0] for table in article_tables())
+    if n == 0:
+        return None
+
+    def quantile(q):
+        offset = int(round(q * (n - 1)))
+        value = conn.execute(
+            f"SELECT {column} FROM articles WHERE {column} IS NOT NULL ORDER BY {column} LIMIT 1 OFFSET ?",
+            (offset,)
+        ).fetchone()[0]
+        return math.log1p(max(float(value), 0))
+
+    low, q1, med, q3, high = (quantile(q) for q in (0, 0.25, 0.5, 0.75, 1))
+    iqr = q3 - q1
+    return {
+        'med': med, 'q1': q1, 'q3': q3,
+        'whislo': max(low, q1 - 1.5 * iqr),
+        'whishi': min(high, q3 + 1.5 * iqr),
+        'fliers': []
+    }
+
+
+def _png(fig) -> bytes:
+    import matplotlib.pyplot as plt
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', bbox_inches='tight')
+    plt.close(fig)
+    return buffer.getvalue()
+
+
+@st.cache_data(max_entries=8)
+def distribution_png(column, noun, bins, labels, version):
+    """Histogram of `column` over `bins` next to a log-scale box plot, as PNG bytes"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 5))
+
+    # Histogram of value ranges
+    ax1.bar([str(label) for label in labels], bucket_counts(column, bins, labels))
+    ax1.set_title(f"{noun} Count Frequency")
+    ax1.set_xlabel(f"{noun} Range")
+    ax1.set_ylabel("Number of Articles")
+    ax1.tick_params(axis='x', rotation=45)
+
+    # Box plot (log scale)
+    stats = log_box_stats(column)
+    if stats:
+        ax2.bxp([stats], showfliers=False)
+    ax2.set_title(f"{noun} Distribution (log scale)")
+    ax2.set_ylabel(f"log({column} + 1)")
+    return _png(fig)
+
+
+@st.cache_data(max_entries=4)
+def stage_trends(version, runs=30):
+    """Rows/s and peak RSS per stage over the last `runs` pipeline runs; stages
+    that ran several times in a run (one scrape per tag/year) are summed"""
+    import pandas as pd
+    try:
+        df = pd.read_sql(STAGE_TRENDS_QUERY, get_connection(), params=(runs,))
+    except (sqlite3.Error, pd.errors.DatabaseError):
+        return pd.DataFrame()
+    # A stage with nothing to do (no new articles to score) has no throughput
+    df['rows_per_second'] = (df['rows'] / df['seconds']).where(df['rows'] > 0)
+    return df
+
+
+@st.cache_data(max_entries=4)
+def latest_run(version):
+    import pandas as pd
+    return pd.read_sql(LATEST_RUN_QUERY, get_connection())
+
+
+def throughput_regressions(trends, window=5, tolerance=0.25):
+    """Stages whose throughput in the latest run is more than `tolerance` below
+    their median over the previous `window` runs"""
+    flagged = []
+    latest = trends['run_id'].max()
+    for stage, runs in trends.dropna(subset=['rows_per_second']).groupby('stage'):
+        current = runs[runs['run_id'] == latest]['rows_per_second']
+        previous = runs[runs['run_id'] < latest]['rows_per_second'].tail(window)
+        if len(current) and len(previous) and current.iloc[0] < (1 - tolerance) * previous.median():
+            flagged.append((stage, current.iloc[0], previous.median()))
+    return flagged
+
+
+@st.cache_data(max_entries=4)
+def health_png(version):
+    """Throughput and peak memory per stage across runs, as PNG bytes"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    trends = stage_trends(version)
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 5))
+    for stage, runs in trends.groupby('stage'):
+        ax1.plot(runs['run_id'], runs['rows_per_second'], marker='o', label=stage)
+        ax2.plot(runs['run_id'], runs['peak_rss_mb'], marker='o', label=stage)
+    ax1.set_title("Throughput by Stage")
+    ax1.set_xlabel("Pipeline Run")
+    ax1.set_ylabel("Rows per second")
+    ax1.set_yscale('log')
+    ax1.legend()
+    ax2.set_title("Peak Memory by Stage")
+    ax2.set_xlabel("Pipeline Run")
+    ax2.set_ylabel("Peak RSS (MB)")
+    ax2.legend()
+    return _png(fig)
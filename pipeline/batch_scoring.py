@@ -0,0 +1,114 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import joblib
+import numpy as np
+import pandas as pd
+from prefect import task, get_run_logger
+from config import SCORING_CONFIG
+from pipeline.data_storage import get_connection, sql_literal
+from pipeline.telemetry import tracked_stage, record
+from pipeline.model_files import model_version, MODEL_FILES
+from pipeline.rollups import rollup_features
+
+# Read from one partition at a time: an ORDER BY over the articles view merges
+# every partition for each chunk
+UNSCORED_QUERY = """
+SELECT a.id, a.title{columns} FROM {table} a
+WHERE a.id > ? AND NOT EXISTS (
+    SELECT 1 FROM predictions p WHERE p.article_id = a.id AND p.model_version = ?
+)
+ORDER BY a.id
+LIMIT ?
+"""
+
+_model = None
+
+
+def _load_worker_model(model_path: str):
+    global _model
+    _model = joblib.load(model_path)
+
+
+def _score_titles(titles):
+    """Labels and high-engagement probabilities for a chunk of titles (a DataFrame
+    of titles and rollup features for the rollup model), in one predict_proba call"""
+    proba = _model.predict_proba(titles)
+    return _model.classes_[proba.argmax(axis=1)], proba[:, 1]
+
+
+def iter_unscored(conn, version: str, chunk_size: int, rollups: bool = False):
+    """Yield (ids, titles) for articles without a prediction from `version`,
+    partition by partition in id order. With `rollups`, titles is a DataFrame
+    that also holds each article's author and tag/year features, joined from
+    the stored rollups."""
+    for table, tag in conn.execute("SELECT name, tag FROM article_partitions ORDER BY name").fetchall():
+        columns = f", a.author_name, {sql_literal(tag)} AS tag, a.date, a.reading_time_mins" if rollups else ''
+        query = UNSCORED_QUERY.format(columns=columns, table=table)
+        last_id = 0
+        while True:
+            chunk = pd.read_sql(query, conn, params=(last_id, version, chunk_size))
+            if chunk.empty:
+                break
+            titles = chunk['title'].fillna('')
+            if rollups:
+                yield chunk['id'].to_numpy(), pd.concat([titles, rollup_features(conn, chunk)], axis=1)
+            else:
+                yield chunk['id'].to_numpy(), titles.tolist()
+            last_id = int(chunk['id'].iloc[-1])
+
+
+@task
+@tracked_stage('score')
+def score_articles(model_path: str, chunk_size: int = None, workers: int = None):
+    """Score every article the model at `model_path` has not scored yet and store
+    the results in `predictions`, tagged with the model's version"""
+    logger = get_run_logger()
+    chunk_size = chunk_size or SCORING_CONFIG['chunk_size']
+    workers = workers or SCORING_CONFIG['workers'] or os.cpu_count()
+
+    version = model_version(model_path)
+    rollups = os.path.basename(model_path) == MODEL_FILES['rollup']
+    conn = get_connection()
+    n_scored = 0
+    try:
+        # The flow process reads chunks and writes results; workers only score.
+        # At most two chunks per worker are in flight, so memory stays bounded.
+        with ProcessPoolExecutor(workers, initializer=_load_worker_model, initargs=(model_path,)) as pool:
+            in_flight = deque()
+            chunks = iter_unscored(conn, version, chunk_size, rollups)
+            while True:
+                for ids, titles in chunks:
+                    in_flight.append((ids, pool.submit(_score_titles, titles)))
+                    if len(in_flight) >= 2 * workers:
+                        break
+                if not in_flight:
+                    break
+
+                ids, future = in_flight.popleft()
+                labels, proba = future.result()
+                with conn:
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO predictions (article_id, prediction, probability, model_version) "
+                        "VALUES (?, ?, ?, ?)",
+                        zip(ids.tolist(), labels.tolist(), np.round(proba, 6).tolist(), [version] * len(ids))
+                    )
+                n_scored += len(ids)
+
+        # Keep this model's scores and those of the most recently written versions
+        with conn:
+            dropped = conn.execute("""
+            DELETE FROM predictions WHERE model_version != ? AND model_version NOT IN (
+                SELECT model_version FROM predictions
+                GROUP BY model_version ORDER BY MAX(id) DESC LIMIT ?
+            )
+            """, (version, SCORING_CONFIG['keep_versions'])).rowcount
+
+        record(rows_in=n_scored, rows_out=n_scored)
+        logger.info(f"Scored {n_scored} new articles with model {version}; dropped {dropped} older predictions")
+        return n_scored
+    except Exception as e:
+        logger.error(f"Error scoring articles: {e}")
+        return None
+    finally:
+        conn.close()
@@ -0,0 +1,138 @@
+import os
+import re
+import numpy as np
+from pipeline.text import preprocess
+
+# Everything the scorer needs is in the .npz; loading it needs NumPy only
+FORMAT_VERSION = 1
+
+
+def compact_path(model_path: str) -> str:
+    return os.path.splitext(model_path)[0] + '.npz'
+
+
+def sorted_terms(tfidf):
+    """The fitted vectorizer's terms as a sorted UTF-8 table, with each term's
+    column in the vectorizer's output"""
+    terms = np.array([t.encode('utf-8') for t in tfidf.vocabulary_], dtype=bytes)
+    columns = np.fromiter(tfidf.vocabulary_.values(), dtype=np.int64, count=len(terms))
+    order = np.argsort(terms)
+    return terms[order], columns[order]
+
+
+def vectorizer_arrays(tfidf, terms, columns) -> dict:
+    """What `CompactVectorizer` loads: the vectorizer's settings and the idf of
+    `terms` (a sorted table from `sorted_terms`) at `columns`"""
+    return {
+        'format_version': np.int32(FORMAT_VERSION),
+        'terms': terms,
+        'idf': tfidf.idf_[columns].astype(np.float32),
+        'stop_words': np.array(sorted(tfidf.get_stop_words() or []), dtype=bytes),
+        'token_pattern': np.array(tfidf.token_pattern),
+        'ngram_range': np.array(tfidf.ngram_range, dtype=np.int32),
+        'sublinear_tf': np.bool_(tfidf.sublinear_tf),
+    }
+
+
+def export_compact(pipeline, path: str, prune: bool = True) -> int:
+    """Write the TF-IDF + logistic regression `pipeline` as a compact artifact.
+
+    Terms are stored as a sorted UTF-8 table next to float32 idf and
+    coefficient arrays. With `prune`, terms whose coefficient is zero are
+    dropped; they still count towards a title's L2 norm, so callers should
+    check the result with `max_deviation` and re-export unpruned if needed.
+    Returns the number of terms written.
+    """
+    tfidf, clf = pipeline.named_steps['tfidf'], pipeline.named_steps['clf']
+    terms, columns = sorted_terms(tfidf)
+    coef = clf.coef_[0][columns].astype(np.float32)
+    keep = coef != 0 if prune else np.ones(len(terms), dtype=bool)
+
+    with open(path, 'wb') as f:
+        np.savez(
+            f,
+            **vectorizer_arrays(tfidf, terms[keep], columns[keep]),
+            coef=coef[keep],
+            intercept=np.float64(clf.intercept_[0]),
+            classes=clf.classes_,
+        )
+    return int(keep.sum())
+
+
+class CompactVectorizer:
+    """NumPy-only reimplementation of preprocess + TF-IDF over the arrays
+    written by `vectorizer_arrays`."""
+
+    def __init__(self, path: str):
+        with np.load(path) as f:
+            if int(f['format_version']) != FORMAT_VERSION:
+                raise ValueError(f"Unsupported compact model format in {path}")
+            self._load(f)
+
+    def _load(self, f):
+        self.terms = f['terms']
+        self.idf = f['idf'].astype(np.float64)
+        self.stop_words = frozenset(w.decode('utf-8') for w in f['stop_words'])
+        self.token_pattern = re.compile(str(f['token_pattern']))
+        self.ngram_range = tuple(int(n) for n in f['ngram_range'])
+        self.sublinear_tf = bool(f['sublinear_tf'])
+
+    def _features(self, title: str):
+        tokens = [t for t in self.token_pattern.findall(preprocess(title)) if t not in self.stop_words]
+        min_n, max_n = self.ngram_range
+        features = list(tokens) if min_n == 1 else []
+        for n in range(max(min_n, 2), min(max_n, len(tokens)) + 1):
+            features += [' '.join(tokens[i:i + n]) for i in range(len(tokens) - n + 1)]
+        return features
+
+    def tfidf(self, titles):
+        """L2-normalised tf-idf rows of `titles` as (title, term position, weight)
+        arrays, one entry per distinct known term of each title"""
+        features = [self._features(t) for t in titles]
+        doc = np.repeat(np.arange(len(features)), [len(f) for f in features])
+        encoded = np.array([f.encode('utf-8') for fs in features for f in fs], dtype=bytes)
+
+        # Look every feature up in the sorted term table at once
+        if not len(encoded) or not len(self.terms):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+        pos = np.searchsorted(self.terms, encoded)
+        pos[pos == len(self.terms)] = 0
+        found = self.terms[pos] == encoded
+        doc, pos = doc[found], pos[found]
+
+        # Term counts per title, then tf-idf and the L2 norm
+        keys, tf = np.unique(doc * len(self.terms) + pos, return_counts=True)
+        doc, pos = keys // len(self.terms), keys % len(self.terms)
+        tf = 1 + np.log(tf) if self.sublinear_tf else tf.astype(np.float64)
+        weights = tf * self.idf[pos]
+        norms = np.sqrt(np.bincount(doc, weights ** 2, minlength=len(features)))
+        return doc, pos, weights / norms[doc]
+
+
+class CompactScorer(CompactVectorizer):
+    """NumPy-only reimplementation of preprocess + TF-IDF + logistic regression
+    scoring over an artifact written by `export_compact`."""
+
+    def _load(self, f):
+        super()._load(f)
+        self.coef = f['coef'].astype(np.float64)
+        self.intercept = float(f['intercept'])
+        self.classes_ = f['classes']
+
+    def decision_function(self, titles):
+        doc, pos, weights = self.tfidf(titles)
+        return self.intercept + np.bincount(doc, weights * self.coef[pos], minlength=len(titles))
+
+    def predict_proba(self, titles):
+        p = 1 / (1 + np.exp(-self.decision_function(titles)))
+        return np.column_stack([1 - p, p])
+
+    def predict(self, titles):
+        return self.classes_[(self.decision_function(titles) > 0).astype(int)]
+
+
+def max_deviation(pipeline, path: str, titles) -> float:
+    """Largest absolute difference in high-engagement probability between the
+    sklearn `pipeline` and the compact artifact at `path` over `titles`"""
+    titles = list(titles)
+    return float(np.abs(CompactScorer(path).predict_proba(titles)[:, 1] - pipeline.predict_proba(titles)[:, 1]).max())
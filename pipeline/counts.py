@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+SUFFIX_MULTIPLIERS = {'K': 1_000, 'M': 1_000_000}
+NUMBER_PATTERN = r'-?(?:\d+\.?\d*|\.\d+)'
+
+
+def _cast_where(text, mask, numbers, scale=1):
+    """numbers[mask] = float(text[mask]) * scale, for the masked strings that are plain decimals"""
+    subset = pc.filter(text, pa.array(mask))
+    valid = pc.fill_null(pc.match_substring_regex(subset, f'^{NUMBER_PATTERN}$'), False)
+    valid = valid.to_numpy(zero_copy_only=False)
+    positions = np.flatnonzero(mask)[valid]
+    parsed = pc.cast(pc.filter(subset, pa.array(valid)), pa.float64())
+    numbers[positions] = parsed.to_numpy(zero_copy_only=False) * scale
+
+
+def parse_counts(values) -> pd.Series:
+    """Parse Medium-style counts ("1.2K", "3,400", "2M", 57, blanks) into int64.
+
+    Vectorized with Arrow compute kernels: plain decimals are cast in one pass
+    and only the K/M-suffixed leftovers get a second one. Anything unparseable
+    becomes 0.
+    """
+    s = values if isinstance(values, pd.Series) else pd.Series(values)
+
+    if pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s):
+        numbers = s.to_numpy(dtype='float64', na_value=np.nan, copy=True)
+    else:
+        # Mixed object columns (ints next to "1.2K") become strings first
+        text = s.where(s.isna(), s.astype(str)) if s.dtype == object else s
+        # As strings even when every value is missing (an all-blank column)
+        text = pa.array(text, type=pa.string(), from_pandas=True)
+        text = pc.utf8_upper(pc.utf8_trim_whitespace(pc.replace_substring(text, ',', '')))
+        numbers = np.full(len(s), np.nan)
+
+        _cast_where(text, np.ones(len(s), dtype=bool), numbers)
+        for suffix, multiplier in SUFFIX_MULTIPLIERS.items():
+            ends = pc.fill_null(pc.ends_with(text, suffix), False).to_numpy(zero_copy_only=False)
+            suffixed = np.isnan(numbers) & ends
+            if suffixed.any():
+                _cast_where(pc.utf8_slice_codeunits(text, 0, -1), suffixed, numbers, multiplier)
+
+    numbers[~np.isfinite(numbers)] = 0
+    return pd.Series(np.rint(numbers).astype('int64'), index=s.index, name=s.name)
@@ -1,106 +1,182 @@
 import os
 import csv
-from time import sleep
-import requests
-from bs4 import BeautifulSoup
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+import calendar
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
 from prefect import task, get_run_logger
-from datetime import datetime
-from config import SCRAPING_CONFIG, PATHS
+from config import SCRAPING_CONFIG, PATHS, CACHE_CONFIG
+from pipeline.fetcher import fetch_pages
+from pipeline.extractors import get_extractor
+from pipeline.html_cache import put_page, get_page
+from pipeline.data_storage import get_scrape_checkpoints
+from pipeline.telemetry import tracked_stage, record, current_stage
+
+COLUMNS = ['date', 'title', 'claps', 'responses', 'author_name', 'followers', 'reading_time_mins']
+
+def archive_days(year: int):
+    """Yield every day of `year` as a date."""
+    for month in range(1, 13):
+        for day in range(1, calendar.monthrange(year, month)[1] + 1):
+            yield date(year, month, day)
+
+def days_to_fetch(tag: str, year: int, refetch_recent: bool = False):
+    """Days of tag/year with no checkpoint yet, plus (optionally) days whose
+    last fetch happened before their clap counts had settled."""
+    checkpoints = get_scrape_checkpoints(tag, year)
+    settle = timedelta(days=SCRAPING_CONFIG['clap_settle_days'])
+    today = date.today()
+
+    pending = []
+    for day in archive_days(year):
+        if day > today:
+            break
+        fetched_at = checkpoints.get(day.isoformat())
+        if fetched_at is None or (refetch_recent and fetched_at.date() < day + settle):
+            pending.append(day)
+    return pending
+
+def drop_dates_from_csv(csv_filename: str, date_strs):
+    """Remove rows for `date_strs` so re-fetched days are not appended twice."""
+    tmp_filename = f"{csv_filename}.tmp"
+    with open(csv_filename, newline='', encoding='utf-8') as src, \
+            open(tmp_filename, 'w', newline='', encoding='utf-8') as dst:
+        writer = csv.writer(dst)
+        for i, row in enumerate(csv.reader(src)):
+            if i == 0 or (row and row[0] not in date_strs):
+                writer.writerow(row)
+    os.replace(tmp_filename, csv_filename)
+
+def parse_archive_page(html: str, date_str: str, extractor: str = None):
+    """Parse one archive page into CSV rows. Returns (rows, errors)."""
+    extract = get_extractor(extractor)
+    stories, errors = extract(html, SCRAPING_CONFIG['max_stories_per_day'])
+
+    rows = [
+        [
+            date_str,
+            f'"{title}"' if ',' in title else title,
+            claps,
+            responses,
+            author_name,
+            'N/A',
+            reading_time
+        ]
+        for title, claps, responses, author_name, reading_time in stories
+    ]
+    return rows, errors
 
 @task
-def scrape_medium_articles(tag: str, year: int):
+@tracked_stage('scrape')
+def scrape_medium_articles(tag: str, year: int, base_url: str = None, refetch_recent: bool = False):
+    """Fetch the tag/year archive days not scraped yet into its CSV. Returns the
+    CSV path and the checkpoints of the days fetched, (ISO date, fetched_at,
+    story_count), which `store_raw_data_to_db` records with the stored rows;
+    scrape jobs run concurrently and leave the database to the flow's stores."""
     logger = get_run_logger()
-    session = requests.Session()
-    retries = Retry(total=5, backoff_factor=1, status_forcelist=[500, 502, 503, 504])
-    session.mount('https://', HTTPAdapter(max_retries=retries))
-
-    stories_data = []
+    record(label=f"{tag}/{year}")
     os.makedirs(PATHS['raw_data'], exist_ok=True)
     csv_filename = os.path.join(PATHS['raw_data'], f"medium_{tag}_{year}.csv")
-    
-    columns = ['date', 'title', 'claps', 'responses', 'author_name', 'followers', 'reading_time_mins']
 
     if not os.path.exists(csv_filename):
         with open(csv_filename, 'w', newline='', encoding='utf-8') as f:
             writer = csv.writer(f)
-            writer.writerow(columns)
+            writer.writerow(COLUMNS)
+
+    pending = days_to_fetch(tag, year, refetch_recent)
+    if not pending:
+        logger.info(f"All archive days already scraped for tag: {tag}, year: {year}")
+        return csv_filename, []
+
+    # Rows of any day without a checkpoint (e.g. a crash mid-write) or being
+    # re-fetched are dropped first, so every day appears in the CSV once
+    date_strs = {day.strftime('%m/%d/%Y'): day for day in pending}
+    drop_dates_from_csv(csv_filename, date_strs)
+
+    url = f"{base_url or SCRAPING_CONFIG['base_url']}{tag}"
+    logger.info(f"Starting scrape for tag: {tag}, year: {year} ({len(pending)} days to fetch)")
+
+    urls = {f"{url}/archive/{day:%Y/%m/%d}": date_str for date_str, day in date_strs.items()}
+    start_bytes = os.path.getsize(csv_filename)
+    n_rows = 0
+    checkpoints = []
+    try:
+        # Pages are fetched concurrently but come back in calendar order, so the
+        # CSV is written exactly as the serial scraper wrote it
+        for archive_url, html, error in fetch_pages(list(urls), current_stage()):
+            if error is not None:
+                logger.error(f"Failed to load {archive_url}: {str(error)[:100]}")
+                continue
 
-    url = f"{SCRAPING_CONFIG['base_url']}{tag}"
-    logger.info(f"Starting scrape for tag: {tag}, year: {year}")
+            put_page(archive_url, html)
+            date_str = urls[archive_url]
+            rows, errors = parse_archive_page(html, date_str)
+            for e in errors:
+                logger.error(f"Error parsing story: {str(e)[:100]}")
 
-    for month in range(1, 13):
-        if month in [1, 3, 5, 7, 8, 10, 12]:
-            n_days = 31
-        elif month in [4, 6, 9, 11]:
-            n_days = 30
-        else:
-            n_days = 29 if year % 4 == 0 else 28
-
-        for day in range(1, n_days + 1):
-            date_str = f"{month:02d}/{day:02d}/{year}"
-            archive_url = f"{url}/archive/{year}/{month:02d}/{day:02d}"
-            
-            try:
-                page = session.get(archive_url, timeout=10)
-                soup = BeautifulSoup(page.text, 'html.parser')
-                stories = soup.find_all('div', class_='streamItem streamItem--postPreview js-streamItem')
-                
-                if len(stories) > SCRAPING_CONFIG['max_stories_per_day']:
-                    stories = stories[:SCRAPING_CONFIG['max_stories_per_day']]
-
-                for story in stories:
-                    try:
-                        author_box = story.find('div', class_='postMetaInline u-floatLeft u-sm-maxWidthFullWidth')
-                        if not author_box:
-                            continue
-
-                        author_link_tag = author_box.find('a')
-                        author_url = author_link_tag['href']
-                        author_name = author_url.split('@')[-1].strip('/')
-
-                        reading_time = author_box.find('span', class_='readingTime')['title'].split()[0]
-                        title = story.find('h3').text.strip() if story.find('h3') else '-'
-                        title = title.replace('\n', ' ').replace('\t', ' ')
-
-                        claps_tag = story.find('button', class_='button button--chromeless u-baseColor--buttonNormal js-multirecommendCountButton u-disablePointerEvents')
-                        claps = claps_tag.text.strip().replace(',', '') if claps_tag else '0'
-
-                        responses_tag = story.find('a', class_='button button--chromeless u-baseColor--buttonNormal')
-                        responses = responses_tag.text.strip().split()[0] if responses_tag else '0'
-
-                        story_data = [
-                            date_str,
-                            f'"{title}"' if ',' in title else title,
-                            claps,
-                            responses,
-                            author_name,
-                            'N/A',
-                            reading_time
-                        ]
-
-                        stories_data.append(story_data)
-                        if len(stories_data) >= 5:
-                            with open(csv_filename, 'a', newline='', encoding='utf-8') as f:
-                                writer = csv.writer(f)
-                                writer.writerows(stories_data)
-                            stories_data.clear()
-
-                    except Exception as e:
-                        logger.error(f"Error parsing story: {str(e)[:100]}")
-                        continue
-
-                sleep(SCRAPING_CONFIG['request_delay'])
-
-            except Exception as e:
-                logger.error(f"Failed to load {archive_url}: {str(e)[:100]}")
-                continue
+            if rows:
+                with open(csv_filename, 'a', newline='', encoding='utf-8') as f:
+                    writer = csv.writer(f)
+                    writer.writerows(rows)
+                n_rows += len(rows)
 
-    if stories_data:
-        with open(csv_filename, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerows(stories_data)
+            # Checkpoint only once the day's rows are on disk
+            checkpoints.append((date_strs[date_str].isoformat(), datetime.now().isoformat(timespec='seconds'), len(rows)))
+    finally:
+        record(rows_out=n_rows, bytes_written=os.path.getsize(csv_filename) - start_bytes)
 
     logger.info(f"Completed scraping for tag: {tag}, year: {year}")
-    return csv_filename
\ No newline at end of file
+    return csv_filename, checkpoints
+
+def _reparse_cached_day(job):
+    archive_url, date_str = job
+    html = get_page(archive_url)
+    if html is None:
+        return archive_url, None, []
+    rows, errors = parse_archive_page(html, date_str)
+    return archive_url, rows, errors
+
+@task
+@tracked_stage('reparse')
+def reparse_cached_pages(tag: str, year: int, base_url: str = None):
+    """Rebuild the tag/year CSV from cached archive pages, without touching the network.
+    Days missing from the cache keep their rows from the existing CSV. Returns the
+    CSV path and the ISO dates that were reparsed."""
+    logger = get_run_logger()
+    record(label=f"{tag}/{year}")
+    os.makedirs(PATHS['raw_data'], exist_ok=True)
+    csv_filename = os.path.join(PATHS['raw_data'], f"medium_{tag}_{year}.csv")
+
+    url = f"{base_url or SCRAPING_CONFIG['base_url']}{tag}"
+    jobs = [(f"{url}/archive/{day:%Y/%m/%d}", day.strftime('%m/%d/%Y')) for day in archive_days(year)]
+    logger.info(f"Reparsing cached pages for tag: {tag}, year: {year}")
+
+    tmp_filename = f"{csv_filename}.tmp"
+    reparsed, uncached, n_rows = [], set(), 0
+    with open(tmp_filename, 'w', newline='', encoding='utf-8') as f, \
+            ProcessPoolExecutor(max_workers=CACHE_CONFIG['reparse_workers']) as executor:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        for (archive_url, rows, errors), (_, date_str) in zip(executor.map(_reparse_cached_day, jobs, chunksize=8), jobs):
+            if rows is None:
+                uncached.add(date_str)
+                continue
+            for e in errors:
+                logger.error(f"Error parsing story: {str(e)[:100]}")
+            writer.writerows(rows)
+            n_rows += len(rows)
+            reparsed.append(datetime.strptime(date_str, '%m/%d/%Y').date().isoformat())
+        # Nothing to rebuild uncached days from: carry their scraped rows over
+        if uncached and os.path.exists(csv_filename):
+            with open(csv_filename, newline='', encoding='utf-8') as old:
+                for row in csv.DictReader(old):
+                    if row['date'] in uncached:
+                        writer.writerow([row[c] for c in COLUMNS])
+                        n_rows += 1
+    os.replace(tmp_filename, csv_filename)
+    record(rows_out=n_rows, bytes_written=os.path.getsize(csv_filename))
+
+    if uncached:
+        logger.warning(f"{len(uncached)} archive days for tag: {tag}, year: {year} are not in the cache; "
+                       "their stored rows are kept")
+    logger.info(f"Completed reparse for tag: {tag}, year: {year}")
+    return csv_filename, reparsed
@@ -1,46 +1,447 @@
+import re
 import sqlite3
+import numpy as np
 import pandas as pd
 from prefect import task, get_run_logger
 from config import DB_CONFIG, PATHS
+from pipeline.counts import parse_counts
+from pipeline.telemetry import tracked_stage, record
+from pipeline.rollups import merge_delta, rebuild_rollups, rollup_delta, rollups_stale
 import os
+from itertools import islice
+from datetime import datetime
+
+ARTICLE_COLUMNS = ['date', 'title', 'claps', 'responses', 'author_name', 'followers', 'reading_time_mins', 'tag']
+NATURAL_KEY = ['tag', 'date', 'author_name', 'title']
+VALUE_COLUMNS = [c for c in ARTICLE_COLUMNS if c not in NATURAL_KEY]
+
+# Articles are stored in one table per tag and year, `articles_<tag>_<year>`
+# (listed in article_partitions), behind the `articles` view that reads them
+# all with UNION ALL. A partition has no tag column: each branch of the view
+# selects its tag as a constant, so a query on the view filtered by tag skips
+# the other partitions' tables. Dates are ISO strings, indexed per partition,
+# so a date range is one index range per partition. Ids come from
+# article_sequence, unique and increasing across partitions.
+PARTITION_COLUMNS = [c for c in ARTICLE_COLUMNS if c != 'tag']
+PARTITION_KEY = [c for c in NATURAL_KEY if c != 'tag']
+
+# External-content FTS5 index over the titles of the articles view. Triggers on
+# each partition take deleted rows and changed titles out; new rows are added
+# in bulk by `index_new_titles`, which costs a fraction of an insert trigger
+# firing once per row
+TITLE_SEARCH = "CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(title, content='articles', content_rowid='id')"
+TITLE_SEARCH_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS {table}_fts_delete AFTER DELETE ON {table} BEGIN
+        INSERT INTO articles_fts (articles_fts, rowid, title) VALUES ('delete', old.id, old.title);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS {table}_fts_update AFTER UPDATE OF title ON {table} BEGIN
+        INSERT INTO articles_fts (articles_fts, rowid, title) VALUES ('delete', old.id, old.title);
+        INSERT INTO articles_fts (rowid, title) VALUES (new.id, new.title);
+    END
+    """
+]
+
+# Scores of deleted articles (reparsed days, collapsed duplicates) go with them
+PREDICTIONS_TRIGGER = """
+CREATE TRIGGER IF NOT EXISTS {table}_predictions_delete AFTER DELETE ON {table} BEGIN
+    DELETE FROM predictions WHERE article_id = old.id;
+END
+"""
+
+def has_predictions(conn) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'predictions'").fetchone() is not None
+
+def create_prediction_cleanup(conn):
+    """Create the partitions' missing prediction cleanup triggers, first
+    deleting the predictions of articles deleted before they existed"""
+    missing = [
+        table for table in article_partitions(conn)
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = ?",
+                            (f"{table}_predictions_delete",)).fetchone()
+    ]
+    if missing:
+        conn.execute(f"DELETE FROM predictions WHERE article_id NOT IN (SELECT id FROM {DB_CONFIG['table_name']})")
+        for table in missing:
+            conn.execute(PREDICTIONS_TRIGGER.format(table=table))
+
+def has_title_search(conn) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'articles_fts'").fetchone() is not None
+
+def create_title_search(conn):
+    """Create the articles_fts index and the partitions' triggers, indexing the
+    stored titles if the index is new"""
+    exists = has_title_search(conn)
+    conn.execute(TITLE_SEARCH)
+    for table in article_partitions(conn):
+        for statement in TITLE_SEARCH_TRIGGERS:
+            conn.execute(statement.format(table=table))
+    if not exists:
+        index_new_titles(conn, 0)
+
+def index_new_titles(conn, after_id: int):
+    """Add the titles of articles with id > after_id to articles_fts, if it
+    exists. In id order: FTS5 appends ascending rowids several times faster
+    than the partition-by-partition order the view reads them in."""
+    if has_title_search(conn):
+        conn.execute(
+            "INSERT INTO articles_fts (rowid, title) SELECT id, title FROM articles WHERE id > ? ORDER BY id", (after_id,)
+        )
+
+def iso_dates(dates: pd.Series) -> pd.Series:
+    """Archive-page MM/DD/YYYY dates as YYYY-MM-DD strings (None where
+    unparseable); only the distinct values are converted"""
+    codes, uniques = pd.factorize(dates)
+    days = pd.to_datetime(pd.Series(uniques, dtype=object), format='%m/%d/%Y', errors='coerce')
+    # Missing dates have code -1, which picks the trailing None
+    days = np.append(days.dt.strftime('%Y-%m-%d').to_numpy(dtype=object), None)
+    days[pd.isna(days)] = None
+    return pd.Series(days[codes], index=dates.index)
+
+def partition_name(tag: str, year) -> str:
+    """Preferred table name for the articles of `tag` dated in `year` (None for
+    undated ones); `create_partition` adds a suffix if another tag has it"""
+    return f"{DB_CONFIG['table_name']}_{re.sub(r'[^0-9A-Za-z]', '_', tag)}_{'undated' if year is None else int(year)}"
+
+def article_partitions(conn, tag: str = None, year: int = None):
+    """Names of the partition tables, only those of `tag` and/or `year` if given"""
+    return [name for name, in conn.execute(
+        "SELECT name FROM article_partitions WHERE (?1 IS NULL OR tag = ?1) AND (?2 IS NULL OR year = ?2) ORDER BY name",
+        (tag, year)
+    )]
+
+def sql_literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+def create_partition_registry(conn):
+    """Create the article_partitions list and the article id sequence"""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS article_partitions (
+        name TEXT PRIMARY KEY,
+        tag TEXT NOT NULL,
+        year INTEGER,
+        UNIQUE (tag, year)
+    )
+    """)
+    conn.execute("CREATE TABLE IF NOT EXISTS article_sequence (last_id INTEGER NOT NULL)")
+    conn.execute("INSERT INTO article_sequence (last_id) SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM article_sequence)")
+
+def create_articles_view(conn):
+    """(Re)create the articles view over every partition"""
+    view = DB_CONFIG['table_name']
+    branches = [
+        f"SELECT id, {', '.join(c if c != 'tag' else sql_literal(tag) + ' AS tag' for c in ARTICLE_COLUMNS)}, created_at "
+        f"FROM {name}"
+        for name, tag in conn.execute("SELECT name, tag FROM article_partitions ORDER BY name")
+    ]
+    # Before the first partition: no rows, same columns
+    branches = branches or [f"SELECT {', '.join(f'NULL AS {c}' for c in ['id', *ARTICLE_COLUMNS, 'created_at'])} LIMIT 0"]
+    conn.execute(f"DROP VIEW IF EXISTS {view}")
+    conn.execute(f"CREATE VIEW {view} AS {' UNION ALL '.join(branches)}")
+
+def create_partition(conn, tag: str, year) -> str:
+    """Name of the partition table for tag/year, created along with its indexes,
+    title search and prediction cleanup triggers and a branch of the articles
+    view if it is new"""
+    year = None if year is None else int(year)
+    row = conn.execute("SELECT name FROM article_partitions WHERE tag = ? AND year IS ?", (tag, year)).fetchone()
+    if row:
+        return row[0]
+    # Tags differing only in punctuation or case (data-science, data_science,
+    # Data_Science) sanitise to the same name; SQLite names ignore case
+    base = name = partition_name(tag, year)
+    suffix = 1
+    while conn.execute("SELECT 1 FROM sqlite_master WHERE name = ? COLLATE NOCASE", (name,)).fetchone():
+        suffix += 1
+        name = f"{base}_{suffix}"
+
+    conn.execute(f"""
+    CREATE TABLE {name} (
+        id INTEGER PRIMARY KEY,
+        date TEXT,
+        title TEXT,
+        claps INTEGER,
+        responses INTEGER,
+        author_name TEXT,
+        followers TEXT,
+        reading_time_mins INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    # The natural key (the tag is the partition's) also serves date ranges
+    conn.execute(f"CREATE UNIQUE INDEX {name}_natural_key ON {name} ({', '.join(PARTITION_KEY)})")
+    # Serve the frontend's top-N tables and histograms from indexes
+    conn.execute(f"CREATE INDEX {name}_claps ON {name} (claps)")
+    conn.execute(f"CREATE INDEX {name}_responses ON {name} (responses)")
+    if has_title_search(conn):
+        for statement in TITLE_SEARCH_TRIGGERS:
+            conn.execute(statement.format(table=name))
+    if has_predictions(conn):
+        conn.execute(PREDICTIONS_TRIGGER.format(table=name))
+
+    conn.execute("INSERT INTO article_partitions (name, tag, year) VALUES (?, ?, ?)", (name, tag, year))
+    create_articles_view(conn)
+    return name
+
+def next_article_ids(conn, n: int) -> int:
+    """Reserve `n` article ids and return the first; ids are never reused"""
+    conn.execute("UPDATE article_sequence SET last_id = last_id + ?", (n,))
+    return conn.execute("SELECT last_id FROM article_sequence").fetchone()[0] - n + 1
+
+def partition_articles(conn):
+    """Move the rows of a single articles table, as databases created before
+    partitioning have, into partitions with ISO dates, keeping their ids"""
+    table = f"{DB_CONFIG['table_name']}_unpartitioned"
+    conn.execute(f"ALTER TABLE {DB_CONFIG['table_name']} RENAME TO {table}")
+    # AUTOINCREMENT never reused ids up to the table's sequence, deleted or not
+    conn.execute(f"""
+    UPDATE article_sequence SET last_id = MAX(
+        last_id,
+        (SELECT COALESCE(MAX(id), 0) FROM {table}),
+        COALESCE((SELECT seq FROM sqlite_sequence WHERE name = '{table}'), 0)
+    )
+    """)
+
+    iso = ("CASE WHEN date GLOB '[0-9][0-9]/[0-9][0-9]/[0-9][0-9][0-9][0-9]' "
+           "THEN substr(date, 7, 4) || '-' || substr(date, 1, 2) || '-' || substr(date, 4, 2) END")
+    year = f"CAST(substr({iso}, 1, 4) AS INTEGER)"
+    columns = [iso if c == 'date' else c for c in PARTITION_COLUMNS]
+    for tag, partition_year in conn.execute(f"SELECT DISTINCT tag, {year} FROM {table}").fetchall():
+        conn.execute(f"""
+        INSERT INTO {create_partition(conn, tag, partition_year)} (id, {', '.join(PARTITION_COLUMNS)}, created_at)
+        SELECT id, {', '.join(columns)}, created_at FROM {table}
+        WHERE tag = ? AND {year} IS ?
+        ORDER BY id
+        """, (tag, partition_year))
+    conn.execute(f"DROP TABLE {table}")
+
+def coalesce_null_keys(conn) -> int:
+    """Store '' for the NULL natural-key parts stored before stores wrote ''
+    themselves, deleting the copies re-inserted because NULL keys never
+    conflicted (the latest copy wins) and taking them out of the rollups.
+    Returns how many rows were deleted."""
+    has_null = ' OR '.join(f"{c} IS NULL" for c in PARTITION_KEY)
+    key = ', '.join(f"COALESCE({c}, '')" for c in PARTITION_KEY)
+    coalesced = ', '.join(f"{c} = COALESCE({c}, '')" for c in PARTITION_KEY)
+    deleted = 0
+    for partition, tag in conn.execute("SELECT name, tag FROM article_partitions").fetchall():
+        if not conn.execute(f"SELECT 1 FROM {partition} WHERE {has_null} LIMIT 1").fetchone():
+            continue
+        # Keys without a NULL are unique already, so only their groups have copies
+        copies = pd.read_sql(
+            f"SELECT id, {', '.join(PARTITION_COLUMNS)} FROM {partition} "
+            f"WHERE id NOT IN (SELECT MAX(id) FROM {partition} GROUP BY {key})", conn
+        ).assign(tag=tag)
+        conn.executemany(f"DELETE FROM {partition} WHERE id = ?", [(i,) for i in copies['id'].tolist()])
+        conn.execute(f"UPDATE {partition} SET {coalesced} WHERE {has_null}")
+        merge_delta(conn, rollup_delta(removed=copies))
+        deleted += len(copies)
+    return deleted
+
+def get_connection():
+    """Open the pipeline database with the tuned pragmas from DB_CONFIG"""
+    conn = sqlite3.connect(DB_CONFIG['db_path'], timeout=DB_CONFIG['timeout'])
+    for pragma, value in DB_CONFIG['pragmas'].items():
+        conn.execute(f"PRAGMA {pragma} = {value}")
+    return conn
 
 @task
 def create_database_tables():
     logger = get_run_logger()
+    conn = None
     try:
         # Create data directory if it doesn't exist
         os.makedirs(os.path.dirname(DB_CONFIG['db_path']), exist_ok=True)
         
-        conn = sqlite3.connect(DB_CONFIG['db_path'])
+        conn = get_connection()
         cursor = conn.cursor()
         
-        # Create tables if they don't exist
+        # Articles live in one table per tag and year behind the articles view
+        create_partition_registry(conn)
+        
+        unpartitioned = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'articles'"
+        ).fetchone()
+        if unpartitioned:
+            # Rows duplicated by append-only loads before the natural key
+            # existed are collapsed to their latest copy
+            has_key = cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_articles_natural_key'"
+            ).fetchone()
+            if not has_key:
+                cursor.execute("""
+                DELETE FROM articles WHERE id NOT IN (
+                    SELECT MAX(id) FROM articles GROUP BY tag, date, author_name, title
+                )
+                """)
+        elif not cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'view' AND name = 'articles'").fetchone():
+            create_articles_view(conn)
+        
+        # Keyword search over titles for the predictor page's similar-articles filter
+        try:
+            create_title_search(conn)
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Title search index unavailable (SQLite built without FTS5?): {e}")
+        
+        # Indexed titles keep their ids, so the title search index stays valid
+        if unpartitioned:
+            logger.info("Moving the articles table into per-tag/year partitions...")
+            conn.commit()
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                partition_articles(conn)
+        
         cursor.execute("""
-        CREATE TABLE IF NOT EXISTS articles (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            date TEXT,
-            title TEXT,
-            claps INTEGER,
-            responses INTEGER,
-            author_name TEXT,
-            followers TEXT,
-            reading_time_mins INTEGER,
-            tag TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        CREATE TABLE IF NOT EXISTS scrape_checkpoints (
+            tag TEXT NOT NULL,
+            date TEXT NOT NULL,
+            fetched_at TIMESTAMP NOT NULL,
+            story_count INTEGER NOT NULL,
+            PRIMARY KEY (tag, date)
         )
         """)
         
         cursor.execute("""
-        CREATE TABLE IF NOT EXISTS predictions (
+        CREATE TABLE IF NOT EXISTS etl_watermarks (
+            stage TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL,
+            output_bytes INTEGER NOT NULL,
+            updated_at TIMESTAMP NOT NULL
+        )
+        """)
+        
+        # No foreign key: articles is a view over the partitions, which a
+        # foreign key cannot reference
+        predictions = """
+        CREATE TABLE IF NOT EXISTS {table} (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             article_id INTEGER,
             prediction INTEGER,
             probability REAL,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (article_id) REFERENCES articles(id)
+            model_version TEXT
+        )
+        """
+        cursor.execute(predictions.format(table='predictions'))
+        
+        # Predictions are tagged with the version of the model that made them
+        prediction_columns = [row[1] for row in cursor.execute("PRAGMA table_info(predictions)")]
+        if 'model_version' not in prediction_columns:
+            cursor.execute("ALTER TABLE predictions ADD COLUMN model_version TEXT")
+        # Older databases reference articles(id), which moving articles into
+        # partitions renamed to the dropped articles_unpartitioned: copy them
+        # into a table without the reference
+        if cursor.execute("SELECT 1 FROM pragma_foreign_key_list('predictions')").fetchone():
+            logger.info("Recreating the predictions table without its articles foreign key...")
+            conn.commit()
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute(predictions.format(table='predictions_rebuilt'))
+                # Recreated below; SQLite won't rename a table over triggers naming a missing one
+                for table in article_partitions(conn):
+                    conn.execute(f"DROP TRIGGER IF EXISTS {table}_predictions_delete")
+                columns = 'id, article_id, prediction, probability, created_at, model_version'
+                conn.execute(f"INSERT INTO predictions_rebuilt ({columns}) SELECT {columns} FROM predictions")
+                conn.execute("DROP TABLE predictions")
+                conn.execute("ALTER TABLE predictions_rebuilt RENAME TO predictions")
+        cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_predictions_article_model
+        ON predictions (article_id, model_version)
+        """)
+        cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_predictions_model_probability
+        ON predictions (model_version, probability)
+        """)
+        create_prediction_cleanup(conn)
+
+        # Per-stage performance telemetry, see pipeline/telemetry.py
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS pipeline_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            started_at TIMESTAMP NOT NULL,
+            finished_at TIMESTAMP,
+            status TEXT NOT NULL,
+            options TEXT
         )
         """)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stage_metrics (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_id INTEGER NOT NULL,
+            stage TEXT NOT NULL,
+            label TEXT,
+            started_at TIMESTAMP NOT NULL,
+            seconds REAL NOT NULL,
+            rows_in INTEGER,
+            rows_out INTEGER,
+            rows_per_second REAL,
+            peak_rss_mb REAL,
+            bytes_written INTEGER,
+            http_requests INTEGER,
+            http_bytes INTEGER,
+            http_retries INTEGER,
+            http_errors INTEGER,
+            status TEXT NOT NULL,
+            profile_path TEXT,
+            FOREIGN KEY (run_id) REFERENCES pipeline_runs(id)
+        )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_stage_metrics_stage_run ON stage_metrics (stage, run_id)")
+
+        # Input fingerprint and output of each stage's last successful run, see pipeline/stage_cache.py
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stage_cache (
+            stage TEXT PRIMARY KEY,
+            fingerprint TEXT NOT NULL,
+            output_path TEXT NOT NULL,
+            output_signature TEXT,
+            updated_at TIMESTAMP NOT NULL
+        )
+        """)
+
+        # Per-author and per-tag/day aggregates, see pipeline/rollups.py
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS author_stats (
+            author_name TEXT PRIMARY KEY,
+            articles INTEGER NOT NULL,
+            high_engagement INTEGER NOT NULL,
+            claps_sum INTEGER NOT NULL,
+            log_claps_sum REAL NOT NULL,
+            responses_sum INTEGER NOT NULL,
+            reading_time_sum INTEGER NOT NULL,
+            clap_sketch TEXT NOT NULL
+        )
+        """)
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS tag_day_stats (
+            tag TEXT NOT NULL,
+            day TEXT NOT NULL,
+            articles INTEGER NOT NULL,
+            high_engagement INTEGER NOT NULL,
+            claps_sum INTEGER NOT NULL,
+            log_claps_sum REAL NOT NULL,
+            responses_sum INTEGER NOT NULL,
+            reading_time_sum INTEGER NOT NULL,
+            clap_sketch TEXT NOT NULL,
+            PRIMARY KEY (tag, day)
+        )
+        """)
+        cursor.execute("CREATE TABLE IF NOT EXISTS rollup_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
         
+        conn.commit()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            removed = coalesce_null_keys(conn)
+        if removed:
+            logger.info(f"Removed {removed} copies of stories with a missing date, author or title")
+        
+        # Existing articles (or a changed clap threshold) need a one-off full build
+        if rollups_stale(conn):
+            logger.info("Rebuilding author and tag rollups from the articles table...")
+            rebuild_rollups(conn)
+
         conn.commit()
         logger.info("Database tables created successfully")
     except Exception as e:
@@ -49,37 +450,268 @@ def create_database_tables():
         if conn:
             conn.close()
 
+def get_scrape_checkpoints(tag: str, year: int):
+    """Return {ISO date: fetched_at datetime} for the archive days of tag/year already fetched"""
+    conn = get_connection()
+    try:
+        rows = conn.execute(
+            "SELECT date, fetched_at FROM scrape_checkpoints WHERE tag = ? AND date LIKE ?",
+            (tag, f"{year}-%")
+        ).fetchall()
+    finally:
+        conn.close()
+    return {day: datetime.fromisoformat(fetched_at) for day, fetched_at in rows}
+
+def record_scrape_checkpoints(conn, tag: str, checkpoints):
+    """Mark the archive pages of `tag` in `checkpoints` ((ISO date, fetched_at,
+    story_count) from the scrape) as fetched, inside the caller's transaction"""
+    conn.executemany(
+        "INSERT OR REPLACE INTO scrape_checkpoints (tag, date, fetched_at, story_count) VALUES (?, ?, ?, ?)",
+        [(tag, day, fetched_at, story_count) for day, fetched_at, story_count in checkpoints]
+    )
+
+def stored_versions(conn, df: pd.DataFrame) -> pd.DataFrame:
+    """Stored rows sharing a natural key with a row of `df`, read day by day off
+    the natural-key index. Stores write '' for missing key parts: a NULL one
+    would never conflict (see `coalesce_null_keys`)."""
+    table = DB_CONFIG['table_name']
+    query = f"SELECT {', '.join(ARTICLE_COLUMNS)} FROM {table} WHERE tag = ? AND date = ?"
+    days = df[['tag', 'date']].dropna().drop_duplicates().itertuples(index=False, name=None)
+    stored = pd.DataFrame([row for day in days for row in conn.execute(query, day)], columns=ARTICLE_COLUMNS)
+    return stored.dropna(subset=NATURAL_KEY).merge(df[NATURAL_KEY].dropna(), on=NATURAL_KEY)
+
+def replaced_day_rows(conn, df: pd.DataFrame, tag: str, days) -> pd.DataFrame:
+    """Stored articles of `tag` dated on `days` (ISO dates) that `df`, the
+    rebuilt rows of those days, no longer has, with their partition"""
+    keys = pd.MultiIndex.from_frame(df[NATURAL_KEY])
+    by_year = {}
+    for day in days:
+        by_year.setdefault(int(day[:4]), []).append(day)
+    frames = []
+    for year, year_days in by_year.items():
+        for partition in article_partitions(conn, tag, year):
+            stored = pd.read_sql(
+                f"SELECT id, {', '.join(PARTITION_COLUMNS)} FROM {partition} "
+                f"WHERE date IN ({', '.join('?' * len(year_days))})",
+                conn, params=year_days
+            ).assign(tag=tag, partition=partition)
+            frames.append(stored[~pd.MultiIndex.from_frame(stored[NATURAL_KEY]).isin(keys)])
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=['id', 'partition'])
+
+def stage_articles(conn, df: pd.DataFrame, replace_days=None) -> dict:
+    """First half of an upsert of `df` (ISO dates), run before the write lock:
+    read the stored versions, copy the rows into the connection's TEMP
+    staged_articles table and work out the rollup delta. With `replace_days`
+    the stored rows of those days that `df` no longer has are marked for
+    deletion. Reads only `df`'s own tag/year partitions, which no other store
+    writes meanwhile."""
+    n_rows = len(df)
+
+    # Within one file the last copy of a story wins
+    df = df.drop_duplicates(subset=NATURAL_KEY, keep='last')
+    # Overwritten rows leave the rollups with their old values
+    replaced = stored_versions(conn, df)
+    # Only the days a reparse rebuilt; stored rows of other days stay
+    gone = replaced_day_rows(conn, df, df['tag'].iloc[0], replace_days) if replace_days and len(df) else None
+
+    # Stored stories keep their ids; new ones are numbered here and take ids
+    # from the sequence under the lock
+    new = df[NATURAL_KEY].merge(replaced[NATURAL_KEY], how='left', indicator=True)['_merge'].eq('left_only').to_numpy()
+    seq = np.full(len(df), None, dtype=object)
+    seq[new] = np.arange(new.sum()).tolist()
+    years = pd.to_numeric(df['date'].str[:4], errors='coerce')
+    values = df[PARTITION_COLUMNS].astype(object)
+    values = values.where(values.notna(), None).assign(
+        seq=seq, tag=df['tag'].to_numpy(), year=years.astype(object).where(years.notna(), None).to_numpy()
+    )[['seq', 'tag', 'year', *PARTITION_COLUMNS]]
+
+    conn.execute("DROP TABLE IF EXISTS temp.staged_articles")
+    conn.execute(f"CREATE TEMP TABLE staged_articles (seq INTEGER, tag TEXT, year INTEGER, {', '.join(PARTITION_COLUMNS)})")
+    insert = f"INSERT INTO temp.staged_articles VALUES ({', '.join('?' * (len(PARTITION_COLUMNS) + 3))})"
+    records = values.itertuples(index=False, name=None)
+    while True:
+        batch = list(islice(records, DB_CONFIG['batch_size']))
+        if not batch:
+            break
+        conn.executemany(insert, batch)
+    # Ends the read snapshot; writes to TEMP tables never lock the database
+    conn.commit()
+
+    removed = replaced if gone is None else pd.concat([replaced, gone[ARTICLE_COLUMNS]], ignore_index=True)
+    return {
+        'rows': n_rows,
+        'new': int(new.sum()),
+        'partitions': list(values[['tag', 'year']].drop_duplicates().itertuples(index=False, name=None)),
+        'gone': gone,
+        'delta': rollup_delta(added=df, removed=removed)
+    }
+
+def write_staged_articles(conn, staged: dict):
+    """Second half of the upsert, inside the caller's write transaction: delete
+    the replaced days' leftover rows, upsert the staged rows into their
+    partitions with one INSERT ... SELECT each, and bring the author and tag
+    rollups and the title search index in step. Returns (inserted, updated,
+    skipped, deleted)."""
+    deleted = 0
+    gone = staged['gone']
+    if gone is not None:
+        for partition, ids in gone.groupby('partition')['id']:
+            conn.executemany(f"DELETE FROM {partition} WHERE id = ?", [(i,) for i in ids.tolist()])
+        deleted = len(gone)
+
+    first_id = next_article_ids(conn, staged['new'])
+    # Unchanged rows hit the DO UPDATE ... WHERE and are not counted as changes
+    changes = 0
+    for tag, year in staged['partitions']:
+        partition = create_partition(conn, tag, year)
+        before = conn.total_changes
+        conn.execute(f"""
+        INSERT INTO {partition} (id, {', '.join(PARTITION_COLUMNS)})
+        SELECT ? + seq, {', '.join(PARTITION_COLUMNS)} FROM temp.staged_articles
+        WHERE tag = ? AND year IS ?
+        ORDER BY rowid
+        ON CONFLICT ({', '.join(PARTITION_KEY)}) DO UPDATE SET
+            {', '.join(f"{c} = excluded.{c}" for c in VALUE_COLUMNS)}
+        WHERE {' OR '.join(f"{c} IS NOT excluded.{c}" for c in VALUE_COLUMNS)}
+        """, (first_id, tag, year))
+        changes += conn.total_changes - before
+    inserted = conn.execute(f"SELECT COUNT(*) FROM {DB_CONFIG['table_name']} WHERE id >= ?", (first_id,)).fetchone()[0]
+    updated = changes - inserted
+    merge_delta(conn, staged['delta'])
+    # Upserts never change a title (it is part of the key), so only new rows need indexing
+    index_new_titles(conn, first_id - 1)
+    conn.execute("DROP TABLE temp.staged_articles")
+
+    return inserted, updated, staged['rows'] - inserted - updated, deleted
+
 @task
-def store_raw_data_to_db(csv_path: str, tag: str):
+@tracked_stage('store')
+def store_raw_data_to_db(csv_path: str, tag: str, replace_days=None, checkpoints=None):
+    """Upsert a raw tag CSV into the database. With `replace_days` (ISO dates,
+    from a reparse) the CSV is taken as the complete rows of those days, and
+    stored rows of those days it no longer has are deleted."""
     logger = get_run_logger()
+    conn = None
     try:
         df = pd.read_csv(csv_path)
         df['tag'] = tag
+        record(rows_in=len(df), label=tag)
         
-        conn = sqlite3.connect(DB_CONFIG['db_path'])
+        # Convert claps and responses ("1.2K", "3,400", ...) to integers
+        df['claps'] = parse_counts(df['claps'])
+        df['responses'] = parse_counts(df['responses'])
+        df['date'] = iso_dates(df['date'])
+        # NULLs never conflict in the unique natural-key index, so a story
+        # missing a key part would be inserted again by every load
+        df[PARTITION_KEY] = df[PARTITION_KEY].astype(object).fillna('')
         
-        # Convert claps to integers
-        df['claps'] = df['claps'].apply(lambda x: int(float(str(x).replace('k', '')) * 1000 if 'k' in str(x).lower() else int(x)))
+        conn = get_connection()
+        staged = stage_articles(conn, df, replace_days)
+        with conn:
+            # Stores run concurrently but SQLite takes one writer per file: wait
+            # for the write lock up front rather than fail to upgrade a read.
+            # Everything that can run without it already has
+            conn.execute("BEGIN IMMEDIATE")
+            inserted, updated, skipped, deleted = write_staged_articles(conn, staged)
+            # The processed dataset and the SGD model only take ids past their
+            # watermarks, so rows deleted by a reparse or updated by any store
+            # (a re-fetch's new clap counts) would stay stale in them: have
+            # both start over
+            if deleted or updated:
+                conn.execute("DELETE FROM etl_watermarks WHERE stage IN ('transform', 'train_sgd')")
+            # The scraped days count as fetched once their rows are stored
+            if checkpoints:
+                record_scrape_checkpoints(conn, tag, checkpoints)
+        record(rows_out=inserted + updated)
         
-        # Store to database
-        df.to_sql(DB_CONFIG['table_name'], conn, if_exists='append', index=False)
-        logger.info(f"Stored {len(df)} records from {csv_path} to database")
+        logger.info(
+            f"Stored {len(df)} records from {csv_path} to database: "
+            f"{inserted} inserted, {updated} updated, {skipped} skipped, {deleted} deleted"
+        )
+        return {'inserted': inserted, 'updated': updated, 'skipped': skipped, 'deleted': deleted}
     except Exception as e:
         logger.error(f"Error storing data to database: {e}")
     finally:
         if conn:
             conn.close()
 
+def load_articles(conn, tag: str = None, start: str = None, end: str = None) -> pd.DataFrame:
+    """Stored articles in id order, only those of `tag` and/or dated from
+    `start` to `end` (ISO dates, inclusive) if given, read from just the
+    partitions that can hold them"""
+    years = (int(start[:4]) if start else None, int(end[:4]) if end else None)
+    partitions = conn.execute(
+        "SELECT name, tag FROM article_partitions WHERE (?1 IS NULL OR tag = ?1) "
+        "AND (?2 IS NULL OR year >= ?2) AND (?3 IS NULL OR year <= ?3) ORDER BY name",
+        (tag, *years)
+    ).fetchall()
+    conditions = [condition for condition, bound in (('date >= ?', start), ('date <= ?', end)) if bound]
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+    branches = [
+        f"SELECT id, {', '.join(c if c != 'tag' else sql_literal(name_tag) + ' AS tag' for c in ARTICLE_COLUMNS)} "
+        f"FROM {name}{where}"
+        for name, name_tag in partitions
+    ]
+    if not branches:
+        return pd.DataFrame(columns=['id', *ARTICLE_COLUMNS])
+    params = [bound for bound in (start, end) if bound] * len(branches)
+    return pd.read_sql(' UNION ALL '.join(branches), conn, params=params).sort_values('id', ignore_index=True)
+
 @task
-def load_data_from_db():
+@tracked_stage('load')
+def load_data_from_db(tag: str = None, start: str = None, end: str = None):
+    """Stored articles in id order, optionally only those of `tag` and/or
+    dated from `start` to `end` (ISO dates); see `load_articles`"""
     logger = get_run_logger()
     try:
-        conn = sqlite3.connect(DB_CONFIG['db_path'])
-        # UPDATE THIS QUERY TO MATCH YOUR ACTUAL COLUMNS:
-        query = "SELECT date, title, claps, responses, author_name, followers, reading_time_mins FROM articles"
-        df = pd.read_sql(query, conn)
+        conn = get_connection()
+        df = load_articles(conn, tag, start, end)
+        record(rows_out=len(df))
         logger.info(f"Loaded {len(df)} records from database")
         return df
     except Exception as e:
         logger.error(f"Error loading data from database: {e}")
-        return pd.DataFrame()
\ No newline at end of file
+        return pd.DataFrame()
+
+def iter_articles_after(last_id: int, chunk_size: int):
+    """Yield articles with id > last_id as DataFrames of at most chunk_size rows, in id order.
+
+    Ids are unique, so each chunk is a window of chunk_size ids, which every
+    partition reads from its primary key; its rows are sorted here rather than
+    by an ORDER BY that merges all the partitions."""
+    conn = get_connection()
+    try:
+        max_id, = conn.execute("SELECT last_id FROM article_sequence").fetchone()
+        while last_id < max_id:
+            chunk = pd.read_sql(
+                "SELECT id, date, title, claps, responses, author_name, followers, reading_time_mins, tag "
+                "FROM articles WHERE id > ? AND id <= ?",
+                conn, params=(last_id, last_id + chunk_size)
+            )
+            last_id += chunk_size
+            if not chunk.empty:
+                yield chunk.sort_values('id', ignore_index=True)
+    finally:
+        conn.close()
+
+def get_watermark(stage: str):
+    """Return (last_id, output_bytes) recorded for `stage`, or (0, 0)"""
+    conn = get_connection()
+    try:
+        row = conn.execute(
+            "SELECT last_id, output_bytes FROM etl_watermarks WHERE stage = ?", (stage,)
+        ).fetchone()
+    finally:
+        conn.close()
+    return row if row else (0, 0)
+
+def set_watermark(stage: str, last_id: int, output_bytes: int):
+    conn = get_connection()
+    try:
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO etl_watermarks (stage, last_id, output_bytes, updated_at) VALUES (?, ?, ?, ?)",
+                (stage, last_id, output_bytes, datetime.now().isoformat(timespec='seconds'))
+            )
+    finally:
+        conn.close()
@@ -1,39 +1,106 @@
+import numpy as np
 import pandas as pd
 from prefect import task, get_run_logger
-from config import PATHS
+from config import PATHS, TRANSFORM_CONFIG, DEDUP_CONFIG
+from pipeline.counts import parse_counts
+from pipeline.dedup import SignatureIndex, index_readable, near_duplicates
+from pipeline.data_storage import iter_articles_after, get_watermark, set_watermark
+from pipeline.processed_data import processed_path as get_processed_path, write_processed, drop_parts_after
+from pipeline.telemetry import tracked_stage, record
 import os
+import shutil
+import time
+
+def clean_articles(df: pd.DataFrame):
+    # Convert claps and responses
+    df['claps'] = parse_counts(df['claps'])
+    df['responses'] = parse_counts(df['responses'])
 
-@task
-def clean_and_transform_data(df: pd.DataFrame):
-    logger = get_run_logger()
-    
-    # Convert claps
-    def convert_claps(value):
-        if isinstance(value, str) and 'k' in value.lower():
-            return int(float(value.lower().replace('k', '')) * 1000)
-        try:
-            return int(value)
-        except:
-            return 0
-    
-    df['claps'] = df['claps'].apply(convert_claps)
-    
-    # Convert responses
-    df['responses'] = pd.to_numeric(df['responses'], errors='coerce').fillna(0).astype(int)
-    
     # Convert reading time
     df['reading_time_mins'] = pd.to_numeric(df['reading_time_mins'], errors='coerce').fillna(0).astype(int)
-    
+
     # Drop unnecessary columns
     df = df.drop(columns=['followers'], errors='ignore')
-    
-    # Drop rows with missing values
-    df = df.dropna(subset=['title', 'claps'])
-    
+
+    # Drop rows with missing values (stored titles hold '' for missing)
+    return df[df['title'].fillna('').ne('')].dropna(subset=['claps'])
+
+def drop_near_duplicates(logger, df: pd.DataFrame, index: SignatureIndex, last_id: int):
+    """Drop near-duplicate titles from cleaned rows, keeping the highest-clap
+    copy, and add the kept titles' signatures to `index`"""
+    start = time.perf_counter()
+    kept, signatures, shingles = near_duplicates(df, index)
+    duplicate = kept != np.arange(len(df))
+    index.save(df['id'].to_numpy()[~duplicate], signatures[~duplicate], shingles[~duplicate], last_id)
+    logger.info(f"Dropped {duplicate.sum()} near-duplicate titles of {len(df)} ({duplicate.mean():.1%}) "
+                f"in {time.perf_counter() - start:.1f}s")
+    return df[~duplicate]
+
+@task
+@tracked_stage('transform')
+def clean_and_transform_data(df: pd.DataFrame):
+    logger = get_run_logger()
+
+    n_in = len(df)
+    df = clean_articles(df)
+    last_id = int(df['id'].max()) if 'id' in df and not df.empty else 0
+
+    # The signature index is rebuilt along with the output
+    if DEDUP_CONFIG['enabled'] and last_id:
+        df = drop_near_duplicates(logger, df, SignatureIndex(), last_id)
+
     # Save processed data
     os.makedirs(PATHS['processed_data'], exist_ok=True)
-    processed_path = os.path.join(PATHS['processed_data'], 'medium_articles_processed.csv')
-    df.to_csv(processed_path, index=False)
-    
+    processed_path = get_processed_path()
+    output_bytes = write_processed(df, processed_path, last_id)
+    record(rows_in=n_in, rows_out=len(df), bytes_written=output_bytes)
+
+    # A later incremental run picks up after everything written here
+    if last_id:
+        set_watermark('transform', last_id, output_bytes)
+
     logger.info(f"Data cleaned and transformed. Saved to {processed_path}")
-    return processed_path
\ No newline at end of file
+    return processed_path
+
+@task
+@tracked_stage('transform')
+def transform_new_articles(chunk_size: int = None):
+    """Append only articles added since the last run to the processed dataset,
+    reading and cleaning them in bounded chunks"""
+    logger = get_run_logger()
+    chunk_size = chunk_size or TRANSFORM_CONFIG['chunk_size']
+
+    os.makedirs(PATHS['processed_data'], exist_ok=True)
+    processed_path = get_processed_path()
+
+    last_id, output_bytes = get_watermark('transform')
+    if not os.path.exists(processed_path) or (processed_path.endswith('.csv') and os.path.getsize(processed_path) < output_bytes) \
+            or (DEDUP_CONFIG['enabled'] and not index_readable()):
+        # Output missing or shorter than recorded, or a signature index saved
+        # without the shingle sets exact matching needs: start over
+        last_id, output_bytes = 0, 0
+        if os.path.isdir(processed_path):
+            shutil.rmtree(processed_path)
+    elif processed_path.endswith('.csv') and os.path.getsize(processed_path) > output_bytes:
+        # Drop a chunk appended by a run that died before moving the watermark
+        with open(processed_path, 'r+b') as f:
+            f.truncate(output_bytes)
+    elif not processed_path.endswith('.csv'):
+        drop_parts_after(processed_path, last_id)
+    # New titles are checked against the signatures of those already written
+    index = SignatureIndex(last_id=last_id) if DEDUP_CONFIG['enabled'] else None
+
+    n_in, n_rows, start_bytes = 0, 0, output_bytes
+    for chunk in iter_articles_after(last_id, chunk_size):
+        n_in += len(chunk)
+        cleaned = clean_articles(chunk)
+        last_id = int(chunk['id'].iloc[-1])
+        if index is not None and not cleaned.empty:
+            cleaned = drop_near_duplicates(logger, cleaned, index, last_id)
+        output_bytes = write_processed(cleaned, processed_path, last_id, append=output_bytes > 0)
+        set_watermark('transform', last_id, output_bytes)
+        n_rows += len(cleaned)
+    record(rows_in=n_in, rows_out=n_rows, bytes_written=output_bytes - start_bytes)
+
+    logger.info(f"Transformed {n_rows} new records (watermark id {last_id}). Appended to {processed_path}")
+    return processed_path
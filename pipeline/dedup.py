@@ -0,0 +1,274 @@
+"""Near-duplicate title detection with MinHash and locality-sensitive hashing.
+
+Each title becomes the set of its word unigrams and bigrams (after
+`pipeline.text.preprocess`), summarised by a MinHash signature of
+bands * rows_per_band values: the fraction of positions where two signatures
+agree estimates the Jaccard similarity of the two sets. Titles that agree on
+every value of at least one band land in the same bucket; only titles
+sharing a bucket are compared, so the cost grows linearly with the number of
+titles instead of with the number of pairs. A pair whose estimate reaches the
+threshold is confirmed on the exact sets before a title is dropped.
+
+Signatures and sets of the titles kept are saved as .npz parts under
+PATHS['dedup_index'], named like the processed dataset's parts by the last
+article id they cover, so an incremental run checks new titles against the
+saved signatures without re-reading old titles. Each write merges the newest
+parts while the older is at most twice the size of the newer, which keeps the
+number of parts logarithmic in the number of writes.
+"""
+import os
+import glob
+import shutil
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import HashingVectorizer
+from config import DEDUP_CONFIG, PATHS
+from pipeline.text import preprocess
+
+SHINGLES = HashingVectorizer(
+    preprocessor=preprocess,
+    token_pattern=r'\b\w+\b',
+    ngram_range=(1, 2),
+    n_features=2 ** 28,
+    alternate_sign=False,
+    norm=None,
+    binary=True
+)
+
+
+def _hash_params(n: int, seed: int):
+    rng = np.random.default_rng(seed)
+    # Odd multipliers for multiply-shift hashing modulo 2**64
+    return rng.integers(0, 2 ** 64, n, dtype=np.uint64) | np.uint64(1), rng.integers(0, 2 ** 64, n, dtype=np.uint64)
+
+
+def signature_size() -> int:
+    return DEDUP_CONFIG['bands'] * DEDUP_CONFIG['rows_per_band']
+
+
+def shingle_sets(titles) -> sp.csr_matrix:
+    """The titles' word 1-2-gram sets, one binary CSR row per title"""
+    shingles = SHINGLES.transform(titles).tocsr()
+    shingles.sort_indices()
+    return shingles
+
+
+def minhash(shingles: sp.csr_matrix) -> np.ndarray:
+    """MinHash signatures (n_titles x signature_size() uint32) of the
+    `shingle_sets` rows; a title with no words gets all-zero values"""
+    starts, nonempty = shingles.indptr[:-1], np.diff(shingles.indptr) > 0
+    features = shingles.indices.astype(np.uint64)
+
+    signatures = np.zeros((shingles.shape[0], signature_size()), dtype=np.uint32)
+    for i, (a, b) in enumerate(zip(*_hash_params(signature_size(), seed=1))):
+        hashed = ((features * a + b) >> np.uint64(32)).astype(np.uint32)
+        if len(hashed):
+            signatures[nonempty, i] = np.minimum.reduceat(hashed, starts[nonempty])
+    return signatures
+
+
+def band_keys(signatures: np.ndarray) -> np.ndarray:
+    """One uint64 bucket key per title and band (n_titles x bands)"""
+    rows = DEDUP_CONFIG['rows_per_band']
+    multipliers, _ = _hash_params(rows, seed=2)
+    values = signatures.astype(np.uint64).reshape(len(signatures), DEDUP_CONFIG['bands'], rows)
+    return (values * multipliers).sum(axis=2, dtype=np.uint64)
+
+
+def jaccard(shingles_a: sp.csr_matrix, shingles_b: sp.csr_matrix) -> np.ndarray:
+    """Exact Jaccard similarity of each row of `shingles_a` to the same row of `shingles_b`"""
+    both = np.asarray(shingles_a.multiply(shingles_b).sum(axis=1)).ravel()
+    either = np.diff(shingles_a.indptr) + np.diff(shingles_b.indptr) - both
+    return both / np.maximum(either, 1)
+
+
+def _similar_pairs(signatures_a, shingles_a, a, signatures_b, shingles_b, b, block: int = 250_000) -> np.ndarray:
+    """Whether the similarity of each pair of row a[i] of the first titles and
+    row b[i] of the second reaches DEDUP_CONFIG['threshold'], estimated from
+    their signatures and, for pairs whose estimate does, exactly"""
+    needed = DEDUP_CONFIG['threshold'] * signatures_a.shape[1]
+    half = signatures_a.shape[1] // 2
+    # Sets this different in size can't be similar enough, whatever they hold
+    sizes_a, sizes_b = np.diff(shingles_a.indptr)[a], np.diff(shingles_b.indptr)[b]
+    similar = np.minimum(sizes_a, sizes_b) >= DEDUP_CONFIG['threshold'] * np.maximum(sizes_a, sizes_b)
+    # In blocks, so memory stays bounded whatever the number of candidate pairs
+    for start in range(0, len(a), block):
+        rows = start + np.flatnonzero(similar[start:start + block])
+        # Most pairs already miss on the first half of the values
+        agree = (signatures_a[a[rows], :half] == signatures_b[b[rows], :half]).sum(axis=1)
+        close = agree + (signatures_a.shape[1] - half) >= needed
+        rows, agree = rows[close], agree[close]
+        agree += (signatures_a[a[rows], half:] == signatures_b[b[rows], half:]).sum(axis=1)
+        similar[start:start + block] = False
+        similar[rows[agree >= needed]] = True
+    hit = np.flatnonzero(similar)
+    similar[hit] = jaccard(shingles_a[a[hit]], shingles_b[b[hit]]) >= DEDUP_CONFIG['threshold']
+    return similar
+
+
+def _part_path(path: str, last_id: int) -> str:
+    return os.path.join(path, f"part-{last_id:012d}.npz")
+
+
+def _load_part(part: str):
+    with np.load(part) as stored:
+        ids, signatures = stored['ids'], stored['signatures']
+        shingles = sp.csr_matrix(
+            (np.ones(len(stored['shingle_indices']), dtype=np.float32), stored['shingle_indices'], stored['shingle_indptr']),
+            shape=(len(ids), SHINGLES.n_features)
+        )
+    return ids, signatures, shingles
+
+
+def index_readable(path: str = None) -> bool:
+    """Whether every saved part has the shingle sets exact matching needs
+    (parts saved before it only have signatures)"""
+    for part in glob.glob(os.path.join(path or PATHS['dedup_index'], 'part-*.npz')):
+        with np.load(part) as stored:
+            if 'shingle_indices' not in stored.files:
+                return False
+    return True
+
+
+class SignatureIndex:
+    """Signatures and shingle sets of the titles kept so far, with each band's
+    keys sorted for lookup. Loads the saved parts covering ids up to `last_id`;
+    without one the saved index is discarded and a new one started."""
+
+    def __init__(self, path: str = None, last_id: int = None):
+        self.path = path or PATHS['dedup_index']
+        self.parts = []
+        if last_id is None:
+            shutil.rmtree(self.path, ignore_errors=True)
+            return
+        for part in sorted(glob.glob(os.path.join(self.path, 'part-*.npz'))):
+            part_id = int(os.path.basename(part)[5:-4])
+            if part_id > last_id:
+                # Written by a run that died before moving its watermark
+                os.remove(part)
+                continue
+            self._add(part_id, *_load_part(part))
+
+    def __len__(self):
+        return sum(len(part[1]) for part in self.parts)
+
+    def _add(self, last_id: int, ids: np.ndarray, signatures: np.ndarray, shingles: sp.csr_matrix):
+        keys = band_keys(signatures)
+        order = np.argsort(keys, axis=0)
+        self.parts.append((last_id, ids, signatures, shingles, (order, np.take_along_axis(keys, order, axis=0))))
+
+    def _write(self, last_id: int, ids: np.ndarray, signatures: np.ndarray, shingles: sp.csr_matrix):
+        os.makedirs(self.path, exist_ok=True)
+        path = _part_path(self.path, last_id)
+        tmp_path = os.path.join(self.path, f"tmp-{last_id:012d}.npz")
+        np.savez(tmp_path, ids=ids, signatures=signatures,
+                 shingle_indptr=shingles.indptr, shingle_indices=shingles.indices)
+        os.replace(tmp_path, path)
+
+    def matches(self, signatures: np.ndarray, shingles: sp.csr_matrix, keys: np.ndarray) -> np.ndarray:
+        """Whether each title is a near-duplicate of one already in the index"""
+        found = np.zeros(len(signatures), dtype=bool)
+        for _, _, stored, stored_shingles, (order, sorted_keys) in self.parts:
+            for band in range(keys.shape[1]):
+                # Every stored title in the bucket, not only the first
+                todo = np.flatnonzero(~found)
+                left = np.searchsorted(sorted_keys[:, band], keys[todo, band], side='left')
+                counts = np.searchsorted(sorted_keys[:, band], keys[todo, band], side='right') - left
+                query = np.repeat(todo, counts)
+                pos = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts - left, counts)
+                similar = _similar_pairs(signatures, shingles, query, stored, stored_shingles, order[pos, band])
+                found[query[similar]] = True
+        return found
+
+    def save(self, ids: np.ndarray, signatures: np.ndarray, shingles: sp.csr_matrix, last_id: int):
+        """Add the newly kept titles as a part covering ids up to `last_id`.
+        Titles without words never match, so they are left out."""
+        words = np.diff(shingles.indptr) > 0
+        if not words.any():
+            return
+        # Before the new part is written: every saved part is then covered by
+        # the watermark, so a merged one is never discarded as unfinished
+        self._compact()
+        self._write(last_id, ids[words], signatures[words], shingles[words])
+        self._add(last_id, ids[words], signatures[words], shingles[words])
+
+    def _compact(self):
+        """Merge the newest two parts into one while the older is at most twice the size of the newer"""
+        while len(self.parts) > 1 and len(self.parts[-2][1]) <= 2 * len(self.parts[-1][1]):
+            older, newer = self.parts[-2], self.parts[-1]
+            merged = (np.concatenate([older[1], newer[1]]), np.concatenate([older[2], newer[2]]),
+                      sp.vstack([older[3], newer[3]], format='csr'))
+            # Replaces the newer part first: a crash before the older one is
+            # removed only leaves some titles indexed twice
+            self._write(newer[0], *merged)
+            os.remove(_part_path(self.path, older[0]))
+            del self.parts[-2:]
+            self._add(newer[0], *merged)
+
+
+def _candidate_pairs(keys: np.ndarray, rank: np.ndarray, words: np.ndarray):
+    """Pairs of titles sharing a bucket in some band: each title is paired with
+    the best-ranked title of its bucket, and with its neighbour when the bucket
+    is ordered by the next two bands' keys (titles agreeing on more bands sit together)"""
+    n, bands = keys.shape
+    by_rank = np.argsort(rank)
+    pairs = []
+    for band in range(bands):
+        key = keys[:, band]
+        # One key for the next two bands; stable sorts keep the tie-break order within a bucket
+        following = np.argsort(keys[:, (band + 1) % bands] * np.uint64(0x9E3779B97F4A7C15) + keys[:, (band + 2) % bands])
+        for tiebreak, neighbour in ((by_rank, False), (following, True)):
+            by = tiebreak[np.argsort(key[tiebreak], kind='stable')]
+            starts = np.r_[True, key[by[1:]] != key[by[:-1]]]
+            inner = np.flatnonzero(~starts & words[by])
+            if neighbour:
+                pairs.append((by[inner], by[inner - 1]))
+            else:
+                pairs.append((by[inner], by[np.maximum.accumulate(np.where(starts, np.arange(n), 0))[inner]]))
+    a = np.concatenate([p[0] for p in pairs])
+    b = np.concatenate([p[1] for p in pairs])
+    # Better-ranked title first, each pair once
+    codes = np.sort(np.minimum(rank[a], rank[b]) * n + np.maximum(rank[a], rank[b]))
+    codes = codes[np.r_[True, codes[1:] != codes[:-1]]]
+    return by_rank[codes // n], by_rank[codes % n]
+
+
+def near_duplicates(df: pd.DataFrame, index: SignatureIndex = None):
+    """Find the near-duplicate titles in `df` (id, title, claps).
+
+    Titles are visited from most to fewest claps (earliest id first on ties);
+    a title is dropped if its similarity to a title already kept is at least
+    DEDUP_CONFIG['threshold'], both estimated and exact, so every dropped title
+    is itself close to the one kept in its place. A title close to one already
+    in `index` is dropped too, since that one has been written out already.
+    Returns (kept, signatures, shingles): for each row, the position in `df` of
+    the row kept in its place (its own if it is kept, -1 for an indexed title),
+    its signature and its shingle set.
+    """
+    shingles = shingle_sets(df['title'])
+    signatures = minhash(shingles)
+    keys = band_keys(signatures)
+    # Titles without words all get the same signature and are never duplicates
+    words = np.diff(shingles.indptr) > 0
+
+    n = len(df)
+    kept = np.arange(n)
+    if index is not None:
+        has_words = np.flatnonzero(words)
+        kept[has_words[index.matches(signatures[has_words], shingles[has_words], keys[has_words])]] = -1
+
+    order = np.lexsort((df['id'].to_numpy(), -df['claps'].to_numpy(dtype=float)))
+    rank = np.empty(n, dtype=np.int64)
+    rank[order] = np.arange(n)
+    better, worse = _candidate_pairs(keys, rank, words)
+    similar = _similar_pairs(signatures, shingles, better, signatures, shingles, worse)
+    better, worse = better[similar], worse[similar]
+
+    # By the time a title is visited, every better-ranked title is settled
+    visit = np.lexsort((rank[better], rank[worse]))
+    kept = kept.tolist()
+    for b, w in zip(better[visit].tolist(), worse[visit].tolist()):
+        if kept[w] == w and kept[b] == b:
+            kept[w] = b
+    return np.array(kept), signatures, shingles
@@ -0,0 +1,143 @@
+"""Archive-page story extractors.
+
+Every extractor takes the page HTML and the max number of stories to read,
+and returns (stories, errors) where each story is the tuple
+(title, claps, responses, author_name, reading_time). `bs4` is the reference
+implementation; the others must produce identical stories
+(see benchmarks/bench_extractors.py).
+"""
+from bs4 import BeautifulSoup, SoupStrainer
+from config import SCRAPING_CONFIG
+
+try:
+    import lxml.html
+    from lxml import etree
+except ImportError:
+    lxml = None
+
+STORY_CLASS = 'streamItem streamItem--postPreview js-streamItem'
+AUTHOR_BOX_CLASS = 'postMetaInline u-floatLeft u-sm-maxWidthFullWidth'
+CLAPS_CLASS = 'button button--chromeless u-baseColor--buttonNormal js-multirecommendCountButton u-disablePointerEvents'
+RESPONSES_CLASS = 'button button--chromeless u-baseColor--buttonNormal'
+
+
+def _clean_title(title: str) -> str:
+    return title.strip().replace('\n', ' ').replace('\t', ' ')
+
+
+def _bs4_story(story):
+    author_box = story.find('div', class_=AUTHOR_BOX_CLASS)
+    if not author_box:
+        return None
+
+    author_link_tag = author_box.find('a')
+    author_url = author_link_tag['href']
+    author_name = author_url.split('@')[-1].strip('/')
+
+    reading_time = author_box.find('span', class_='readingTime')['title'].split()[0]
+    title = _clean_title(story.find('h3').text) if story.find('h3') else '-'
+
+    claps_tag = story.find('button', class_=CLAPS_CLASS)
+    claps = claps_tag.text.strip().replace(',', '') if claps_tag else '0'
+
+    responses_tag = story.find('a', class_=RESPONSES_CLASS)
+    responses = responses_tag.text.strip().split()[0] if responses_tag else '0'
+
+    return title, claps, responses, author_name, reading_time
+
+
+def _bs4_stories(soup, limit: int):
+    stories, errors = [], []
+    for story in soup.find_all('div', class_=STORY_CLASS)[:limit]:
+        try:
+            fields = _bs4_story(story)
+        except Exception as e:
+            errors.append(e)
+            continue
+        if fields is not None:
+            stories.append(fields)
+    return stories, errors
+
+
+def extract_bs4(html: str, limit: int):
+    """Reference backend: full html.parser document, class-string find() calls."""
+    return _bs4_stories(BeautifulSoup(html, 'html.parser'), limit)
+
+
+_STORY_STRAINER = SoupStrainer('div', class_=STORY_CLASS)
+
+
+def extract_strainer(html: str, limit: int):
+    """Same selectors as bs4, but only the story subtrees are ever built."""
+    return _bs4_stories(BeautifulSoup(html, 'html.parser', parse_only=_STORY_STRAINER), limit)
+
+
+if lxml is not None:
+    def _has_class(name):
+        return f'contains(concat(" ", normalize-space(@class), " "), " {name} ")'
+
+    # bs4 matches a multi-word class_ against the whole (whitespace-normalised)
+    # class attribute and a single word against any one class; mirror both
+    _STORY_XPATH = etree.XPath(f'//div[normalize-space(@class)="{STORY_CLASS}"]')
+    _AUTHOR_BOX_XPATH = etree.XPath(f'.//div[normalize-space(@class)="{AUTHOR_BOX_CLASS}"]')
+    _LINK_XPATH = etree.XPath('.//a')
+    _READING_TIME_XPATH = etree.XPath(f'.//span[{_has_class("readingTime")}]')
+    _TITLE_XPATH = etree.XPath('.//h3')
+    _CLAPS_XPATH = etree.XPath(f'.//button[normalize-space(@class)="{CLAPS_CLASS}"]')
+    _RESPONSES_XPATH = etree.XPath(f'.//a[normalize-space(@class)="{RESPONSES_CLASS}"]')
+
+    def _lxml_story(story):
+        author_boxes = _AUTHOR_BOX_XPATH(story)
+        if not author_boxes:
+            return None
+        author_box = author_boxes[0]
+
+        author_url = _LINK_XPATH(author_box)[0].attrib['href']
+        author_name = author_url.split('@')[-1].strip('/')
+
+        reading_time = _READING_TIME_XPATH(author_box)[0].attrib['title'].split()[0]
+        titles = _TITLE_XPATH(story)
+        title = _clean_title(titles[0].text_content()) if titles else '-'
+
+        claps_tags = _CLAPS_XPATH(story)
+        claps = claps_tags[0].text_content().strip().replace(',', '') if claps_tags else '0'
+
+        responses_tags = _RESPONSES_XPATH(story)
+        responses = responses_tags[0].text_content().strip().split()[0] if responses_tags else '0'
+
+        return title, claps, responses, author_name, reading_time
+
+    def extract_lxml(html: str, limit: int):
+        """libxml2 parse with precompiled XPath selectors."""
+        if not html.strip():
+            return [], []
+        stories, errors = [], []
+        for story in _STORY_XPATH(lxml.html.fromstring(html))[:limit]:
+            try:
+                fields = _lxml_story(story)
+            except Exception as e:
+                errors.append(e)
+                continue
+            if fields is not None:
+                stories.append(fields)
+        return stories, errors
+
+
+EXTRACTORS = {
+    'bs4': extract_bs4,
+    'strainer': extract_strainer,
+}
+if lxml is not None:
+    EXTRACTORS['lxml'] = extract_lxml
+
+
+def get_extractor(name: str = None):
+    """Look up an extractor by name (default SCRAPING_CONFIG['extractor']).
+    Falls back to `strainer` when lxml is requested but not installed."""
+    name = name or SCRAPING_CONFIG['extractor']
+    if name == 'lxml' and lxml is None:
+        name = 'strainer'
+    try:
+        return EXTRACTORS[name]
+    except KeyError:
+        raise ValueError(f"Unknown extractor '{name}', expected one of {sorted(EXTRACTORS)}")
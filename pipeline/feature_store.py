@@ -0,0 +1,197 @@
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+from sklearn.preprocessing import normalize
+from config import FEATURE_STORE_CONFIG, PATHS
+
+# Vectorizer settings that change the document-term counts; min_df, max_df,
+# sublinear_tf etc. are applied to the stored counts afterwards
+COUNT_PARAMS = ['analyzer', 'lowercase', 'ngram_range', 'preprocessor', 'stop_words',
+                'strip_accents', 'token_pattern', 'tokenizer']
+
+
+def vectorizer_fingerprint(vectorizer) -> str:
+    params = vectorizer.get_params()
+    described = {}
+    for name in COUNT_PARAMS:
+        value = params[name]
+        if callable(value):
+            # Functions are identified by name and bytecode, so editing one invalidates the cache
+            code = value.__code__
+            value = f"{value.__module__}.{value.__qualname__}:{hashlib.sha256(code.co_code + repr(code.co_consts).encode()).hexdigest()}"
+        elif isinstance(value, (set, frozenset)):
+            value = sorted(value)
+        described[name] = value
+    return hashlib.sha256(json.dumps(described, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def row_hashes(ids: pd.Series, titles: pd.Series) -> np.ndarray:
+    """One hash per (id, title) row; a stored matrix is reusable for any dataset
+    whose row hashes start with the ones it was built from"""
+    rows = pd.DataFrame({'id': ids.to_numpy(dtype=np.int64), 'title': titles.fillna('').to_numpy(dtype=object)})
+    return pd.util.hash_pandas_object(rows, index=False).to_numpy()
+
+
+def _entry_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+
+def _entries():
+    root = PATHS['feature_store']
+    if not os.path.isdir(root):
+        return []
+    return [os.path.join(root, d) for d in os.listdir(root)
+            if os.path.isfile(os.path.join(root, d, 'meta.json'))]
+
+
+def _find_prefix(fingerprint: str, hashes: np.ndarray):
+    """The stored entry for `fingerprint` covering the longest prefix of `hashes`"""
+    best, best_rows = None, 0
+    for path in _entries():
+        if not os.path.basename(path).startswith(fingerprint):
+            continue
+        stored = np.load(os.path.join(path, 'row_hashes.npy'), mmap_mode='r')
+        if best_rows < len(stored) <= len(hashes) and np.array_equal(stored, hashes[:len(stored)]):
+            best, best_rows = path, len(stored)
+    return best
+
+
+def _count(vectorizer, titles, terms: list, index: dict):
+    """Count matrix of `titles` in the columns of `terms`, appending unseen terms"""
+    counter = CountVectorizer(**{p: vectorizer.get_params()[p] for p in COUNT_PARAMS}, dtype=np.int32)
+    try:
+        counts = counter.fit_transform(titles)
+    except ValueError:
+        # Nothing but stop words / empty titles
+        return sp.csr_matrix((len(titles), len(terms)), dtype=np.int32)
+    columns = np.empty(len(counter.vocabulary_), dtype=np.int64)
+    for term, j in counter.vocabulary_.items():
+        if term not in index:
+            index[term] = len(terms)
+            terms.append(term)
+        columns[j] = index[term]
+    counts = counts.tocoo()
+    return sp.csr_matrix((counts.data, (counts.row, columns[counts.col])), shape=(counts.shape[0], len(terms)))
+
+
+def evict(keep: str = None):
+    """Delete least recently used entries until the store fits FEATURE_STORE_CONFIG['max_bytes']"""
+    entries = sorted(_entries(), key=lambda p: os.path.getmtime(os.path.join(p, 'meta.json')))
+    total = sum(_entry_size(p) for p in entries)
+    for path in entries:
+        if total <= FEATURE_STORE_CONFIG['max_bytes']:
+            break
+        if path != keep:
+            total -= _entry_size(path)
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def document_counts(vectorizer, ids: pd.Series, titles: pd.Series):
+    """Sparse document-term counts of `titles` and their term list, from the store
+    when possible.
+
+    A stored matrix for the same count settings whose rows are a prefix of
+    these is extended with the remaining rows; anything else is counted from
+    scratch. Returns (counts, terms, n_reused_rows).
+    """
+    fingerprint = vectorizer_fingerprint(vectorizer)
+    hashes = row_hashes(ids, titles)
+    key = f"{fingerprint}-{hashlib.sha256(hashes.tobytes()).hexdigest()[:16]}"
+    path = os.path.join(PATHS['feature_store'], key)
+
+    base = _find_prefix(fingerprint, hashes)
+    if base is not None:
+        counts = sp.load_npz(os.path.join(base, 'counts.npz')).tocsr()
+        with open(os.path.join(base, 'terms.txt'), encoding='utf-8') as f:
+            terms = f.read().split('\n') if counts.shape[1] else []
+    else:
+        counts, terms = sp.csr_matrix((0, 0), dtype=np.int32), []
+    reused = counts.shape[0]
+
+    if base == path:
+        os.utime(os.path.join(path, 'meta.json'))
+        return counts, terms, reused
+
+    index = {t: j for j, t in enumerate(terms)}
+    new = _count(vectorizer, titles.iloc[reused:].fillna(''), terms, index)
+    counts.resize((reused, len(terms)))
+    counts = sp.vstack([counts, new], format='csr')
+
+    # Write the extended entry next to the old one, then swap it in
+    os.makedirs(PATHS['feature_store'], exist_ok=True)
+    tmp = path + '.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    sp.save_npz(os.path.join(tmp, 'counts.npz'), counts, compressed=False)
+    np.save(os.path.join(tmp, 'row_hashes.npy'), hashes)
+    with open(os.path.join(tmp, 'terms.txt'), 'w', encoding='utf-8') as f:
+        f.write('\n'.join(terms))
+    with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+        json.dump({'vectorizer': fingerprint, 'rows': counts.shape[0], 'terms': len(terms)}, f)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+    if base is not None:
+        # Superseded by the extended copy
+        shutil.rmtree(base, ignore_errors=True)
+    evict(keep=path)
+    return counts, terms, reused
+
+
+def _doc_limit(value, n_docs: int) -> float:
+    return value if isinstance(value, (int, np.integer)) else value * n_docs
+
+
+def fit_tfidf(vectorizer, counts, terms):
+    """Fit a TfidfVectorizer equivalent to `vectorizer.fit(...)` from stored counts.
+
+    Applies min_df/max_df and the sorted vocabulary order exactly as
+    TfidfVectorizer does. Returns the fitted vectorizer and the column
+    selection needed by `tfidf_from_counts`.
+    """
+    params = vectorizer.get_params()
+    if params['max_features'] is not None or params['vocabulary'] is not None:
+        raise ValueError("fit_tfidf does not support max_features or a fixed vocabulary")
+
+    n_docs = counts.shape[0]
+    df = np.bincount(counts.indices, minlength=counts.shape[1])
+    keep = (df >= _doc_limit(params['min_df'], n_docs)) & (df <= _doc_limit(params['max_df'], n_docs)) & (df > 0)
+    columns = np.flatnonzero(keep)
+    columns = columns[np.argsort(np.array(terms, dtype=object)[columns])]
+
+    # idf exactly as TfidfTransformer computes it
+    df = df[columns].astype(np.float64) + int(params['smooth_idf'])
+    idf = np.log((n_docs + int(params['smooth_idf'])) / df) + 1
+
+    fitted = TfidfVectorizer(**{**params, 'vocabulary': {terms[c]: j for j, c in enumerate(columns)}})
+    # Fitted on nothing, the vocabulary's idf is replaced below; without
+    # smooth_idf sklearn divides by its zero document frequencies
+    with np.errstate(divide='ignore'):
+        fitted.fit([''])
+    if params['use_idf']:
+        fitted.idf_ = idf
+    # vocabulary_ holds the terms now; don't pickle them twice
+    fitted.set_params(vocabulary=None)
+    return fitted, columns
+
+
+def tfidf_from_counts(fitted, counts, columns):
+    """Same matrix as `fitted.transform(titles)`, computed from the stored counts"""
+    X = counts[:, columns].astype(np.float64)
+    params = fitted.get_params()
+    if params['binary']:
+        X.data[:] = 1
+    if params['sublinear_tf']:
+        np.log(X.data, out=X.data)
+        X.data += 1
+    if params['use_idf']:
+        X = X @ sp.diags(fitted.idf_)
+    if params['norm']:
+        X = normalize(X, norm=params['norm'], copy=False)
+    X = X.tocsr()
+    X.sort_indices()
+    return X
@@ -0,0 +1,116 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+import requests
+from config import SCRAPING_CONFIG
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, up to `capacity` banked."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def get_host_bucket(url: str) -> TokenBucket:
+    """Return the shared rate limiter for the host of `url`."""
+    host = urlparse(url).netloc
+    with _buckets_lock:
+        if host not in _buckets:
+            _buckets[host] = TokenBucket(
+                SCRAPING_CONFIG['requests_per_second'],
+                SCRAPING_CONFIG['burst']
+            )
+        return _buckets[host]
+
+
+# Global cap on requests in flight across every concurrent tag/year job
+_request_slots = threading.BoundedSemaphore(SCRAPING_CONFIG['max_concurrent_requests'])
+
+_local = threading.local()
+
+# Responses worth another attempt; connection errors and timeouts are retried too
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def get_session() -> requests.Session:
+    """One requests.Session per thread; retries are made by fetch_page, not the adapter."""
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        _local.session = session
+    return session
+
+
+def retry_wait(retry: int, page=None) -> float:
+    """Seconds to wait before retry number `retry` (1-based): the server's
+    Retry-After if it sent one in seconds, else exponential backoff."""
+    retry_after = page.headers.get('Retry-After', '') if page is not None else ''
+    if retry_after.isdigit():
+        return float(retry_after)
+    return min(SCRAPING_CONFIG['backoff_factor'] * 2 ** (retry - 1), 120)
+
+
+def fetch_page(url: str, stats=None):
+    """Fetch one page. Returns (url, text, error).
+
+    Every attempt, retries included, waits for the host's rate limit and a free
+    request slot first. 429/5xx responses, connection errors and timeouts are
+    retried up to SCRAPING_CONFIG['max_retries'] times with backoff, sleeping
+    without holding a slot. With `stats` (a pipeline.telemetry.StageMetrics),
+    requests, bytes, retries and errors are added to its counters.
+    """
+    bucket = get_host_bucket(url)
+    for attempt in range(SCRAPING_CONFIG['max_retries'] + 1):
+        if attempt:
+            time.sleep(retry_wait(attempt, page))
+            if stats is not None:
+                stats.add(http_retries=1)
+        bucket.acquire()
+        with _request_slots:
+            try:
+                page, error = get_session().get(url, timeout=SCRAPING_CONFIG['timeout']), None
+            except requests.RequestException as e:
+                page, error = None, e
+        if stats is not None:
+            stats.add(http_requests=1, http_bytes=len(page.content) if page is not None else 0)
+        if page is not None and page.status_code not in RETRY_STATUSES:
+            break
+
+    try:
+        if error is not None:
+            raise error
+        page.raise_for_status()
+        return url, page.text, None
+    except Exception as e:
+        if stats is not None:
+            stats.add(http_errors=1)
+        return url, None, e
+
+
+def fetch_pages(urls, stats=None):
+    """Fetch `urls` concurrently, yielding (url, text, error) in input order."""
+    workers = max(1, SCRAPING_CONFIG['concurrency'])
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(lambda url: fetch_page(url, stats), urls)
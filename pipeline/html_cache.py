@@ -0,0 +1,161 @@
+import os
+import gzip
+import hashlib
+import sqlite3
+from datetime import date, datetime
+from config import CACHE_CONFIG, PATHS
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+INDEX_FILE = 'index.db'
+
+
+def _connect():
+    os.makedirs(PATHS['html_cache'], exist_ok=True)
+    conn = sqlite3.connect(os.path.join(PATHS['html_cache'], INDEX_FILE), timeout=30)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS pages (
+        url TEXT NOT NULL,
+        fetch_date TEXT NOT NULL,
+        blob TEXT NOT NULL,
+        PRIMARY KEY (url, fetch_date)
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS blobs (
+        blob TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        last_access TIMESTAMP NOT NULL
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_pages_blob ON pages (blob)")
+    # Running total of the blob sizes, so eviction does not sum the table on every put
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'cache_size'").fetchone() is None:
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache_size (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                total INTEGER NOT NULL
+            )
+            """)
+            conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS blobs_size_insert AFTER INSERT ON blobs BEGIN
+                UPDATE cache_size SET total = total + new.size;
+            END
+            """)
+            conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS blobs_size_delete AFTER DELETE ON blobs BEGIN
+                UPDATE cache_size SET total = total - old.size;
+            END
+            """)
+            conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS blobs_size_update AFTER UPDATE OF size ON blobs BEGIN
+                UPDATE cache_size SET total = total + new.size - old.size;
+            END
+            """)
+            conn.execute("INSERT OR IGNORE INTO cache_size (id, total) SELECT 0, COALESCE(SUM(size), 0) FROM blobs")
+    return conn
+
+
+def _blob_path(blob: str) -> str:
+    return os.path.join(PATHS['html_cache'], blob[:2], blob)
+
+
+def _compress(data: bytes):
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=CACHE_CONFIG['zstd_level']).compress(data), '.zst'
+    return gzip.compress(data, compresslevel=CACHE_CONFIG['gzip_level']), '.gz'
+
+
+def _decompress(blob: str, data: bytes) -> bytes:
+    if blob.endswith('.zst'):
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def put_page(url: str, html: str, fetch_date: str = None):
+    """Store a fetched page. Blobs are named by the hash of their content, so
+    identical pages (e.g. empty archive days) are stored once."""
+    data = html.encode('utf-8')
+    compressed, suffix = _compress(data)
+    blob = hashlib.sha256(data).hexdigest() + suffix
+    path = _blob_path(blob)
+    now = datetime.now().isoformat(timespec='seconds')
+
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(compressed)
+        os.replace(tmp_path, path)
+
+    conn = _connect()
+    try:
+        with conn:
+            conn.execute(
+                "INSERT INTO blobs (blob, size, last_access) VALUES (?, ?, ?) "
+                "ON CONFLICT (blob) DO UPDATE SET last_access = excluded.last_access",
+                (blob, len(compressed), now)
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO pages (url, fetch_date, blob) VALUES (?, ?, ?)",
+                (url, fetch_date or date.today().isoformat(), blob)
+            )
+        evict(conn)
+    finally:
+        conn.close()
+
+
+def get_page(url: str):
+    """Return the most recently fetched copy of `url`, or None if it is not cached."""
+    conn = _connect()
+    try:
+        row = conn.execute(
+            "SELECT blob FROM pages WHERE url = ? ORDER BY fetch_date DESC LIMIT 1", (url,)
+        ).fetchone()
+        if row is None:
+            return None
+        blob = row[0]
+        # Written by an install with zstandard; without it the page has to be fetched again
+        if blob.endswith('.zst') and zstandard is None:
+            return None
+        try:
+            with open(_blob_path(blob), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        with conn:
+            conn.execute(
+                "UPDATE blobs SET last_access = ? WHERE blob = ?",
+                (datetime.now().isoformat(timespec='seconds'), blob)
+            )
+    finally:
+        conn.close()
+    return _decompress(blob, data).decode('utf-8')
+
+
+def evict(conn):
+    """Delete least recently used blobs until the cache fits in CACHE_CONFIG['max_bytes']."""
+    total = conn.execute("SELECT total FROM cache_size").fetchone()[0]
+    if total <= CACHE_CONFIG['max_bytes']:
+        return
+
+    victims = []
+    for blob, size in conn.execute("SELECT blob, size FROM blobs ORDER BY last_access"):
+        if total <= CACHE_CONFIG['max_bytes']:
+            break
+        victims.append(blob)
+        total -= size
+
+    with conn:
+        conn.executemany("DELETE FROM pages WHERE blob = ?", [(b,) for b in victims])
+        conn.executemany("DELETE FROM blobs WHERE blob = ?", [(b,) for b in victims])
+    for blob in victims:
+        try:
+            os.remove(_blob_path(blob))
+        except FileNotFoundError:
+            pass
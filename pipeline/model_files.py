@@ -0,0 +1,52 @@
+import os
+import hashlib
+from config import MODEL_CONFIG, PATHS
+
+# Saved model per training engine
+MODEL_FILES = {
+    'tfidf': 'engagement_predictor.pkl',
+    'sgd': 'engagement_predictor_sgd.pkl',
+    'tuned': 'engagement_predictor_tuned.pkl',
+    'rollup': 'engagement_predictor_rollup.pkl',  # title + rollup features, MODEL_CONFIG['rollup_features']
+}
+
+# Names the engine whose model last scored the stored articles, so the
+# dashboard serves that model and its predictions
+SERVED_FILE = 'served_engine.txt'
+
+
+def model_file(engine: str = None):
+    return os.path.join(PATHS['models'], MODEL_FILES[engine or MODEL_CONFIG['engine']])
+
+
+def title_model_file(engine: str = None):
+    """Model of `engine` that predicts from a title alone; the rollup model also
+    needs an author, tag and date, so the title model it extends stands in"""
+    engine = engine or MODEL_CONFIG['engine']
+    return model_file('tfidf' if engine == 'rollup' else engine)
+
+
+def served_engine(models_dir: str = None) -> str:
+    """Engine the pipeline last scored with, or MODEL_CONFIG['engine'] before its first run"""
+    try:
+        with open(os.path.join(models_dir or PATHS['models'], SERVED_FILE)) as f:
+            engine = f.read().strip()
+    except FileNotFoundError:
+        return MODEL_CONFIG['engine']
+    return engine if engine in MODEL_FILES else MODEL_CONFIG['engine']
+
+
+def set_served_engine(engine: str):
+    path = os.path.join(PATHS['models'], SERVED_FILE)
+    with open(path + '.tmp', 'w') as f:
+        f.write(engine)
+    os.replace(path + '.tmp', path)
+
+
+def model_version(model_path: str) -> str:
+    """Version tag of a saved model: a hash of the file's contents"""
+    digest = hashlib.sha256()
+    with open(model_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()[:16]
@@ -1,25 +1,117 @@
+import numpy as np
 import pandas as pd
-import string
-from sklearn.model_selection import train_test_split
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import train_test_split, GridSearchCV, StratifiedKFold
+from sklearn.feature_extraction.text import TfidfVectorizer, HashingVectorizer
+from sklearn.linear_model import LogisticRegression, SGDClassifier
 from sklearn.pipeline import Pipeline
-from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
+from sklearn.compose import ColumnTransformer
+from sklearn.preprocessing import FunctionTransformer, StandardScaler
+from sklearn.metrics import confusion_matrix
 import joblib
 from prefect import task, get_run_logger
-from config import MODEL_CONFIG, PATHS
+from config import MODEL_CONFIG, TUNING_CONFIG, PATHS, SIMILARITY_CONFIG
+from pipeline.processed_data import read_processed, iter_processed
+from pipeline.text import preprocess
+from pipeline.compact_scorer import compact_path, export_compact, max_deviation
+from pipeline.feature_store import document_counts, fit_tfidf, tfidf_from_counts
+from pipeline.data_storage import get_watermark, set_watermark
+from pipeline.rollups import FEATURE_COLUMNS, out_of_fold_features
+from pipeline.similarity import build_similarity_index, min_claps, similarity_index_path
+from pipeline.telemetry import tracked_stage, record
+from pipeline.model_files import model_file
 import os
 
-def preprocess(text):
-    text = text.lower()
-    return text.translate(str.maketrans('', '', string.punctuation))
+def make_tfidf_pipeline(memory=None):
+    return Pipeline([
+        ('tfidf', TfidfVectorizer(
+            preprocessor=preprocess,
+            stop_words='english',
+            token_pattern=r'\b\w+\b'
+        )),
+        ('clf', LogisticRegression(max_iter=1000))
+    ], memory=memory)
+
+def make_rollup_pipeline(tfidf):
+    """Classifier over the fitted title vectorizer `tfidf` plus the author and
+    tag/year rollup features. Predicts from a DataFrame with a `title` column
+    and FEATURE_COLUMNS, as returned by `pipeline.rollups.rollup_features`."""
+    return Pipeline([
+        ('features', ColumnTransformer([
+            ('title', FunctionTransformer(tfidf.transform, accept_sparse=True), 'title'),
+            ('rollups', StandardScaler(), FEATURE_COLUMNS)
+        ])),
+        ('clf', LogisticRegression(max_iter=1000))
+    ])
+
+def save_compact(logger, pipeline, model_path: str, check_titles):
+    """Export `pipeline` next to `model_path` as a compact NumPy artifact, pruned
+    of zero-weight terms if that keeps scores within MODEL_CONFIG['compact_tolerance']"""
+    path = compact_path(model_path)
+    check_titles = list(check_titles[:5000])
+    for prune in (True, False):
+        n_terms = export_compact(pipeline, path, prune=prune)
+        deviation = max_deviation(pipeline, path, check_titles)
+        if deviation <= MODEL_CONFIG['compact_tolerance']:
+            logger.info(f"Compact model saved to {path} ({os.path.getsize(path) / 1024:.0f} KB, {n_terms} terms, "
+                        f"max probability deviation {deviation:.1e})")
+            return path
+    os.remove(path)
+    logger.error(f"Compact model deviates from the full model by {deviation:.1e}; not saved")
+    return None
+
+def save_similarity_index(logger, tfidf, ids, vectors) -> int:
+    """Save the nearest-neighbour index of the high-engagement titles `ids` for
+    the predictor page; `vectors()` returns their rows under the fitted `tfidf`.
+    Returns the bytes written."""
+    if not SIMILARITY_CONFIG['enabled']:
+        return 0
+    try:
+        size = build_similarity_index(tfidf, vectors(), ids)
+        logger.info(f"Similarity index of {len(ids)} titles saved to {similarity_index_path()}")
+        return size
+    except Exception as e:
+        logger.error(f"Error building the similarity index: {e}")
+        return 0
+
+def log_metrics(logger, confusion):
+    """Log accuracy/precision/recall/F1 from a 2x2 confusion matrix"""
+    (tn, fp), (fn, tp) = confusion
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    logger.info("Model evaluation metrics:")
+    logger.info(f"  Accuracy:  {(tp + tn) / max(confusion.sum(), 1):.4f}")
+    logger.info(f"  Precision: {precision:.4f}")
+    logger.info(f"  Recall:    {recall:.4f}")
+    logger.info(f"  F1 Score:  {2 * precision * recall / (precision + recall) if precision + recall else 0.0:.4f}")
+
+def train_rollup_model(logger, df, train_idx, test_idx, tfidf):
+    """Fit make_rollup_pipeline on the same split as the title model and save it.
+    The author and tag/year features come from the training rows only, out-of-fold."""
+    features = out_of_fold_features(df, train_idx)
+    frame = pd.concat([df[['title']], features], axis=1)
+
+    pipeline = make_rollup_pipeline(tfidf)
+    pipeline.fit(frame.iloc[train_idx], df['high_engagement'].iloc[train_idx])
+    logger.info("With author and tag/year rollup features:")
+    log_metrics(logger, confusion_matrix(
+        df['high_engagement'].iloc[test_idx], pipeline.predict(frame.iloc[test_idx]), labels=[0, 1]
+    ))
+
+    model_path = model_file('rollup')
+    joblib.dump(pipeline, model_path)
+    logger.info(f"Rollup-feature model saved to {model_path}")
+    return model_path
 
 @task
-def train_model(csv_path: str):
+@tracked_stage('train')
+def train_model(processed_path: str):
     logger = get_run_logger()
     
+    columns = ['id', 'title', 'claps']
+    if MODEL_CONFIG['rollup_features']:
+        columns += ['author_name', 'tag', 'date', 'reading_time_mins', 'responses']
     try:
-        df = pd.read_csv(csv_path)
+        df = read_processed(processed_path, columns=columns)
     except Exception as e:
         logger.error(f"Error loading data: {e}")
         return None
@@ -27,39 +119,228 @@ def train_model(csv_path: str):
     # Create target variable
     df['high_engagement'] = (df['claps'] > MODEL_CONFIG['clap_threshold']).astype(int)
     
-    # Split data
-    X_train, X_test, y_train, y_test = train_test_split(
-        df['title'], 
-        df['high_engagement'], 
+    # Split data (by position, so stored features can be split the same way)
+    train_idx, test_idx = train_test_split(
+        np.arange(len(df)),
         test_size=MODEL_CONFIG['test_size'], 
         random_state=MODEL_CONFIG['random_state']
     )
+    X_test = df['title'].iloc[test_idx]
+    y_train, y_test = df['high_engagement'].iloc[train_idx], df['high_engagement'].iloc[test_idx]
     
     # Create pipeline
-    pipeline = Pipeline([
-        ('tfidf', TfidfVectorizer(
-            preprocessor=preprocess,
-            stop_words='english',
-            token_pattern=r'\b\w+\b'
-        )),
-        ('clf', LogisticRegression(max_iter=1000))
-    ])
+    pipeline = make_tfidf_pipeline()
     
-    # Train model
-    pipeline.fit(X_train, y_train)
+    # Train model on the stored document-term counts, counting only rows the
+    # feature store hasn't seen
+    try:
+        counts, terms, reused = document_counts(pipeline.named_steps['tfidf'], df['id'], df['title'])
+        logger.info(f"Feature store: reused counts for {reused} of {len(df)} titles")
+        tfidf, columns = fit_tfidf(pipeline.named_steps['tfidf'], counts[train_idx], terms)
+        pipeline.steps[0] = ('tfidf', tfidf)
+        pipeline.named_steps['clf'].fit(tfidf_from_counts(tfidf, counts[train_idx], columns), y_train)
+        X_test_features = tfidf_from_counts(tfidf, counts[test_idx], columns)
+        vectors = lambda rows: tfidf_from_counts(tfidf, counts[rows], columns)
+    except Exception as e:
+        logger.error(f"Feature store unavailable, vectorizing from scratch: {e}")
+        pipeline.fit(df['title'].iloc[train_idx], y_train)
+        X_test_features = pipeline.named_steps['tfidf'].transform(X_test)
+        vectors = lambda rows: pipeline.named_steps['tfidf'].transform(df['title'].iloc[rows])
     
     # Evaluate
-    y_pred = pipeline.predict(X_test)
-    logger.info("Model evaluation metrics:")
-    logger.info(f"  Accuracy:  {accuracy_score(y_test, y_pred):.4f}")
-    logger.info(f"  Precision: {precision_score(y_test, y_pred):.4f}")
-    logger.info(f"  Recall:    {recall_score(y_test, y_pred):.4f}")
-    logger.info(f"  F1 Score:  {f1_score(y_test, y_pred):.4f}")
+    y_pred = pipeline.named_steps['clf'].predict(X_test_features)
+    log_metrics(logger, confusion_matrix(y_test, y_pred, labels=[0, 1]))
     
     # Save model
     os.makedirs(PATHS['models'], exist_ok=True)
-    model_path = os.path.join(PATHS['models'], 'engagement_predictor.pkl')
+    model_path = model_file('tfidf')
     joblib.dump(pipeline, model_path)
     logger.info(f"Model saved to {model_path}")
+    save_compact(logger, pipeline, model_path, X_test)
+    bytes_written = os.path.getsize(model_path)
     
-    return model_path
\ No newline at end of file
+    high = np.flatnonzero(df['claps'].to_numpy() > min_claps())
+    bytes_written += save_similarity_index(logger, pipeline.named_steps['tfidf'], df['id'].to_numpy()[high], lambda: vectors(high))
+    
+    # The rollup model, when it trains, is the one scored and served
+    if MODEL_CONFIG['rollup_features']:
+        try:
+            model_path = train_rollup_model(logger, df, train_idx, test_idx, pipeline.named_steps['tfidf'])
+            bytes_written += os.path.getsize(model_path)
+        except Exception as e:
+            logger.error(f"Error training the rollup-feature model: {e}")
+    record(rows_in=len(df), bytes_written=bytes_written)
+    
+    return model_path
+
+@task
+@tracked_stage('tune')
+def tune_model(processed_path: str):
+    """Cross-validated grid search over the TF-IDF and classifier settings in
+    TUNING_CONFIG, run across all cores"""
+    logger = get_run_logger()
+
+    try:
+        df = read_processed(processed_path, columns=['id', 'title', 'claps'])
+    except Exception as e:
+        logger.error(f"Error loading data: {e}")
+        return None
+
+    df['high_engagement'] = (df['claps'] > MODEL_CONFIG['clap_threshold']).astype(int)
+
+    # Same holdout as train_model, so the metrics are comparable
+    X_train, X_test, y_train, y_test = train_test_split(
+        df['title'],
+        df['high_engagement'],
+        test_size=MODEL_CONFIG['test_size'],
+        random_state=MODEL_CONFIG['random_state']
+    )
+
+    # The pipeline caches each fitted vectorizer on disk, keyed by its settings
+    # and training fold, so candidates that differ only in classifier settings
+    # reuse it instead of re-vectorizing, and so does a later search over the
+    # same titles
+    memory = joblib.Memory(PATHS['tuning_cache'], verbose=0)
+    search = GridSearchCV(
+        make_tfidf_pipeline(memory=memory),
+        TUNING_CONFIG['param_grid'],
+        cv=StratifiedKFold(TUNING_CONFIG['cv_folds'], shuffle=True, random_state=MODEL_CONFIG['random_state']),
+        scoring=TUNING_CONFIG['scoring'],
+        n_jobs=TUNING_CONFIG['n_jobs']
+    )
+    search.fit(X_train, y_train)
+    memory.reduce_size(bytes_limit=TUNING_CONFIG['cache_bytes_limit'])
+
+    pipeline = search.best_estimator_.set_params(memory=None)
+    logger.info(f"Best parameters: {search.best_params_} (CV {TUNING_CONFIG['scoring']} {search.best_score_:.4f})")
+    log_metrics(logger, confusion_matrix(y_test, pipeline.predict(X_test), labels=[0, 1]))
+
+    os.makedirs(PATHS['models'], exist_ok=True)
+    results = pd.DataFrame(search.cv_results_).sort_values('rank_test_score')
+    results_path = os.path.join(PATHS['models'], 'tuning_results.csv')
+    results[['rank_test_score', 'mean_test_score', 'std_test_score', 'mean_fit_time', 'params']].to_csv(results_path, index=False)
+    model_path = model_file('tuned')
+    joblib.dump(pipeline, model_path)
+    logger.info(f"Model saved to {model_path}, search results to {results_path}")
+    save_compact(logger, pipeline, model_path, X_test)
+    high = df[df['claps'] > min_claps()]
+    tfidf = pipeline.named_steps['tfidf']
+    index_bytes = save_similarity_index(logger, tfidf, high['id'].to_numpy(), lambda: tfidf.transform(high['title']))
+    record(rows_in=len(df), bytes_written=os.path.getsize(model_path) + os.path.getsize(results_path) + index_bytes)
+
+    return model_path
+
+def in_holdout(ids: pd.Series):
+    """Stable train/holdout split keyed on article id, so an article stays on
+    the same side of the split across incremental runs"""
+    return pd.util.hash_array(ids.to_numpy()) % 10_000 < MODEL_CONFIG['test_size'] * 10_000
+
+def side_file(model_path: str, name: str) -> str:
+    """Parquet file kept beside the SGD model: its holdout sample, or the
+    high-engagement titles seen so far"""
+    return f"{os.path.splitext(model_path)[0]}_{name}.parquet"
+
+def read_side_file(path: str, last_id: int):
+    # Kept only while the model it was saved with is being extended
+    return [pd.read_parquet(path)] if last_id and os.path.exists(path) else []
+
+def write_side_file(df: pd.DataFrame, path: str):
+    df.to_parquet(path + '.tmp', index=False)
+    os.replace(path + '.tmp', path)
+
+def make_hashed_pipeline():
+    # HashingVectorizer has no vocabulary to fit, so every chunk maps to the
+    # same feature space and the classifier can be updated with partial_fit
+    return Pipeline([
+        ('hash', HashingVectorizer(
+            preprocessor=preprocess,
+            stop_words='english',
+            token_pattern=r'\b\w+\b',
+            n_features=MODEL_CONFIG['hash_features'],
+            alternate_sign=False
+        )),
+        ('clf', SGDClassifier(
+            loss='log_loss',
+            alpha=MODEL_CONFIG['sgd_alpha'],
+            average=True,  # Averaged weights smooth out the single pass per chunk
+            random_state=MODEL_CONFIG['random_state']
+        ))
+    ])
+
+@task
+@tracked_stage('train')
+def train_model_incremental(processed_path: str, chunk_size: int = None):
+    """Update the hashed SGD model with articles processed since it was last saved.
+
+    The processed dataset is streamed in chunks, so memory stays bounded by the
+    chunk size whatever the size of the corpus.
+    """
+    logger = get_run_logger()
+    chunk_size = chunk_size or MODEL_CONFIG['chunk_size']
+    model_path = model_file('sgd')
+
+    # The watermark records the size of the model it was saved with; a missing
+    # or different model file means starting over
+    last_id, model_bytes = get_watermark('train_sgd')
+    if os.path.exists(model_path) and os.path.getsize(model_path) == model_bytes:
+        pipeline = joblib.load(model_path)
+    else:
+        pipeline = make_hashed_pipeline()
+        last_id = 0
+    vectorizer, clf = pipeline.named_steps['hash'], pipeline.named_steps['clf']
+    titles_path, holdout_path = side_file(model_path, 'titles'), side_file(model_path, 'holdout')
+    high, holdout = read_side_file(titles_path, last_id), read_side_file(holdout_path, last_id)
+
+    try:
+        n_rows = 0
+        for chunk in iter_processed(processed_path, ['title', 'claps'], after_id=last_id, chunk_size=chunk_size):
+            if SIMILARITY_CONFIG['enabled']:
+                high.append(chunk.loc[chunk['claps'] > min_claps(), ['id', 'title']])
+            held_out = in_holdout(chunk['id'])
+            holdout = [pd.concat([*holdout, chunk[held_out]]).tail(MODEL_CONFIG['holdout_sample'])]
+            train = chunk[~held_out]
+            if not train.empty:
+                y = (train['claps'] > MODEL_CONFIG['clap_threshold']).astype(int)
+                clf.partial_fit(vectorizer.transform(train['title']), y, classes=[0, 1])
+                n_rows += len(train)
+            last_id = int(chunk['id'].iloc[-1])
+    except Exception as e:
+        logger.error(f"Error training on processed data: {e}")
+        return None
+
+    if not n_rows:
+        if not hasattr(clf, 'coef_'):
+            logger.error("No training data available!")
+            return None
+        logger.info(f"No new articles since id {last_id}; model is up to date")
+        record(rows_in=0)
+        return model_path
+    logger.info(f"Trained on {n_rows} new records (watermark id {last_id})")
+
+    # Evaluate on the most recent holdout rows, kept beside the model so the
+    # processed dataset isn't read again
+    test = holdout[0].drop_duplicates('id', keep='last')
+    if not test.empty:
+        y = (test['claps'] > MODEL_CONFIG['clap_threshold']).astype(int)
+        log_metrics(logger, confusion_matrix(y, pipeline.predict(test['title']), labels=[0, 1]))
+
+    # Replace the model atomically, then move the watermark
+    os.makedirs(PATHS['models'], exist_ok=True)
+    write_side_file(test, holdout_path)
+    joblib.dump(pipeline, model_path + '.tmp')
+    os.replace(model_path + '.tmp', model_path)
+    set_watermark('train_sgd', last_id, os.path.getsize(model_path))
+    logger.info(f"Model saved to {model_path}")
+    bytes_written = os.path.getsize(model_path)
+
+    # The hashed features can't be mapped back to terms, so the similarity
+    # index gets its own vectorizer, fitted on the high-engagement titles kept
+    # beside the model (only the new chunks are read to extend them)
+    if high:
+        high = pd.concat(high).drop_duplicates('id', keep='last')
+        write_side_file(high, titles_path)
+        tfidf = make_tfidf_pipeline().named_steps['tfidf']
+        bytes_written += save_similarity_index(logger, tfidf, high['id'].to_numpy(), lambda: tfidf.fit_transform(high['title']))
+    record(rows_in=n_rows, bytes_written=bytes_written)
+
+    return model_path
@@ -0,0 +1,184 @@
+import os
+import json
+import queue
+import threading
+import time
+import argparse
+from collections import OrderedDict
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import PREDICTOR_CONFIG
+from pipeline.text import preprocess
+from pipeline.compact_scorer import CompactScorer, compact_path
+from pipeline.model_files import title_model_file, served_engine
+
+
+def normalize_title(title: str) -> str:
+    """Cache key for a title: the text the model's vectorizer actually sees,
+    so titles differing only in case, punctuation or spacing share an entry."""
+    return ' '.join(preprocess(str(title)).split())
+
+
+def load_model(model_path: str):
+    """Load a saved model, preferring its compact .npz export (NumPy only, no
+    sklearn import) when that is at least as new as the pickle"""
+    compact = compact_path(model_path)
+    if os.path.exists(compact) and (not os.path.exists(model_path)
+                                    or os.path.getmtime(compact) >= os.path.getmtime(model_path)):
+        return CompactScorer(compact)
+    import joblib
+    return joblib.load(model_path)
+
+
+class EngagementPredictor:
+    """Batched predictions from a saved engagement model, with an LRU cache of results."""
+
+    def __init__(self, model_path: str = None, cache_size: int = None):
+        if model_path is None:
+            model_path = title_model_file(served_engine())
+        self.model = load_model(model_path)
+        self.cache_size = PREDICTOR_CONFIG['cache_size'] if cache_size is None else cache_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def predict_batch(self, titles):
+        """Return one (label, probability of high engagement) pair per title.
+
+        Cache misses are scored with a single predict_proba call and the labels
+        are taken from the probabilities, as predict would.
+        """
+        keys = [normalize_title(t) for t in titles]
+        results = {}
+        with self.lock:
+            for key in keys:
+                if key in self.cache:
+                    self.cache.move_to_end(key)
+                    results[key] = self.cache[key]
+
+        missing = list(dict.fromkeys(k for k in keys if k not in results))
+        if missing:
+            proba = self.model.predict_proba(missing)
+            labels = self.model.classes_[proba.argmax(axis=1)]
+            scored = {k: (int(label), float(p[1])) for k, label, p in zip(missing, labels, proba)}
+            results.update(scored)
+            with self.lock:
+                self.cache.update(scored)
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+
+        return [results[k] for k in keys]
+
+    def predict(self, title: str):
+        return self.predict_batch([title])[0]
+
+
+class MicroBatcher:
+    """Groups titles submitted from many threads into predict_batch calls of up
+    to `max_batch` titles, waiting at most `max_wait_ms` for a batch to fill."""
+
+    def __init__(self, predictor: EngagementPredictor, max_batch: int = None, max_wait_ms: float = None):
+        self.predictor = predictor
+        self.max_batch = max_batch or PREDICTOR_CONFIG['max_batch']
+        self.max_wait = (PREDICTOR_CONFIG['max_wait_ms'] if max_wait_ms is None else max_wait_ms) / 1000
+        self.pending = queue.Queue()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, titles) -> Future:
+        future = Future()
+        self.pending.put((list(titles), future))
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self.pending.get()]
+            size = len(batch[0][0])
+            deadline = time.monotonic() + self.max_wait
+            try:
+                # Requests that queued up while the last batch was scored are
+                # taken at once; beyond those, wait no later than the deadline
+                while size < self.max_batch:
+                    titles, future = self.pending.get(timeout=max(deadline - time.monotonic(), 0))
+                    batch.append((titles, future))
+                    size += len(titles)
+            except queue.Empty:
+                pass
+
+            try:
+                results = self.predictor.predict_batch([t for titles, _ in batch for t in titles])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            start = 0
+            for titles, future in batch:
+                future.set_result(results[start:start + len(titles)])
+                start += len(titles)
+
+
+class PredictionHandler(BaseHTTPRequestHandler):
+    """POST /predict {"titles": [...]} -> {"predictions": [{"title", "label", "probability"}]}"""
+
+    batcher = None
+    protocol_version = 'HTTP/1.1'  # keep-alive; every response sets Content-Length
+
+    def do_POST(self):
+        if self.path != '/predict':
+            self._send(404, {'error': 'not found'})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            titles = body['titles']
+            if not isinstance(titles, list):
+                raise ValueError("'titles' must be a list")
+        except (ValueError, KeyError, TypeError) as e:
+            self._send(400, {'error': f"bad request: {e}"})
+            return
+
+        try:
+            results = self.batcher.submit(titles).result()
+        except Exception as e:
+            self._send(500, {'error': str(e)})
+            return
+        self._send(200, {'predictions': [
+            {'title': title, 'label': label, 'probability': probability}
+            for title, (label, probability) in zip(titles, results)
+        ]})
+
+    def _send(self, status: int, payload: dict):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PredictionServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # listen backlog; the default 5 resets bursts of new clients
+
+
+def make_server(predictor: EngagementPredictor, host: str = None, port: int = None,
+                max_batch: int = None, max_wait_ms: float = None) -> PredictionServer:
+    handler = type('Handler', (PredictionHandler,), {'batcher': MicroBatcher(predictor, max_batch, max_wait_ms)})
+    port = PREDICTOR_CONFIG['port'] if port is None else port
+    return PredictionServer((host or PREDICTOR_CONFIG['host'], port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve engagement predictions over local HTTP/JSON')
+    parser.add_argument('--model', help='Model file (default: the title model of the engine the pipeline last scored with)')
+    parser.add_argument('--host', default=PREDICTOR_CONFIG['host'])
+    parser.add_argument('--port', type=int, default=PREDICTOR_CONFIG['port'])
+    args = parser.parse_args()
+
+    server = make_server(EngagementPredictor(args.model), args.host, args.port)
+    print(f"Serving predictions on http://{args.host}:{args.port}/predict")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
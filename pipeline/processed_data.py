@@ -0,0 +1,102 @@
+import os
+import glob
+import shutil
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from config import PATHS, TRANSFORM_CONFIG
+
+PROCESSED_NAME = 'medium_articles_processed'
+
+# Column dtypes of the processed dataset; dates are parsed, counts are integers
+# and the low-cardinality text columns are categorical
+PROCESSED_DTYPES = {
+    'id': 'int64',
+    'title': 'string',
+    'claps': 'int64',
+    'responses': 'int32',
+    'author_name': 'category',
+    'reading_time_mins': 'int16',
+    'tag': 'category',
+}
+
+
+def processed_path(output_format: str = None) -> str:
+    """Location of the processed dataset: a Parquet part directory or a single CSV."""
+    output_format = output_format or TRANSFORM_CONFIG['output_format']
+    suffix = 'parquet' if output_format == 'parquet' else 'csv'
+    return os.path.join(PATHS['processed_data'], f"{PROCESSED_NAME}.{suffix}")
+
+
+def to_typed(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    if 'date' in df:
+        df['date'] = pd.to_datetime(df['date'], format='%Y-%m-%d', errors='coerce')
+    return df.astype({c: t for c, t in PROCESSED_DTYPES.items() if c in df})
+
+
+def _part_path(path: str, last_id: int) -> str:
+    # Parts are named by the last article id they hold, so a part written by a
+    # run that died before moving its watermark can be recognised and removed
+    return os.path.join(path, f"part-{last_id:012d}.parquet")
+
+
+def write_processed(df: pd.DataFrame, path: str, last_id: int, append: bool = False) -> int:
+    """Write (or append) cleaned rows to the processed dataset. Returns its size in bytes."""
+    if path.endswith('.csv'):
+        to_typed(df).to_csv(path, mode='a' if append else 'w', header=not append, index=False)
+        return os.path.getsize(path)
+
+    if not append and os.path.exists(path):
+        shutil.rmtree(path)
+    os.makedirs(path, exist_ok=True)
+    table = pa.Table.from_pandas(to_typed(df), preserve_index=False)
+    pq.write_table(table, _part_path(path, last_id))
+    return sum(os.path.getsize(p) for p in glob.glob(os.path.join(path, 'part-*.parquet')))
+
+
+def drop_parts_after(path: str, last_id: int):
+    """Remove Parquet parts holding rows past `last_id` (left behind by an interrupted run)."""
+    for part in glob.glob(os.path.join(path, 'part-*.parquet')):
+        if int(os.path.basename(part)[5:-8]) > last_id:
+            os.remove(part)
+
+
+def read_processed(path: str, columns=None) -> pd.DataFrame:
+    """Read the processed dataset, only `columns` if given. Parquet files are memory-mapped."""
+    if path.endswith('.csv'):
+        header = pd.read_csv(path, nrows=0).columns
+        usecols = [c for c in columns if c in header] if columns else None
+        wanted = usecols if usecols is not None else list(header)
+        return pd.read_csv(
+            path,
+            usecols=usecols,
+            dtype={c: t for c, t in PROCESSED_DTYPES.items() if c in wanted},
+            parse_dates=['date'] if 'date' in wanted else False
+        )
+    return pq.read_table(path, columns=columns, memory_map=True).to_pandas()
+
+
+def iter_processed(path: str, columns, after_id: int = 0, chunk_size: int = None):
+    """Yield the processed rows with id > `after_id` as DataFrames of at most `chunk_size` rows.
+
+    Parquet parts that end at or before `after_id` are skipped without being read.
+    """
+    chunk_size = chunk_size or TRANSFORM_CONFIG['chunk_size']
+    columns = list(dict.fromkeys(['id', *columns]))
+
+    if path.endswith('.csv'):
+        batches = pd.read_csv(path, usecols=columns, chunksize=chunk_size,
+                              dtype={c: t for c, t in PROCESSED_DTYPES.items() if c in columns})
+    else:
+        parts = sorted(glob.glob(os.path.join(path, 'part-*.parquet')))
+        batches = (
+            batch.to_pandas()
+            for part in parts if int(os.path.basename(part)[5:-8]) > after_id
+            for batch in pq.ParquetFile(part, memory_map=True).iter_batches(batch_size=chunk_size, columns=columns)
+        )
+
+    for batch in batches:
+        batch = batch[batch['id'] > after_id]
+        if not batch.empty:
+            yield batch
@@ -0,0 +1,269 @@
+"""Per-author and per-tag/day rollups of the articles table.
+
+author_stats and tag_day_stats hold, per key, the article count, the number of
+high-engagement articles, column sums and a clap histogram with
+BUCKETS_PER_DECADE log-spaced buckets per power of ten, from which quantiles
+are estimated to within about 12%. Storing articles applies every row it
+writes, minus the stored version it overwrites, as a delta, so keeping the
+rollups current costs time proportional to the changed rows only.
+"""
+import json
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import KFold
+from config import MODEL_CONFIG, DB_CONFIG
+
+BUCKETS_PER_DECADE = 10
+SUM_COLUMNS = ['articles', 'high_engagement', 'claps_sum', 'log_claps_sum', 'responses_sum', 'reading_time_sum']
+ROLLUP_KEYS = {'author_stats': ['author_name'], 'tag_day_stats': ['tag', 'day']}
+SOURCE_COLUMNS = ['date', 'claps', 'responses', 'author_name', 'reading_time_mins', 'tag']
+
+# Features of an article from its author's and tag/year's figures
+FEATURE_COLUMNS = ['author_articles', 'author_mean_log_claps', 'author_high_rate', 'tag_year_high_rate',
+                   'log_reading_time']
+STAT_COLUMNS = ['articles', 'high_engagement', 'log_claps_sum']
+PRIOR_ARTICLES = 5  # pseudo-articles at the overall rate, so a new author's rate isn't 0 or 1
+
+TAG_YEAR_QUERY = """
+SELECT tag, substr(day, 1, 4) AS year, SUM(articles) AS articles, SUM(high_engagement) AS high_engagement,
+       SUM(log_claps_sum) AS log_claps_sum
+FROM tag_day_stats
+GROUP BY tag, year
+"""
+
+
+def definition() -> str:
+    """Settings the stored rollups depend on; a change means rebuilding them"""
+    return json.dumps({'clap_threshold': MODEL_CONFIG['clap_threshold'], 'buckets_per_decade': BUCKETS_PER_DECADE})
+
+
+def clap_bucket(claps):
+    """Histogram bucket of each clap count: 0 for no claps, then BUCKETS_PER_DECADE per power of ten"""
+    claps = np.asarray(claps, dtype=float)
+    return np.where(claps >= 1, 1 + np.floor(BUCKETS_PER_DECADE * np.log10(np.maximum(claps, 1))), 0).astype(int)
+
+
+def sketch_quantile(sketch: dict, q: float) -> float:
+    """Clap count at rank ceil(q * n) among the n articles in `sketch`
+    ({bucket: articles}), to within about 12%"""
+    buckets = sorted((int(b), n) for b, n in sketch.items())
+    total = sum(n for _, n in buckets)
+    if not total:
+        return float('nan')
+    seen = 0
+    for bucket, n in buckets:
+        seen += n
+        if seen >= q * total:
+            break
+    # Geometric middle of the bucket's clap range
+    return 0.0 if bucket == 0 else 10 ** ((bucket - 0.5) / BUCKETS_PER_DECADE)
+
+
+def merge_sketches(sketches) -> dict:
+    merged = {}
+    for sketch in sketches:
+        for bucket, n in json.loads(sketch).items():
+            merged[bucket] = merged.get(bucket, 0) + n
+    return merged
+
+
+def _days(dates: pd.Series) -> pd.Series:
+    """ISO day of each date. Stored rows carry YYYY-MM-DD strings, processed rows
+    datetimes; either way only the distinct values are converted."""
+    codes, uniques = pd.factorize(dates)
+    days = pd.Series(uniques)
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        days = pd.to_datetime(days, format='%Y-%m-%d', errors='coerce')
+    # Missing dates have code -1, which picks the trailing None
+    days = np.append(days.dt.strftime('%Y-%m-%d').to_numpy(dtype=object), None)
+    return pd.Series(days[codes], index=dates.index)
+
+
+def _article_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """Each article's contribution to the rollups; missing counts count as 0,
+    and an author stored as '' (missing) has no author_stats row"""
+    claps = pd.to_numeric(df['claps'], errors='coerce').fillna(0).clip(lower=0).to_numpy(dtype=float)
+    authors = df['author_name'].astype(object).to_numpy()
+    return pd.DataFrame({
+        'author_name': np.where(authors == '', None, authors),
+        'tag': df['tag'].astype(object).to_numpy(),
+        'day': _days(df['date']).to_numpy(),
+        'articles': 1,
+        'high_engagement': (claps > MODEL_CONFIG['clap_threshold']).astype(int),
+        'claps_sum': claps,
+        'log_claps_sum': np.log1p(claps),
+        'responses_sum': pd.to_numeric(df['responses'], errors='coerce').fillna(0).to_numpy(dtype=float),
+        'reading_time_sum': pd.to_numeric(df['reading_time_mins'], errors='coerce').fillna(0).to_numpy(dtype=float),
+        'bucket': clap_bucket(claps)
+    })
+
+
+def _read(conn, table: str, index: pd.Index, columns) -> pd.DataFrame:
+    """Stored rollup rows for the keys in `index`, looked up by their first key column"""
+    keys = ROLLUP_KEYS[table]
+    firsts = index.get_level_values(0).unique()
+    frames = []
+    for start in range(0, len(firsts), 500):
+        chunk = list(firsts[start:start + 500])
+        frames.append(pd.read_sql(
+            f"SELECT {', '.join(keys + columns)} FROM {table} WHERE {keys[0]} IN ({', '.join('?' * len(chunk))})",
+            conn, params=chunk
+        ))
+    current = pd.concat(frames, ignore_index=True).set_index(keys)
+    return current[current.index.isin(index)]
+
+
+def _merge(conn, table: str, rows: pd.DataFrame):
+    keys = ROLLUP_KEYS[table]
+    rows = rows.dropna(subset=keys)
+    if rows.empty:
+        return
+    delta = rows.groupby(keys)[SUM_COLUMNS].sum()
+    current = _read(conn, table, delta.index, SUM_COLUMNS + ['clap_sketch'])
+    totals = delta.add(current[SUM_COLUMNS], fill_value=0)
+
+    # Histograms as (key..., bucket) -> articles, old and new added together
+    stored = [
+        (*(key if isinstance(key, tuple) else (key,)), int(bucket), n)
+        for key, sketch in current['clap_sketch'].items()
+        for bucket, n in json.loads(sketch).items()
+    ]
+    counts = pd.concat([
+        rows.groupby(keys + ['bucket'])['articles'].sum(),
+        pd.DataFrame(stored, columns=keys + ['bucket', 'articles']).groupby(keys + ['bucket'])['articles'].sum()
+    ]).groupby(level=list(range(len(keys) + 1))).sum()
+    sketches = {}
+    for (*key, bucket), n in counts[counts > 0].items():
+        sketches.setdefault(tuple(key) if len(key) > 1 else key[0], {})[int(bucket)] = int(n)
+
+    gone = totals.index[totals['articles'] <= 0]
+    kept = totals[totals['articles'] > 0]
+    conn.executemany(
+        f"DELETE FROM {table} WHERE {' AND '.join(f'{k} = ?' for k in keys)}",
+        [key if isinstance(key, tuple) else (key,) for key in gone]
+    )
+    conn.executemany(
+        f"INSERT OR REPLACE INTO {table} ({', '.join(keys + SUM_COLUMNS)}, clap_sketch) "
+        f"VALUES ({', '.join('?' * (len(keys) + len(SUM_COLUMNS) + 1))})",
+        (
+            (*(key if isinstance(key, tuple) else (key,)), *(v.item() for v in values),
+             json.dumps(sketches.get(key, {})))
+            for key, values in zip(kept.index, kept[SUM_COLUMNS].to_numpy(dtype=float))
+        )
+    )
+
+
+def rollup_delta(added: pd.DataFrame = None, removed: pd.DataFrame = None) -> dict:
+    """{table: rows to merge} for adding the articles in `added` to the rollups and
+    taking those in `removed` out, summed per key and clap bucket. Needs no
+    connection, so stores compute it before taking the write lock."""
+    parts = []
+    for df, sign in ((added, 1), (removed, -1)):
+        if df is not None and len(df):
+            rows = _article_rows(df)
+            rows[SUM_COLUMNS] = rows[SUM_COLUMNS] * sign
+            parts.append(rows)
+    if not parts:
+        return {}
+    rows = pd.concat(parts, ignore_index=True)
+    return {table: rows.groupby(keys + ['bucket'], as_index=False)[SUM_COLUMNS].sum()
+            for table, keys in ROLLUP_KEYS.items()}
+
+
+def merge_delta(conn, delta: dict):
+    """Apply a `rollup_delta`, inside the caller's transaction"""
+    for table, rows in delta.items():
+        _merge(conn, table, rows)
+
+
+def apply_delta(conn, added: pd.DataFrame = None, removed: pd.DataFrame = None):
+    """Add the articles in `added` to the rollups and take those in `removed`
+    out, inside the caller's transaction"""
+    merge_delta(conn, rollup_delta(added, removed))
+
+
+def rebuild_rollups(conn, chunk_size: int = 200_000):
+    """Recompute both rollups from the articles table, `chunk_size` rows at a time"""
+    conn.execute("DELETE FROM author_stats")
+    conn.execute("DELETE FROM tag_day_stats")
+    last_id = 0
+    while True:
+        chunk = pd.read_sql(
+            f"SELECT id, {', '.join(SOURCE_COLUMNS)} FROM {DB_CONFIG['table_name']} WHERE id > ? ORDER BY id LIMIT ?",
+            conn, params=(last_id, chunk_size)
+        )
+        if chunk.empty:
+            break
+        apply_delta(conn, added=chunk)
+        last_id = int(chunk['id'].iloc[-1])
+    conn.execute("INSERT OR REPLACE INTO rollup_meta (key, value) VALUES ('definition', ?)", (definition(),))
+
+
+def rollups_stale(conn) -> bool:
+    """Whether the stored rollups were built with other settings (or never built)"""
+    row = conn.execute("SELECT value FROM rollup_meta WHERE key = 'definition'").fetchone()
+    return row is None or row[0] != definition()
+
+
+def _stats(rows: pd.DataFrame):
+    """Per-author and per-tag/year article counts, high-engagement counts and
+    log-clap sums of `rows` (as returned by `_article_rows`)"""
+    author = rows.groupby('author_name')[STAT_COLUMNS].sum()
+    tag_year = rows.assign(year=rows['day'].str[:4]).groupby(['tag', 'year'])[STAT_COLUMNS].sum()
+    return author, tag_year
+
+
+def _encode(df: pd.DataFrame, author: pd.DataFrame, tag_year: pd.DataFrame) -> np.ndarray:
+    """FEATURE_COLUMNS of the articles in `df` from author and tag/year stats,
+    smoothed towards the overall values of those stats by PRIOR_ARTICLES"""
+    n_total = max(tag_year['articles'].sum(), 1)
+    rate = tag_year['high_engagement'].sum() / n_total
+    mean_log = tag_year['log_claps_sum'].sum() / n_total
+
+    years = _days(df['date']).str[:4]
+    a = author.reindex(df['author_name'].astype(object).to_numpy())[STAT_COLUMNS].fillna(0).to_numpy(dtype=float)
+    t = tag_year.reindex(pd.MultiIndex.from_arrays([df['tag'].astype(object), years]))
+    t = t[['articles', 'high_engagement']].fillna(0).to_numpy(dtype=float)
+    return np.column_stack([
+        np.log1p(a[:, 0]),
+        (a[:, 2] + PRIOR_ARTICLES * mean_log) / (a[:, 0] + PRIOR_ARTICLES),
+        (a[:, 1] + PRIOR_ARTICLES * rate) / (a[:, 0] + PRIOR_ARTICLES),
+        (t[:, 1] + PRIOR_ARTICLES * rate) / (t[:, 0] + PRIOR_ARTICLES),
+        np.log1p(pd.to_numeric(df['reading_time_mins'], errors='coerce').fillna(0).to_numpy(dtype=float))
+    ])
+
+
+def rollup_features(conn, df: pd.DataFrame) -> pd.DataFrame:
+    """FEATURE_COLUMNS for new articles in `df` (author_name, tag, date,
+    reading_time_mins), joined from the stored rollups and aligned with `df`'s
+    index. For scoring only: the rollups include every stored article's claps,
+    so training uses `out_of_fold_features` instead.
+    """
+    authors = pd.Index(df['author_name'].dropna().astype(object).unique(), name='author_name')
+    if len(authors):
+        author = _read(conn, 'author_stats', authors, STAT_COLUMNS)
+    else:
+        author = pd.DataFrame(columns=STAT_COLUMNS)
+    tag_year = pd.read_sql(TAG_YEAR_QUERY, conn).set_index(['tag', 'year'])
+    return pd.DataFrame(_encode(df, author, tag_year), columns=FEATURE_COLUMNS, index=df.index)
+
+
+def out_of_fold_features(df: pd.DataFrame, train_idx, folds: int = None) -> pd.DataFrame:
+    """FEATURE_COLUMNS for the processed articles in `df` (which also carry
+    `claps`), computed from the training rows at positions `train_idx` only.
+
+    Training rows are split into MODEL_CONFIG['rollup_folds'] folds and each
+    fold is encoded from the other folds, so no row's figures include its own
+    claps; every other row is encoded from all training rows.
+    """
+    folds = folds or MODEL_CONFIG['rollup_folds']
+    train_idx = np.asarray(train_idx)
+    rows = _article_rows(df)
+    values = np.empty((len(df), len(FEATURE_COLUMNS)))
+
+    rest = np.setdiff1d(np.arange(len(df)), train_idx)
+    values[rest] = _encode(df.iloc[rest], *_stats(rows.iloc[train_idx]))
+    kfold = KFold(n_splits=min(folds, len(train_idx)), shuffle=True, random_state=MODEL_CONFIG['random_state'])
+    for fit, held in kfold.split(train_idx):
+        values[train_idx[held]] = _encode(df.iloc[train_idx[held]], *_stats(rows.iloc[train_idx[fit]]))
+    return pd.DataFrame(values, columns=FEATURE_COLUMNS, index=df.index)
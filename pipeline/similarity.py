@@ -0,0 +1,87 @@
+"""Nearest high-engagement titles to a query title, for the predictor page.
+
+`train_model` saves the L2-normalised TF-IDF vectors of the titles with more
+than `min_claps()` claps as an inverted index: for each term of the model's
+vocabulary, the titles containing it and their weights (the columns of a CSC
+matrix). A query only walks the posting lists of its own terms, so the exact
+top-k cosine neighbours cost time in proportion to those lists rather than to
+the number of titles indexed. Like the compact scorer, searching needs NumPy
+only.
+"""
+import os
+import numpy as np
+from config import MODEL_CONFIG, PATHS, SIMILARITY_CONFIG
+from pipeline.compact_scorer import CompactVectorizer, sorted_terms, vectorizer_arrays
+
+
+def similarity_index_path() -> str:
+    return os.path.join(PATHS['models'], SIMILARITY_CONFIG['index_file'])
+
+
+def min_claps():
+    if SIMILARITY_CONFIG['min_claps'] is None:
+        return MODEL_CONFIG['clap_threshold']
+    return SIMILARITY_CONFIG['min_claps']
+
+
+def build_similarity_index(tfidf, X, ids, path: str = None) -> int:
+    """Save the rows of `X` (the fitted `tfidf`'s output for the titles with
+    `ids`) as a search index at `path`. Returns its size in bytes."""
+    path = path or similarity_index_path()
+    terms, columns = sorted_terms(tfidf)
+    postings = X.tocsr()[:, columns].tocsc()
+    postings.sort_indices()
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path + '.tmp', 'wb') as f:
+        np.savez(
+            f,
+            **vectorizer_arrays(tfidf, terms, columns),
+            ids=np.asarray(ids, dtype=np.int64),
+            indptr=postings.indptr.astype(np.int64),
+            rows=postings.indices.astype(np.int32),
+            weights=postings.data.astype(np.float32),
+        )
+    os.replace(path + '.tmp', path)
+    return os.path.getsize(path)
+
+
+class SimilarityIndex(CompactVectorizer):
+    """Exact cosine top-k search over an index saved by `build_similarity_index`"""
+
+    def __init__(self, path: str = None):
+        super().__init__(path or similarity_index_path())
+
+    def _load(self, f):
+        super()._load(f)
+        self.ids = f['ids']
+        self.indptr = f['indptr']
+        self.rows = f['rows']
+        self.weights = f['weights']
+
+    def __len__(self):
+        return len(self.ids)
+
+    def search(self, title: str, k: int = None, among=None):
+        """Ids and cosine similarities of the `k` indexed titles closest to
+        `title`, best first. Only titles sharing a term with it can match;
+        `among` (article ids) restricts the search to those titles."""
+        k = k or SIMILARITY_CONFIG['top_k']
+        _, pos, weights = self.tfidf([title])
+        if not len(pos):
+            return self.ids[:0], np.zeros(0)
+
+        # Every posting of the title's terms, scored by the term's query weight
+        spans = [slice(self.indptr[p], self.indptr[p + 1]) for p in pos]
+        scores = np.bincount(
+            np.concatenate([self.rows[span] for span in spans]),
+            np.concatenate([self.weights[span] * np.float32(w) for span, w in zip(spans, weights)]),
+            minlength=len(self.ids)
+        )
+        candidates = np.flatnonzero(scores > 0)
+        if among is not None:
+            candidates = candidates[np.isin(self.ids[candidates], among)]
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        best = candidates[np.lexsort((candidates, -scores[candidates]))]
+        return self.ids[best], scores[best]
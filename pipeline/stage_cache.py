@@ -0,0 +1,101 @@
+import os
+import sys
+import json
+import hashlib
+from datetime import datetime
+from pipeline.data_storage import get_connection, article_partitions
+
+# Column sums catch value updates (upserts only ever change non-key columns);
+# new or deleted stories change the count or max id
+DB_FINGERPRINT_QUERY = """
+SELECT COUNT(*), MAX(id), SUM(claps), SUM(responses), SUM(reading_time_mins), TOTAL(LENGTH(followers))
+FROM {table}
+"""
+
+
+def fingerprint(*parts) -> str:
+    """Stable hash of JSON-serialisable `parts` (configs, other fingerprints, ...)"""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def db_fingerprint() -> str:
+    """Fingerprint of the stored articles: row count, max id and value-column
+    checksums of each partition, read table by table rather than through the view"""
+    conn = get_connection()
+    try:
+        return fingerprint(*(conn.execute(DB_FINGERPRINT_QUERY.format(table=table)).fetchone()
+                             for table in article_partitions(conn)))
+    finally:
+        conn.close()
+
+
+def _files(path: str):
+    if os.path.isdir(path):
+        return [os.path.join(root, f) for root, _, files in sorted(os.walk(path)) for f in sorted(files)]
+    return [path] if os.path.exists(path) else []
+
+
+def file_fingerprint(path: str) -> str:
+    """Content hash of a file, or of every file under a directory (e.g. Parquet parts)"""
+    digest = hashlib.sha256()
+    for name in _files(path):
+        digest.update(os.path.relpath(name, path).encode())
+        with open(name, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def code_fingerprint(*modules: str) -> str:
+    """Hash of the source of `modules`, so editing a stage's code invalidates its cache"""
+    return fingerprint(*(file_fingerprint(sys.modules[m].__file__) for m in modules))
+
+
+def output_signature(path: str):
+    """Cheap identity of a stage's output (file sizes and mtimes); None if it is missing"""
+    files = _files(path)
+    if not files:
+        return None
+    return fingerprint(*((os.path.relpath(f, path), os.path.getsize(f), os.stat(f).st_mtime_ns) for f in files))
+
+
+def cached_output(stage: str, key: str):
+    """Output path of the last successful `stage` run with fingerprint `key`, if
+    that output is still on disk unchanged; None otherwise"""
+    conn = get_connection()
+    try:
+        row = conn.execute(
+            "SELECT fingerprint, output_path, output_signature FROM stage_cache WHERE stage = ?", (stage,)
+        ).fetchone()
+    finally:
+        conn.close()
+    if row is None or row[0] != key or output_signature(row[1]) != row[2]:
+        return None
+    return row[1]
+
+
+def save_output(stage: str, key: str, output_path: str):
+    """Record `output_path` as the result of `stage` for fingerprint `key`"""
+    conn = get_connection()
+    try:
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO stage_cache (stage, fingerprint, output_path, output_signature, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (stage, key, output_path, output_signature(output_path), datetime.now().isoformat(timespec='seconds'))
+            )
+    finally:
+        conn.close()
+
+
+def run_cached(logger, stage: str, key: str, run, force: bool = False):
+    """Output of `run()`, or of the last successful `stage` run if its inputs had
+    the same fingerprint `key`. A falsy output counts as failure and is not cached."""
+    output = None if force else cached_output(stage, key)
+    if output:
+        logger.info(f"Skipping {stage}: inputs unchanged since its last run, reusing {output}")
+        return output
+    output = run()
+    if output:
+        save_output(stage, key, output)
+    return output
@@ -0,0 +1,207 @@
+import os
+import json
+import time
+import cProfile
+import resource
+import threading
+import functools
+from contextlib import contextmanager
+from datetime import datetime
+from prefect import get_run_logger
+from config import PATHS, TELEMETRY_CONFIG
+
+# Counters a stage can report with record()/add(), stored as stage_metrics columns
+METRIC_COLUMNS = ['label', 'rows_in', 'rows_out', 'bytes_written',
+                  'http_requests', 'http_bytes', 'http_retries', 'http_errors']
+
+_run = {'id': None, 'profile': False, 'status': None}
+_local = threading.local()
+_active = 0
+_active_lock = threading.Lock()
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss never goes down, so prefer the resettable high-water mark in /proc
+    try:
+        with open('/proc/self/status') as f:
+            return next(int(l.split()[1]) for l in f if l.startswith('VmHWM:')) / 1024
+    except (OSError, StopIteration):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _reset_peak_rss():
+    # Writing 5 to clear_refs resets VmHWM to the current RSS (Linux only)
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+class StageMetrics:
+    """Counters of one stage execution; safe to update from worker threads"""
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def set(self, **values):
+        with self.lock:
+            self.values.update(values)
+
+    def add(self, **counts):
+        with self.lock:
+            for name, n in counts.items():
+                self.values[name] = self.values.get(name, 0) + n
+
+
+def current_stage():
+    """Metrics of the stage running in this thread, or None; hand it to worker
+    threads that should count towards the stage"""
+    return getattr(_local, 'stage', None)
+
+
+def record(**values):
+    """Set metrics (rows_in=..., bytes_written=...) of the stage running in this thread"""
+    stage = current_stage()
+    if stage is not None:
+        stage.set(**values)
+
+
+def start_run(options: dict, profile: bool = None) -> int:
+    """Open a pipeline_runs row; stages finished until finish_run are recorded under it"""
+    from pipeline.data_storage import get_connection
+    conn = get_connection()
+    try:
+        with conn:
+            run_id = conn.execute(
+                "INSERT INTO pipeline_runs (started_at, status, options) VALUES (?, 'running', ?)",
+                (datetime.now().isoformat(timespec='seconds'), json.dumps(options, default=str))
+            ).lastrowid
+    finally:
+        conn.close()
+    _run.update(id=run_id, profile=TELEMETRY_CONFIG['profile'] if profile is None else profile, status=None)
+    return run_id
+
+
+def mark_run(status: str):
+    """Have the open run finish as `status` ('skipped', 'failed') rather than
+    'completed'; the first status marked stands"""
+    if _run['status'] is None:
+        _run['status'] = status
+
+
+def finish_run(status: str):
+    from pipeline.data_storage import get_connection
+    run_id, _run['id'] = _run['id'], None
+    if run_id is None:
+        return
+    conn = get_connection()
+    try:
+        with conn:
+            conn.execute(
+                "UPDATE pipeline_runs SET finished_at = ?, status = ? WHERE id = ?",
+                (datetime.now().isoformat(timespec='seconds'), status, run_id)
+            )
+    finally:
+        conn.close()
+
+
+@contextmanager
+def pipeline_run(options: dict, profile: bool = None):
+    """start_run/finish_run around a flow body; the run is 'failed' if it raises,
+    else 'completed' unless the body marked it otherwise with mark_run"""
+    run_id = start_run(options, profile)
+    status = 'failed'
+    try:
+        yield run_id
+        status = _run['status'] or 'completed'
+    finally:
+        finish_run(status)
+
+
+def _start_profiler():
+    if not _run['profile']:
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another stage in a concurrent thread is already being profiled
+        return None
+    return profiler
+
+
+def _save(metrics: StageMetrics, started: datetime, seconds: float, peak_rss: float, status: str, profiler):
+    run_id = _run['id']
+    profile_path = None
+    if profiler is not None:
+        profile_path = os.path.join(PATHS['profiles'], f"run{run_id}",
+                                    f"{metrics.stage}-{started:%Y%m%dT%H%M%S%f}.prof")
+        os.makedirs(os.path.dirname(profile_path), exist_ok=True)
+        profiler.dump_stats(profile_path)
+
+    values = {name: metrics.values.get(name) for name in METRIC_COLUMNS}
+    rows = values['rows_in'] or values['rows_out']
+    columns = {
+        'run_id': run_id, 'stage': metrics.stage, 'started_at': started.isoformat(timespec='seconds'),
+        'seconds': seconds, 'rows_per_second': rows / seconds if rows and seconds > 0 else None,
+        'peak_rss_mb': peak_rss, 'status': status, 'profile_path': profile_path, **values
+    }
+    from pipeline.data_storage import get_connection
+    conn = get_connection()
+    try:
+        with conn:
+            conn.execute(
+                f"INSERT INTO stage_metrics ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                list(columns.values())
+            )
+    finally:
+        conn.close()
+
+
+def tracked_stage(stage: str):
+    """Decorator recording each call's wall time, peak RSS and reported counters
+    to stage_metrics under the active pipeline run (nothing is stored outside one).
+
+    Peak RSS is the process's high-water mark while the stage ran; it is only
+    reset when no other stage is running, so concurrent stages share theirs.
+    A call returning None counts as failed, matching how the tasks report errors.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            global _active
+            if _run['id'] is None:
+                return fn(*args, **kwargs)
+
+            metrics = StageMetrics(stage)
+            previous, _local.stage = current_stage(), metrics
+            with _active_lock:
+                if _active == 0:
+                    _reset_peak_rss()
+                _active += 1
+            profiler = _start_profiler()
+            started = datetime.now()
+            start = time.perf_counter()
+            status = 'failed'
+            try:
+                result = fn(*args, **kwargs)
+                if result is not None:
+                    status = 'ok'
+                return result
+            finally:
+                seconds = time.perf_counter() - start
+                if profiler is not None:
+                    profiler.disable()
+                with _active_lock:
+                    _active -= 1
+                _local.stage = previous
+                try:
+                    _save(metrics, started, seconds, peak_rss_mb(), status, profiler)
+                except Exception as e:
+                    # Telemetry never fails the stage itself
+                    get_run_logger().warning(f"Could not record metrics for stage {stage}: {e}")
+        return wrapper
+    return decorator
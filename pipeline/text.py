@@ -0,0 +1,5 @@
+import string
+
+def preprocess(text):
+    text = text.lower()
+    return text.translate(str.maketrans('', '', string.punctuation))
@@ -1,45 +1,178 @@
 from prefect import flow, get_run_logger
-from pipeline.data_ingestion import scrape_medium_articles
+from prefect.futures import as_completed
+from pipeline.data_ingestion import scrape_medium_articles, reparse_cached_pages
 from pipeline.data_storage import create_database_tables, store_raw_data_to_db, load_data_from_db
-from pipeline.data_transformation import clean_and_transform_data
-from pipeline.model_training import train_model
-from config import SCRAPING_CONFIG
-import time
+from pipeline.data_transformation import clean_and_transform_data, transform_new_articles
+from pipeline.model_training import train_model, train_model_incremental, tune_model
+from pipeline.model_files import model_file, served_engine, set_served_engine
+from pipeline.batch_scoring import score_articles, model_version
+from pipeline.telemetry import pipeline_run, mark_run
+from pipeline.stage_cache import fingerprint, db_fingerprint, file_fingerprint, code_fingerprint, run_cached
+from config import (SCRAPING_CONFIG, MODEL_CONFIG, TUNING_CONFIG, TRANSFORM_CONFIG, SCORING_CONFIG, DEDUP_CONFIG,
+                    SIMILARITY_CONFIG)
 import argparse
+from typing import Optional
 
-@flow(name="Medium Author Success Prediction Pipeline")
-def medium_success_pipeline(run_scraping: bool = False):
+try:
+    from prefect.task_runners import ThreadPoolTaskRunner  # Prefect 3
+
+    def ingest_task_runner():
+        return ThreadPoolTaskRunner(max_workers=SCRAPING_CONFIG['ingest_workers'])
+except ImportError:
+    from prefect.task_runners import ConcurrentTaskRunner  # Prefect 2
+
+    def ingest_task_runner():
+        # No worker cap in Prefect 2; outbound load is still bounded by
+        # SCRAPING_CONFIG['max_concurrent_requests'] in pipeline.fetcher
+        return ConcurrentTaskRunner()
+
+@flow(name="Medium Author Success Prediction Pipeline", task_runner=ingest_task_runner())
+def medium_success_pipeline(run_scraping: bool = False, refetch_recent: bool = False, reparse: bool = False,
+                            incremental: bool = False, engine: Optional[str] = None, tune: bool = False,
+                            score_only: bool = False, profile: bool = False, force: bool = False):
     logger = get_run_logger()
     logger.info("🚀 Starting Medium Author Success Pipeline")
-    
+
     # Step 1: Setup database
     create_database_tables()
-    
-    if run_scraping:
-        # Step 2: Data ingestion (optional)
-        logger.info("Running data scraping...")
-        for tag in SCRAPING_CONFIG['tags']:
-            for year in SCRAPING_CONFIG['years']:
-                csv_path = scrape_medium_articles(tag, year)
-                store_raw_data_to_db(csv_path, tag)
-                time.sleep(5)  # Be gentle with Medium's servers
-    
-    # Step 3: Data transformation
-    df = load_data_from_db()
-    if df.empty:
-        logger.error("No data loaded from database!")
-        return
-    
-    processed_path = clean_and_transform_data(df)
-    
-    # Step 4: Model training
-    model_path = train_model(processed_path)
-    
-    logger.info("✅ Pipeline execution completed successfully")
+
+    # Every tracked stage below records its metrics under this run
+    options = {'run_scraping': run_scraping, 'refetch_recent': refetch_recent, 'reparse': reparse,
+               'incremental': incremental, 'engine': engine, 'tune': tune, 'score_only': score_only,
+               'force': force}
+    with pipeline_run(options, profile=profile):
+        jobs = [(tag, year) for tag in SCRAPING_CONFIG['tags'] for year in SCRAPING_CONFIG['years']]
+
+        if reparse:
+            # Step 2: Rebuild raw data from cached pages (no network); each job
+            # already parses across every core, so jobs run one after another
+            logger.info("Reparsing cached archive pages...")
+            parsing = reparse_cached_pages.submit(*jobs[0]) if jobs else None
+            for i, (tag, year) in enumerate(jobs):
+                csv_path, days = parsing.result()
+                parsing = reparse_cached_pages.submit(*jobs[i + 1]) if i + 1 < len(jobs) else None
+                # The flow stores each job while the next one parses, as the
+                # database's only writer; only the reparsed days are replaced
+                store_raw_data_to_db(csv_path, tag, replace_days=days)
+        elif run_scraping:
+            # Step 2: Data ingestion (optional)
+            logger.info("Running data scraping...")
+            futures = scrape_medium_articles.map(
+                [tag for tag, _ in jobs],
+                [year for _, year in jobs],
+                refetch_recent=refetch_recent
+            )
+
+            # The flow is the database's only writer: it stores each scrape as
+            # it finishes, into its tag/year partition with the checkpoints of
+            # the days it fetched, while the remaining jobs keep scraping
+            job_of = {future.task_run_id: job for job, future in zip(jobs, futures)}
+            for future in as_completed(list(futures)):
+                tag, year = job_of[future.task_run_id]
+                scraped = future.result(raise_on_failure=False)
+                if isinstance(scraped, Exception):
+                    logger.error(f"Scraping failed for tag: {tag}, year: {year}: {scraped}")
+                    continue
+                csv_path, checkpoints = scraped
+                store_raw_data_to_db(csv_path, tag, checkpoints=checkpoints)
+
+        # A stage whose inputs match its last successful run is skipped and its
+        # previous output reused, unless --force
+        articles_key = db_fingerprint()
+
+        def score(model_path, engine):
+            key = fingerprint(articles_key, model_version(model_path), SCORING_CONFIG)
+            # The saved model stands in for the output; scores live in the predictions table
+            if run_cached(logger, 'score', key, lambda: score_articles(model_path) is not None and model_path, force):
+                # The dashboard serves the model whose predictions are stored
+                set_served_engine(engine)
+            else:
+                mark_run('failed')
+
+        if score_only:
+            # Score new articles with the saved model, without retraining it
+            engine = engine or served_engine()
+            score(model_file(engine), engine)
+            logger.info("✅ Pipeline execution completed successfully")
+            return
+
+        # Step 3: Data transformation
+        def transform():
+            if incremental:
+                # Only articles added since the last run, in bounded chunks
+                return transform_new_articles()
+            df = load_data_from_db()
+            if df.empty:
+                logger.error("No data loaded from database!")
+                mark_run('skipped')
+                return None
+            return clean_and_transform_data(df)
+
+        # Full and incremental transforms write the dataset differently, so a
+        # switch between them re-runs the stage
+        transform_key = fingerprint(articles_key, incremental, TRANSFORM_CONFIG, DEDUP_CONFIG, code_fingerprint(
+            'pipeline.data_transformation', 'pipeline.counts', 'pipeline.processed_data', 'pipeline.dedup'))
+        processed_path = run_cached(logger, 'transform', transform_key, transform, force)
+        if not processed_path:
+            # A run with nothing to transform is already marked skipped
+            mark_run('failed')
+            return
+
+        # Step 4: Model training
+        kind = 'tuned' if tune else engine or MODEL_CONFIG['engine']
+        if kind == 'tuned':
+            # Cross-validated search; writes the best pipeline next to the default model
+            train = tune_model
+        elif kind == 'sgd':
+            # Update the saved hashed model with new articles only
+            train = train_model_incremental
+        else:
+            train = train_model
+        train_key = fingerprint(kind, file_fingerprint(processed_path), MODEL_CONFIG,
+                                TUNING_CONFIG if tune else None, SIMILARITY_CONFIG, code_fingerprint(
+                                    'pipeline.model_training', 'pipeline.feature_store',
+                                    'pipeline.text', 'pipeline.compact_scorer', 'pipeline.rollups',
+                                    'pipeline.similarity'))
+        model_path = run_cached(logger, f"train_{kind}", train_key, lambda: train(processed_path), force)
+
+        # Step 5: Store scores for every article the model hasn't scored yet
+        if model_path:
+            # train_model returns the rollup model when it trained one
+            score(model_path, 'rollup' if model_path == model_file('rollup') else kind)
+        else:
+            mark_run('failed')
+
+        logger.info("✅ Pipeline execution completed successfully")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('--run-scraping', action='store_true', help='Run data scraping')
+    parser.add_argument('--refetch-recent', action='store_true',
+                        help='Re-fetch scraped days whose clap counts may still be moving')
+    parser.add_argument('--reparse', action='store_true',
+                        help='Rebuild raw data from cached archive pages instead of scraping')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Transform only articles added since the last run, in chunks')
+    parser.add_argument('--engine', choices=['tfidf', 'sgd'], default=None,
+                        help="Training engine (default: MODEL_CONFIG['engine'])")
+    parser.add_argument('--tune', action='store_true',
+                        help='Cross-validated hyperparameter search instead of a single fit')
+    parser.add_argument('--score-only', action='store_true',
+                        help='Skip transformation and training; score unscored articles with the saved model')
+    parser.add_argument('--force', action='store_true',
+                        help='Re-run every stage even if its inputs are unchanged since the last run')
+    parser.add_argument('--profile', action='store_true',
+                        help="Write a cProfile dump per stage to PATHS['profiles']")
     args = parser.parse_args()
-    
-    medium_success_pipeline(run_scraping=args.run_scraping)
+
+    medium_success_pipeline(
+        run_scraping=args.run_scraping,
+        refetch_recent=args.refetch_recent,
+        reparse=args.reparse,
+        incremental=args.incremental,
+        engine=args.engine,
+        tune=args.tune,
+        score_only=args.score_only,
+        profile=args.profile,
+        force=args.force
+    )
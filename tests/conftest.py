@@ -0,0 +1,17 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+project_root = Path(__file__).parent.parent
+sys.path.append(str(project_root))
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run in an empty directory, so data/ and models/ (relative paths in
+    config.py) are throwaway, with Prefect's run logger disabled for `.fn` calls"""
+    from prefect.logging import disable_run_logger
+    monkeypatch.chdir(tmp_path)
+    with disable_run_logger():
+        yield tmp_path
@@ -0,0 +1,37 @@
+"""The compact .npz artifact scores titles as the sklearn pipeline it was exported from."""
+import numpy as np
+import pytest
+
+from pipeline.compact_scorer import CompactScorer, export_compact, max_deviation
+from pipeline.model_training import make_tfidf_pipeline
+
+WORDS = ['data', 'python', 'startup', 'design', 'career', 'money', 'learning', 'life', 'ai', 'writing',
+         'café', 'naïve', 'über', 'señor', 'straße', 'данные', 'программирование', '机器学习', 'データ',
+         'résumé', 'CO₂', 'emoji🚀', "don't", '2025']
+
+
+def titles(n, seed):
+    rng = np.random.default_rng(seed)
+    return [' '.join(rng.choice(WORDS, rng.integers(2, 8))) + rng.choice(['', '!', '?', ' — notes'])
+            for _ in range(n)]
+
+
+@pytest.mark.parametrize('params', [
+    {},
+    {'tfidf__ngram_range': (1, 2)},
+    {'tfidf__sublinear_tf': True},
+    {'tfidf__min_df': 2},
+    {'tfidf__ngram_range': (1, 2), 'tfidf__sublinear_tf': True, 'tfidf__min_df': 2, 'clf__C': 10.0},
+])
+@pytest.mark.parametrize('prune', [True, False])
+def test_compact_artifact_matches_the_pipeline(tmp_path, params, prune):
+    train = titles(600, seed=0)
+    y = np.array([('data' in t) ^ ('café' in t) for t in train], dtype=int)
+    pipeline = make_tfidf_pipeline().set_params(**params).fit(train, y)
+    path = str(tmp_path / 'model.npz')
+    export_compact(pipeline, path, prune=prune)
+
+    # Unseen combinations, words outside the vocabulary and an empty title
+    check = titles(300, seed=1) + ['', 'Ünïcödé only', 'ДАННЫЕ и python', '🚀🚀🚀']
+    assert max_deviation(pipeline, path, check) < 1e-6
+    assert CompactScorer(path).predict(check).tolist() == pipeline.predict(check).tolist()
@@ -0,0 +1,58 @@
+"""parse_counts against a scalar statement of its rules, on randomized edge-case inputs."""
+import math
+import random
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.bench_counts import legacy_frontend, legacy_storage, legacy_transform
+from pipeline.counts import NUMBER_PATTERN, SUFFIX_MULTIPLIERS, parse_counts
+
+
+def reference_count(value):
+    """Scalar statement of what parse_counts should return for one value."""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return 0
+    text = str(value).replace(',', '').strip().upper()
+    for candidate, multiplier in ((text, 1), (text[:-1], SUFFIX_MULTIPLIERS.get(text[-1:]))):
+        if multiplier is None or not re.fullmatch(NUMBER_PATTERN, candidate):
+            continue
+        number = float(candidate) * multiplier
+        return int(np.rint(number)) if math.isfinite(number) else 0
+    return 0
+
+
+def random_edge_value(rng: random.Random):
+    n = rng.choice([0, 7, 57, 999, 1000, 3400, 12500, 2_000_000, rng.randint(0, 10 ** 7)])
+    return rng.choice([
+        n, float(n), str(n), f"{n:,}", f" {n} ",
+        f"{n / 1000:.1f}K", f"{n / 1000:.2f}k", f"{n / 1e6:.1f}M", f".{rng.randint(1, 9)}K",
+        '', ' ', None, float('nan'), 'N/A', 'K', '1.2.3K', 'inf', '-', f"{n}KM", '1e3', f"-{n}",
+    ])
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_parse_counts_matches_the_reference_on_random_values(seed):
+    rng = random.Random(seed)
+    values = [random_edge_value(rng) for _ in range(20_000)]
+
+    got = parse_counts(pd.Series(values, dtype=object)).tolist()
+    assert [(v, g) for v, g in zip(values, got) if reference_count(v) != g] == []
+
+    # Same answer for numeric input
+    numeric = pd.Series([v for v in values if isinstance(v, (int, float))], dtype='float64')
+    assert [(v, g) for v, g in zip(numeric, parse_counts(numeric)) if reference_count(v) != g] == []
+
+
+@pytest.mark.parametrize('legacy', [legacy_storage, legacy_transform, legacy_frontend])
+def test_plain_integers_parse_as_every_legacy_converter_did(legacy):
+    rng = random.Random(0)
+    plain = [str(rng.randint(0, 10 ** 6)) for _ in range(1000)]
+    assert parse_counts(plain).tolist() == [legacy(v) for v in plain]
+
+
+@pytest.mark.parametrize('values', [[], [None, None], ['', None]])
+def test_columns_without_a_single_count_parse_to_zeros(values):
+    assert parse_counts(pd.Series(values, dtype=object)).tolist() == [0] * len(values)
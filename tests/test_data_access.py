@@ -0,0 +1,28 @@
+"""Dashboard histogram and box-plot queries against pandas on the same partitioned rows."""
+import math
+import threading
+
+import numpy as np
+import pandas as pd
+
+import frontend.data_access as data_access
+from benchmarks.synthetic import synthetic_raw
+from pipeline.data_storage import create_database_tables, store_raw_data_to_db
+
+
+def test_buckets_and_quantiles_match_pandas_across_partitions(workdir, monkeypatch):
+    create_database_tables.fn()
+    for tag, seed in (('ai', 0), ('business', 1)):
+        synthetic_raw(2000, seed=seed).to_csv('raw.csv', index=False)
+        store_raw_data_to_db.fn('raw.csv', tag)
+    monkeypatch.setattr(data_access, 'DB_PATH', workdir / 'data' / 'medium_articles.db')
+    monkeypatch.setattr(data_access, '_local', threading.local())
+    claps = pd.read_sql("SELECT claps FROM articles", data_access.get_connection())['claps'].dropna()
+
+    bins = [0, 100, 500, 1000, 5000, float('inf')]
+    assert data_access.bucket_counts('claps', bins, list(range(5))) == np.histogram(claps, bins)[0].tolist()
+
+    values = np.sort(claps.to_numpy())
+    stats = data_access.log_box_stats('claps')
+    for key, q in (('q1', 0.25), ('med', 0.5), ('q3', 0.75)):
+        assert stats[key] == math.log1p(values[round(q * (len(values) - 1))])
@@ -0,0 +1,225 @@
+"""Storing raw CSVs: upserts, checkpoints and replaced days, on a throwaway database."""
+import os
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import synthetic_raw
+from config import DB_CONFIG
+from pipeline.batch_scoring import iter_unscored
+from pipeline.data_storage import (create_database_tables, get_connection, get_scrape_checkpoints, get_watermark,
+                                   iter_articles_after, load_articles, load_data_from_db, store_raw_data_to_db)
+from pipeline.data_transformation import transform_new_articles
+from pipeline.processed_data import read_processed
+from pipeline.rollups import rebuild_rollups
+
+
+@pytest.fixture
+def db(workdir):
+    create_database_tables.fn()
+    return workdir
+
+
+def write_csv(path, df):
+    df.to_csv(path, index=False)
+    return str(path)
+
+
+def test_checkpoints_are_recorded_with_the_stored_rows(db):
+    raw = synthetic_raw(200, seed=1)
+    checkpoints = [('2021-03-01', '2021-03-02T10:00:00', 20), ('2021-03-02', '2021-03-02T10:00:01', 0)]
+
+    result = store_raw_data_to_db.fn(write_csv(db / 'raw.csv', raw), 'ai', checkpoints=checkpoints)
+
+    assert result['inserted'] == len(raw)
+    assert set(get_scrape_checkpoints('ai', 2021)) == {'2021-03-01', '2021-03-02'}
+    assert get_scrape_checkpoints('business', 2021) == {}
+
+
+def rollup_tables(conn):
+    return {table: pd.read_sql(f"SELECT * FROM {table}", conn).sort_values(key).reset_index(drop=True)
+            for table, key in (('author_stats', 'author_name'), ('tag_day_stats', 'day'))}
+
+
+def test_replacing_days_keeps_the_rows_of_other_days(db):
+    raw = synthetic_raw(300, seed=2)
+    store_raw_data_to_db.fn(write_csv(db / 'raw.csv', raw), 'ai')
+    conn = get_connection()
+    before = pd.read_sql("SELECT id, date, title, author_name FROM articles", conn)
+
+    # Two days are reparsed: one lost a story, the other is unchanged
+    days = raw['date'].value_counts().index[:2]
+    first, second = (pd.to_datetime(d).date().isoformat() for d in days)
+    dropped = raw[raw['date'] == days[0]].iloc[0]
+    reparsed = raw[raw['date'].isin(days)].drop(index=dropped.name)
+    result = store_raw_data_to_db.fn(write_csv(db / 'reparsed.csv', reparsed), 'ai', replace_days=[first, second])
+
+    assert result['deleted'] == 1
+    after = pd.read_sql("SELECT id, date, title, author_name FROM articles", conn)
+    expected = before[~((before['title'] == dropped['title']) & (before['date'] == first))]
+    pd.testing.assert_frame_equal(after.sort_values('id').reset_index(drop=True),
+                                  expected.sort_values('id').reset_index(drop=True))
+
+    stored = rollup_tables(conn)
+    with conn:
+        rebuild_rollups(conn)
+    for table, rebuilt in rollup_tables(conn).items():
+        pd.testing.assert_frame_equal(stored[table], rebuilt, check_dtype=False)
+    conn.close()
+
+
+def test_a_reparse_that_deletes_rows_rebuilds_the_processed_dataset(db):
+    raw = synthetic_raw(300, seed=6)
+    store_raw_data_to_db.fn(write_csv(db / 'raw.csv', raw), 'ai')
+    path = transform_new_articles.fn()
+    before = read_processed(path, columns=['id', 'title'])
+
+    conn = get_connection()
+    stored = pd.read_sql("SELECT id, date, title FROM articles", conn)
+    conn.close()
+    dropped = stored[stored['id'].isin(before['id'])].iloc[0]
+    reparsed = raw[(raw['date'].map(lambda d: pd.to_datetime(d).date().isoformat()) == dropped['date'])
+                   & (raw['title'] != dropped['title'])]
+    store_raw_data_to_db.fn(write_csv(db / 'reparsed.csv', reparsed), 'ai', replace_days=[dropped['date']])
+    assert get_watermark('transform') == (0, 0)
+
+    after = read_processed(transform_new_articles.fn(), columns=['id', 'title'])
+    pd.testing.assert_frame_equal(after, before[before['id'] != dropped['id']].reset_index(drop=True))
+
+
+def test_a_refetch_that_updates_claps_rebuilds_the_processed_dataset(db):
+    raw = synthetic_raw(200, seed=8)
+    store_raw_data_to_db.fn(write_csv(db / 'raw.csv', raw), 'ai')
+    before = read_processed(transform_new_articles.fn(), columns=['id', 'claps'])
+
+    refetched = raw.assign(claps=99999)
+    checkpoints = [('2021-03-01', '2021-03-02T10:00:00', len(refetched))]
+    result = store_raw_data_to_db.fn(write_csv(db / 'refetched.csv', refetched), 'ai', checkpoints=checkpoints)
+    assert result['updated'] == len(raw)
+
+    after = read_processed(transform_new_articles.fn(), columns=['id', 'claps'])
+    assert after['id'].tolist() == before['id'].tolist()
+    assert (after['claps'] == 99999).all()
+
+
+def test_deleting_an_article_deletes_its_predictions(db):
+    raw = synthetic_raw(200, seed=7)
+    store_raw_data_to_db.fn(write_csv(db / 'raw.csv', raw), 'ai')
+    conn = get_connection()
+    with conn:
+        conn.execute("INSERT INTO predictions (article_id, prediction, probability, model_version) "
+                     "SELECT id, 0, 0.5, 'v1' FROM articles")
+    dropped = conn.execute("SELECT MIN(id), date, title FROM articles GROUP BY date HAVING COUNT(*) > 1 LIMIT 1").fetchone()
+    reparsed = raw[(raw['date'].map(lambda d: pd.to_datetime(d).date().isoformat()) == dropped[1])
+                   & (raw['title'] != dropped[2])]
+    store_raw_data_to_db.fn(write_csv(db / 'reparsed.csv', reparsed), 'ai', replace_days=[dropped[1]])
+
+    assert conn.execute("SELECT COUNT(*) FROM predictions WHERE article_id = ?", (dropped[0],)).fetchone() == (0,)
+    assert conn.execute("SELECT COUNT(*) FROM predictions").fetchone() == conn.execute("SELECT COUNT(*) FROM articles").fetchone()
+    conn.close()
+
+
+def test_loading_by_tag_and_date_range_reads_only_matching_partitions(db):
+    for tag, seed in (('ai', 3), ('data-science', 4), ('data_science', 5)):
+        store_raw_data_to_db.fn(write_csv(db / f'{tag}.csv', synthetic_raw(300, seed=seed)), tag)
+    conn = get_connection()
+    names = {tag: name for name, tag in conn.execute("SELECT name, tag FROM article_partitions WHERE year = 2021")}
+    # Both sanitise to data_science, so the second one gets a suffix
+    assert names['data-science'] != names['data_science']
+
+    everything = load_data_from_db.fn()
+    selected = load_articles(conn, 'data_science', '2021-03-01', '2022-02-28')
+    expected = everything[(everything['tag'] == 'data_science') & everything['date'].between('2021-03-01', '2022-02-28')]
+    assert len(selected) > 0
+    pd.testing.assert_frame_equal(selected, expected.reset_index(drop=True), check_dtype=False)
+    conn.close()
+
+
+def test_chunked_reads_cover_every_partition(db):
+    for tag, seed in (('ai', 3), ('data', 4)):
+        store_raw_data_to_db.fn(write_csv(db / f'{tag}.csv', synthetic_raw(300, seed=seed)), tag)
+    conn = get_connection()
+    # Leave gaps in the ids
+    day, = conn.execute("SELECT date FROM articles GROUP BY date HAVING COUNT(*) > 2 LIMIT 1").fetchone()
+    store_raw_data_to_db.fn(write_csv(db / 'reparsed.csv', synthetic_raw(0)), 'ai', replace_days=[day])
+    ids = pd.read_sql("SELECT id FROM articles ORDER BY id", conn)['id']
+    assert conn.execute("SELECT COUNT(*) FROM article_partitions").fetchone()[0] > 2
+
+    chunks = list(iter_articles_after(int(ids.iloc[10]), 7))
+    assert all(len(chunk) <= 7 for chunk in chunks)
+    assert pd.concat(chunks)['id'].tolist() == ids.iloc[11:].tolist()
+
+    with conn:
+        conn.execute("INSERT INTO predictions (article_id, prediction, probability, model_version) "
+                     "SELECT id, 0, 0.5, 'v1' FROM articles WHERE id % 3 = 0")
+    unscored = [i for chunk, _ in iter_unscored(conn, 'v1', 7) for i in chunk]
+    assert sorted(unscored) == ids[ids % 3 != 0].tolist()
+    conn.close()
+
+
+def test_predictions_lose_the_foreign_key_to_the_old_articles_table(workdir):
+    os.makedirs('data')
+    conn = sqlite3.connect(DB_CONFIG['db_path'])
+    conn.executescript("""
+    CREATE TABLE articles (id INTEGER PRIMARY KEY AUTOINCREMENT, date TEXT, title TEXT, claps INTEGER,
+                           responses INTEGER, author_name TEXT, followers TEXT, reading_time_mins INTEGER,
+                           tag TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+    CREATE TABLE predictions (id INTEGER PRIMARY KEY AUTOINCREMENT, article_id INTEGER, prediction INTEGER,
+                              probability REAL, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                              FOREIGN KEY (article_id) REFERENCES articles(id));
+    INSERT INTO articles (date, title, claps, author_name, tag) VALUES ('03/01/2021', 'A title', 10, 'Writer', 'ai');
+    INSERT INTO predictions (article_id, prediction, probability) VALUES (1, 0, 0.25);
+    """)
+    conn.close()
+
+    create_database_tables.fn()
+
+    conn = get_connection()
+    assert conn.execute("SELECT * FROM pragma_foreign_key_list('predictions')").fetchall() == []
+    assert conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE name LIKE '%_predictions_delete'").fetchone() == (1,)
+    assert conn.execute("SELECT article_id, probability FROM predictions").fetchall() == [(1, 0.25)]
+    assert conn.execute("SELECT id, title FROM articles").fetchall() == [(1, 'A title')]
+    conn.close()
+
+
+def test_rows_missing_a_key_part_are_not_inserted_again(db):
+    raw = synthetic_raw(50, seed=6)
+    raw.loc[:9, 'author_name'] = None
+    raw.loc[10:14, 'date'] = None
+    path = write_csv(db / 'raw.csv', raw)
+
+    assert store_raw_data_to_db.fn(path, 'ai')['inserted'] == len(raw)
+    assert store_raw_data_to_db.fn(path, 'ai') == {'inserted': 0, 'updated': 0, 'skipped': len(raw), 'deleted': 0}
+    conn = get_connection()
+    assert conn.execute("SELECT COUNT(*) FROM articles WHERE author_name = ''").fetchone()[0] == 10
+    conn.close()
+
+
+def test_stored_null_keys_are_coalesced_and_their_copies_dropped(db):
+    raw = synthetic_raw(50, seed=7)
+    store_raw_data_to_db.fn(write_csv(db / 'raw.csv', raw), 'ai')
+    conn = get_connection()
+    partition = conn.execute("SELECT name FROM article_partitions ORDER BY name LIMIT 1").fetchone()[0]
+    with conn:
+        # Three loads of a story without an author, as stored before '' keys
+        for claps in (10, 20, 30):
+            conn.execute(f"INSERT INTO {partition} (id, date, title, claps, author_name) "
+                         f"VALUES ((SELECT last_id FROM article_sequence) + {claps}, '2020-01-01', 'No author', ?, NULL)",
+                         (claps,))
+        conn.execute("UPDATE article_sequence SET last_id = last_id + 30")
+        rebuild_rollups(conn)
+    before = rollup_tables(conn)
+    conn.close()
+
+    create_database_tables.fn()
+
+    conn = get_connection()
+    assert conn.execute(f"SELECT author_name, claps FROM {partition} WHERE title = 'No author'").fetchall() == [('', 30)]
+    stored = rollup_tables(conn)
+    with conn:
+        rebuild_rollups(conn)
+    for table, rebuilt in rollup_tables(conn).items():
+        pd.testing.assert_frame_equal(stored[table], rebuilt, check_dtype=False)
+    assert len(stored['tag_day_stats']) == len(before['tag_day_stats'])
+    conn.close()
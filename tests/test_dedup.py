@@ -0,0 +1,68 @@
+"""Near-duplicate titles: exact confirmation, index lookups and part compaction."""
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import synthetic_titles
+from config import DEDUP_CONFIG
+from pipeline.dedup import SignatureIndex, band_keys, jaccard, minhash, near_duplicates, shingle_sets
+
+
+def titles_frame(titles, first_id=1):
+    return pd.DataFrame({'id': np.arange(first_id, first_id + len(titles)), 'title': titles,
+                         'claps': np.arange(len(titles), dtype=float) % 7})
+
+
+def test_dropped_titles_are_exactly_similar_to_the_one_kept():
+    titles = synthetic_titles(2000, seed=0, vocab_size=200)
+    # Copies with a word appended fall on either side of the threshold
+    titles += [f"{title[:-1]} extra!" for title in titles[:500]]
+    kept, _, shingles = near_duplicates(titles_frame(titles))
+
+    dropped = np.flatnonzero(kept != np.arange(len(titles)))
+    assert len(dropped)
+    assert (jaccard(shingles[dropped], shingles[kept[dropped]]) >= DEDUP_CONFIG['threshold']).all()
+
+
+def test_index_checks_every_stored_title_sharing_a_bucket(tmp_path):
+    # A small vocabulary puts many stored titles in the same buckets
+    stored = synthetic_titles(3000, seed=1, vocab_size=60)
+    new = synthetic_titles(400, seed=2, vocab_size=60) + stored[::50]
+    stored_shingles, new_shingles = shingle_sets(stored), shingle_sets(new)
+    stored_signatures, new_signatures = minhash(stored_shingles), minhash(new_shingles)
+    index = SignatureIndex(str(tmp_path))
+    index.save(np.arange(1, len(stored) + 1), stored_signatures, stored_shingles, len(stored))
+
+    words = np.diff(new_shingles.indptr) > 0
+    found = index.matches(new_signatures[words], new_shingles[words], band_keys(new_signatures[words]))
+
+    # Every pair sharing a bucket, checked one by one
+    new_keys, stored_keys = band_keys(new_signatures[words]), band_keys(stored_signatures)
+    exact = (new_shingles[words] @ stored_shingles.T).toarray()
+    sizes = np.diff(stored_shingles.indptr)
+    expected = []
+    for i, (keys, signature, size) in enumerate(zip(new_keys, new_signatures[words], np.diff(new_shingles[words].indptr))):
+        candidates = (stored_keys == keys).any(axis=1) & (sizes > 0)
+        estimate = (stored_signatures == signature).mean(axis=1)
+        similarity = exact[i] / (size + sizes - exact[i]).clip(min=1)
+        expected.append(bool((candidates & (estimate >= DEDUP_CONFIG['threshold'])
+                              & (similarity >= DEDUP_CONFIG['threshold'])).any()))
+    assert found.tolist() == expected
+    assert found[-len(stored[::50]):].all()
+
+
+def test_saved_parts_are_merged_as_they_accumulate(tmp_path):
+    titles = synthetic_titles(1600, seed=3)
+    index = SignatureIndex(str(tmp_path))
+    for start in range(0, len(titles), 100):
+        shingles = shingle_sets(titles[start:start + 100])
+        index.save(np.arange(start + 1, start + 101), minhash(shingles), shingles, start + 100)
+
+    parts = glob.glob(os.path.join(tmp_path, 'part-*.npz'))
+    assert len(parts) == len(index.parts) <= 5
+    reloaded = SignatureIndex(str(tmp_path), last_id=len(titles))
+    assert len(reloaded) == len(index) == sum(1 for t in titles if shingle_sets([t]).nnz)
+    assert sorted(np.concatenate([part[1] for part in reloaded.parts]).tolist()) == \
+        sorted(np.concatenate([part[1] for part in index.parts]).tolist())
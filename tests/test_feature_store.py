@@ -0,0 +1,84 @@
+"""Stored document-term counts: TF-IDF parity with sklearn, reuse and invalidation, and the size bound."""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from config import FEATURE_STORE_CONFIG, PATHS
+from pipeline.feature_store import document_counts, fit_tfidf, tfidf_from_counts
+from pipeline.text import preprocess
+
+WORDS = ['data', 'python', 'startup', 'design', 'career', 'money', 'learning', 'life', 'the', 'and',
+         'café', 'über', 'данные', 'AI', 'writing', 'remote', 'work', '2025']
+
+
+def articles(n, seed=0, start=1):
+    rng = np.random.default_rng(seed)
+    titles = [' '.join(rng.choice(WORDS, rng.integers(1, 7))) for _ in range(n)]
+    return pd.Series(np.arange(start, start + n)), pd.Series(titles)
+
+
+def vectorizer(**params):
+    return TfidfVectorizer(preprocessor=preprocess, stop_words='english', token_pattern=r'\b\w+\b', **params)
+
+
+def entries():
+    return sorted(os.listdir(PATHS['feature_store']))
+
+
+@pytest.mark.parametrize('params', [
+    {},
+    {'ngram_range': (1, 2), 'min_df': 2, 'sublinear_tf': True},
+    {'max_df': 0.3, 'smooth_idf': False},
+    {'binary': True, 'norm': 'l1'},
+])
+def test_stored_counts_reproduce_fit_transform(workdir, params):
+    ids, titles = articles(500)
+    # The second call extends the entry stored by the first with new rows
+    document_counts(vectorizer(**params), ids[:300], titles[:300])
+    counts, terms, reused = document_counts(vectorizer(**params), ids, titles)
+    assert reused == 300
+
+    fitted, columns = fit_tfidf(vectorizer(**params), counts, terms)
+    reference = vectorizer(**params)
+    expected = reference.fit_transform(titles)
+    assert fitted.vocabulary_ == reference.vocabulary_
+    assert abs(tfidf_from_counts(fitted, counts, columns) - expected).max() < 1e-12
+    unseen = articles(50, seed=1)[1]
+    assert abs(fitted.transform(unseen) - reference.transform(unseen)).max() < 1e-12
+
+
+def test_other_count_settings_or_changed_rows_are_not_reused(workdir):
+    ids, titles = articles(200)
+    document_counts(vectorizer(), ids, titles)
+    assert document_counts(vectorizer(), ids, titles)[2] == 200
+    # min_df only applies after counting, so it shares the counts
+    assert document_counts(vectorizer(min_df=3), ids, titles)[2] == 200
+
+    assert document_counts(vectorizer(ngram_range=(1, 2)), ids, titles)[2] == 0
+    assert len(entries()) == 2
+    edited = titles.copy()
+    edited[0] = 'a different first title'
+    assert document_counts(vectorizer(), ids, edited)[2] == 0
+
+
+def entry_for(start):
+    """Store entry holding the rows of `articles(300, start=start)`"""
+    ids, titles = articles(300, start=start)
+    before = set(entries()) if os.path.isdir(PATHS['feature_store']) else set()
+    document_counts(vectorizer(), ids, titles)
+    return (set(entries()) - before).pop()
+
+
+def test_least_recently_used_entries_are_evicted_beyond_the_size_bound(workdir, monkeypatch):
+    first, second = entry_for(1), entry_for(1001)
+    entry_bytes = sum(os.path.getsize(os.path.join(PATHS['feature_store'], first, f))
+                      for f in os.listdir(os.path.join(PATHS['feature_store'], first)))
+    monkeypatch.setitem(FEATURE_STORE_CONFIG, 'max_bytes', int(entry_bytes * 2.5))
+    # The first entry was used more recently than the second
+    os.utime(os.path.join(PATHS['feature_store'], second, 'meta.json'), (1, 1))
+
+    third = entry_for(2001)
+    assert entries() == sorted([first, third])
@@ -0,0 +1,162 @@
+"""pipeline.fetcher and the concurrent scraper against a local stub HTTP server
+serving the fixture archive pages in benchmarks/fixtures."""
+import csv
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from conftest import project_root
+from config import SCRAPING_CONFIG
+from pipeline import fetcher
+from pipeline.telemetry import StageMetrics
+
+FIXTURES = sorted((project_root / 'benchmarks' / 'fixtures').glob('*.html'))
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.hits.append((self.path, time.monotonic()))
+            status = server.failures.get(self.path, [200]).pop(0) if server.failures.get(self.path) else 200
+        body = server.page(self.path).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def fixture_page(path: str) -> str:
+    """The same fixture page for a path on every request"""
+    return FIXTURES[sum(map(ord, path)) % len(FIXTURES)].read_text(encoding='utf-8')
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.lock, server.hits, server.failures, server.page = threading.Lock(), [], {}, fixture_page
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def limits(monkeypatch):
+    monkeypatch.setattr(fetcher, '_buckets', {})
+    monkeypatch.setitem(SCRAPING_CONFIG, 'backoff_factor', 0)
+    monkeypatch.setitem(SCRAPING_CONFIG, 'max_retries', 3)
+
+
+def url(server, path):
+    return f"http://127.0.0.1:{server.server_port}{path}"
+
+
+def test_retries_wait_for_the_rate_limit(stub_server, monkeypatch):
+    monkeypatch.setitem(SCRAPING_CONFIG, 'requests_per_second', 10.0)
+    monkeypatch.setitem(SCRAPING_CONFIG, 'burst', 1)
+    stub_server.failures['/page'] = [503, 429, 500]
+    stats = StageMetrics('scrape')
+
+    start = time.monotonic()
+    _, text, error = fetcher.fetch_page(url(stub_server, '/page'), stats)
+
+    assert error is None and text == fixture_page('/page')
+    times = [t for _, t in stub_server.hits]
+    assert len(times) == 4
+    # One token per attempt: the three retries wait for three refills rather than
+    # going out in a burst (measured from the start, as arrival times jitter)
+    assert times[-1] - start >= 0.29
+    assert stats.values == {'http_requests': 4, 'http_retries': 3, 'http_bytes': 4 * len(text.encode('utf-8'))}
+
+
+def test_gives_up_after_max_retries(stub_server, monkeypatch):
+    monkeypatch.setitem(SCRAPING_CONFIG, 'requests_per_second', 1000.0)
+    stub_server.failures['/down'] = [503] * 10
+    stats = StageMetrics('scrape')
+
+    _, text, error = fetcher.fetch_page(url(stub_server, '/down'), stats)
+
+    assert text is None and error is not None
+    assert len(stub_server.hits) == 1 + SCRAPING_CONFIG['max_retries']
+    assert stats.values['http_errors'] == 1
+
+
+def test_concurrent_fetches_share_the_host_rate_limit(stub_server, monkeypatch):
+    monkeypatch.setitem(SCRAPING_CONFIG, 'requests_per_second', 20.0)
+    monkeypatch.setitem(SCRAPING_CONFIG, 'burst', 2)
+    monkeypatch.setitem(SCRAPING_CONFIG, 'concurrency', 8)
+    urls = [url(stub_server, f"/day/{i}") for i in range(12)]
+
+    start = time.monotonic()
+    results = list(fetcher.fetch_pages(urls))
+
+    # In input order, whatever order they finished in
+    assert [u for u, _, _ in results] == urls
+    assert all(error is None for _, _, error in results)
+    # Two banked tokens, then 20 per second for the other ten
+    assert time.monotonic() - start >= 0.45
+
+
+def test_scrape_writes_the_serial_csv(stub_server, workdir, monkeypatch):
+    from pipeline.data_ingestion import COLUMNS, archive_days, parse_archive_page, scrape_medium_articles
+    from pipeline.data_storage import create_database_tables
+    monkeypatch.setitem(SCRAPING_CONFIG, 'requests_per_second', 1000.0)
+    monkeypatch.setitem(SCRAPING_CONFIG, 'burst', 50)
+    create_database_tables.fn()
+    # A few days fail before they succeed
+    for day in ('01/05', '02/29', '12/31'):
+        stub_server.failures[f"/tag/ai/archive/2020/{day}"] = [503, 502]
+
+    csv_path, checkpoints = scrape_medium_articles.fn('ai', 2020, base_url=url(stub_server, '/tag/'))
+
+    # What the serial scraper wrote: every day of the year in calendar order
+    expected = [COLUMNS]
+    for day in archive_days(2020):
+        rows, _ = parse_archive_page(fixture_page(f"/tag/ai/archive/{day:%Y/%m/%d}"), day.strftime('%m/%d/%Y'))
+        expected += [[str(value) for value in row] for row in rows]
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        assert list(csv.reader(f)) == expected
+    # Checkpoints are left to the store step
+    assert [day for day, _, _ in checkpoints] == [day.isoformat() for day in archive_days(2020)]
+
+
+def test_a_failed_refetch_keeps_the_days_checkpoint_and_stored_rows(stub_server, workdir, monkeypatch):
+    from pipeline.data_ingestion import days_to_fetch, scrape_medium_articles
+    from pipeline.data_storage import (create_database_tables, get_connection, get_scrape_checkpoints,
+                                       store_raw_data_to_db)
+    monkeypatch.setitem(SCRAPING_CONFIG, 'requests_per_second', 1000.0)
+    monkeypatch.setitem(SCRAPING_CONFIG, 'burst', 50)
+    create_database_tables.fn()
+    base_url = url(stub_server, '/tag/')
+    csv_path, checkpoints = scrape_medium_articles.fn('ai', 2020, base_url=base_url)
+    store_raw_data_to_db.fn(csv_path, 'ai', checkpoints=checkpoints)
+
+    # Two days were fetched before their claps settled; one of them now fails
+    conn = get_connection()
+    with conn:
+        conn.execute("UPDATE scrape_checkpoints SET fetched_at = date || 'T12:00:00' "
+                     "WHERE date IN ('2020-03-01', '2020-03-02')")
+    day_rows = "SELECT id, title, claps FROM articles WHERE date = '2020-03-01' ORDER BY id"
+    before = conn.execute(day_rows).fetchall()
+    assert before
+    stub_server.failures['/tag/ai/archive/2020/03/01'] = [503] * 10
+
+    csv_path, checkpoints = scrape_medium_articles.fn('ai', 2020, base_url=base_url, refetch_recent=True)
+    store_raw_data_to_db.fn(csv_path, 'ai', checkpoints=checkpoints)
+
+    assert [day for day, _, _ in checkpoints] == ['2020-03-02']
+    fetched = get_scrape_checkpoints('ai', 2020)
+    assert fetched['2020-03-01'].isoformat() == '2020-03-01T12:00:00'
+    assert fetched['2020-03-02'].date() > fetched['2020-03-01'].date()
+    assert conn.execute(day_rows).fetchall() == before
+    # So the next re-fetch tries it again
+    assert [day.isoformat() for day in days_to_fetch('ai', 2020, refetch_recent=True)] == ['2020-03-01']
+    conn.close()
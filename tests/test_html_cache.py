@@ -0,0 +1,40 @@
+"""The on-disk archive page cache: content-addressed blobs, size accounting and eviction."""
+from config import CACHE_CONFIG
+from pipeline import html_cache
+from pipeline.html_cache import _connect, get_page, put_page
+
+
+def cache_total():
+    conn = _connect()
+    try:
+        return (conn.execute("SELECT total FROM cache_size").fetchone()[0],
+                conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0])
+    finally:
+        conn.close()
+
+
+def test_the_running_total_follows_puts_and_evictions(workdir, monkeypatch):
+    put_page('https://example.com/a', '<html>a</html>' * 50)
+    put_page('https://example.com/a', '<html>a</html>' * 50, fetch_date='2030-01-01')
+    put_page('https://example.com/b', '<html>b</html>' * 50)
+    total, summed = cache_total()
+    assert total == summed > 0
+
+    # Room for one blob only: the least recently used one goes
+    monkeypatch.setitem(CACHE_CONFIG, 'max_bytes', total - 1)
+    assert get_page('https://example.com/a') is not None
+    put_page('https://example.com/c', '<html>c</html>' * 50)
+    assert get_page('https://example.com/a') is None
+    assert get_page('https://example.com/c') == '<html>c</html>' * 50
+    total, summed = cache_total()
+    assert total == summed <= CACHE_CONFIG['max_bytes']
+
+
+def test_zstd_blobs_read_as_uncached_without_zstandard(workdir, monkeypatch):
+    put_page('https://example.com/a', '<html>a</html>')
+    conn = _connect()
+    with conn:
+        conn.execute("UPDATE pages SET blob = blob || '.zst'")
+    conn.close()
+    monkeypatch.setattr(html_cache, 'zstandard', None)
+    assert get_page('https://example.com/a') is None
@@ -0,0 +1,95 @@
+import ast
+import glob
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from config import MODEL_CONFIG, TUNING_CONFIG
+from pipeline.data_storage import create_database_tables
+from pipeline.model_files import model_file
+from pipeline.model_training import in_holdout, side_file, train_model_incremental, tune_model
+from pipeline.predictor import EngagementPredictor
+from pipeline.processed_data import processed_path, write_processed
+from pipeline.similarity import SimilarityIndex, min_claps
+
+
+def articles(start, n, seed=0):
+    rng = np.random.default_rng(seed)
+    words = np.array(['data', 'python', 'startup', 'design', 'career', 'money', 'learning', 'life'])
+    return pd.DataFrame({
+        'id': np.arange(start, start + n),
+        'title': [' '.join(rng.choice(words, 4)) for _ in range(n)],
+        'claps': rng.integers(0, 2 * min_claps(), n),
+        'responses': 0, 'author_name': 'a', 'reading_time_mins': 5, 'tag': 'data',
+        'date': '2020-01-01',
+    })
+
+
+def test_sgd_training_indexes_the_high_engagement_titles_of_every_run(workdir):
+    create_database_tables.fn()
+    path = processed_path()
+    first, second = articles(1, 400), articles(401, 400, seed=1)
+    write_processed(first, path, last_id=400)
+    assert train_model_incremental.fn(path) == model_file('sgd')
+    write_processed(second, path, last_id=800, append=True)
+    train_model_incremental.fn(path)
+
+    both = pd.concat([first, second])
+    expected = both.loc[both['claps'] > min_claps(), 'id']
+    assert sorted(SimilarityIndex().ids) == sorted(expected)
+
+
+def test_sgd_evaluation_keeps_a_bounded_holdout_without_rereading_old_parts(workdir, monkeypatch):
+    monkeypatch.setitem(MODEL_CONFIG, 'holdout_sample', 50)
+    create_database_tables.fn()
+    path = processed_path()
+    write_processed(articles(1, 400), path, last_id=400)
+    train_model_incremental.fn(path)
+    # The second run must not need the rows it has already seen
+    for part in glob.glob(os.path.join(path, 'part-*.parquet')):
+        os.remove(part)
+    second = articles(401, 400, seed=1)
+    write_processed(second, path, last_id=800, append=True)
+    train_model_incremental.fn(path)
+
+    holdout = pd.read_parquet(side_file(model_file('sgd'), 'holdout'))
+    assert holdout['id'].tolist() == second.loc[in_holdout(second['id']), 'id'].tail(50).tolist()
+
+
+def test_tuning_saves_the_best_model_and_reuses_fitted_vectorizers(workdir, monkeypatch):
+    monkeypatch.setitem(TUNING_CONFIG, 'param_grid', {'tfidf__min_df': [1, 2], 'clf__C': [0.1, 10.0]})
+    monkeypatch.setitem(TUNING_CONFIG, 'cv_folds', 2)
+    monkeypatch.setitem(TUNING_CONFIG, 'n_jobs', 1)
+    fits = []
+    fit_transform = TfidfVectorizer.fit_transform
+    monkeypatch.setattr(TfidfVectorizer, 'fit_transform',
+                        lambda self, *args, **kwargs: fits.append(self) or fit_transform(self, *args, **kwargs))
+    create_database_tables.fn()
+    path = processed_path()
+    write_processed(articles(1, 400), path, last_id=400)
+
+    model_path = tune_model.fn(path)
+    assert model_path == model_file('tuned')
+    # One vectorizer per min_df and fold, plus the refit, whatever C is
+    assert len(fits) == 2 * 2 + 1
+    results = pd.read_csv(os.path.join('models', 'tuning_results.csv'))
+    assert len(results) == 4
+    best = ast.literal_eval(results.loc[results['rank_test_score'].idxmin(), 'params'])
+    pipeline = joblib.load(model_path)
+    params = pipeline.get_params()
+    assert {k: params[k] for k in best} == best
+    assert params['memory'] is None
+
+    # What the predictor and the service load: the compact copy, scoring as the pipeline does
+    titles = ['learning python', 'money life', 'startup career design']
+    scored = EngagementPredictor(model_path).predict_batch(titles)
+    np.testing.assert_allclose([p for _, p in scored], pipeline.predict_proba(titles)[:, 1], atol=1e-6)
+
+    # A second search over the same titles fits no vectorizer again
+    fits.clear()
+    tune_model.fn(path)
+    assert fits == []
@@ -0,0 +1,98 @@
+"""EngagementPredictor batching and caching, and the MicroBatcher that coalesces concurrent requests."""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import joblib
+import numpy as np
+import pytest
+
+from pipeline.model_training import make_tfidf_pipeline
+from pipeline.predictor import EngagementPredictor, MicroBatcher
+
+TITLES = ['How AI is transforming business', 'My morning routine', 'Python tips for data science',
+          'Why startups fail', 'A letter to my younger self', 'Deep learning, explained!']
+
+
+@pytest.fixture
+def predictor(tmp_path):
+    rng = np.random.default_rng(0)
+    titles = [' '.join(rng.choice(' '.join(TITLES).lower().split(), 4)) for _ in range(200)]
+    pipeline = make_tfidf_pipeline().fit(titles, rng.integers(0, 2, len(titles)))
+    path = tmp_path / 'model.pkl'
+    joblib.dump(pipeline, path)
+    return EngagementPredictor(str(path), cache_size=0)
+
+
+class CountingModel:
+    """Stands in for a fitted pipeline, recording each predict_proba batch"""
+
+    classes_ = np.array([0, 1])
+
+    def __init__(self):
+        self.calls = []
+
+    def predict_proba(self, titles):
+        self.calls.append(list(titles))
+        p = np.array([len(t) % 10 / 10 for t in titles])
+        return np.column_stack([1 - p, p])
+
+
+def test_predict_batch_matches_predict_row_by_row(predictor):
+    batch = predictor.predict_batch(TITLES)
+    assert batch == [predictor.predict(t) for t in TITLES]
+    proba = predictor.model.predict_proba(TITLES)
+    assert [p for _, p in batch] == pytest.approx(proba[:, 1].tolist())
+    assert [label for label, _ in batch] == predictor.model.predict(TITLES).tolist()
+
+
+def test_cached_titles_are_not_scored_again_and_the_oldest_is_evicted(predictor):
+    predictor.model, predictor.cache_size = CountingModel(), 2
+    first = predictor.predict('Why startups fail')
+    # Same text once normalised: a cache hit
+    assert predictor.predict('why   Startups FAIL!') == first
+    assert len(predictor.model.calls) == 1
+
+    predictor.predict_batch(['My morning routine', 'Python tips'])
+    predictor.predict('Why startups fail')
+    assert len(predictor.model.calls) == 3
+
+
+def test_concurrent_submissions_are_coalesced_and_each_caller_gets_its_own_rows(predictor):
+    model = predictor.model = CountingModel()
+    requests = [[f"title {i} {j}" for j in range(i % 3 + 1)] for i in range(20)]
+    # The batch fills exactly once every request is in, well before the deadline
+    batcher = MicroBatcher(predictor, max_batch=sum(map(len, requests)), max_wait_ms=5000)
+    with ThreadPoolExecutor(8) as pool:
+        futures = list(pool.map(batcher.submit, requests))
+    results = [future.result(timeout=5) for future in futures]
+
+    assert len(model.calls) == 1
+    assert sorted(model.calls[0]) == sorted(t for titles in requests for t in titles)
+    for titles, result in zip(requests, results):
+        assert result == [predictor.predict(t) for t in titles]
+
+
+def test_a_batch_that_never_fills_is_scored_at_the_deadline(predictor):
+    predictor.model = CountingModel()
+    batcher = MicroBatcher(predictor, max_batch=1000, max_wait_ms=20)
+    assert batcher.submit(['Why startups fail']).result(timeout=5) == [predictor.predict('Why startups fail')]
+
+
+def test_a_failed_batch_fails_each_of_its_callers_and_the_next_batch_still_runs(predictor):
+    predictor.model = CountingModel()
+    score, failing = predictor.predict_batch, threading.Event()
+    failing.set()
+
+    def predict_batch(titles):
+        if failing.is_set():
+            failing.clear()
+            raise RuntimeError('model unavailable')
+        return score(titles)
+
+    predictor.predict_batch = predict_batch
+    batcher = MicroBatcher(predictor, max_batch=2, max_wait_ms=200)
+    failed = [batcher.submit(['a']), batcher.submit(['b'])]
+    for future in failed:
+        with pytest.raises(RuntimeError, match='model unavailable'):
+            future.result(timeout=5)
+    assert batcher.submit(['c']).result(timeout=5) == [score(['c'])[0]]
@@ -0,0 +1,63 @@
+"""Rollup features: computed from training rows only, never from a row's own
+claps, and joined from the stored rollups when the rollup model scores articles."""
+import joblib
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import synthetic_raw
+from config import MODEL_CONFIG
+from pipeline.batch_scoring import score_articles
+from pipeline.data_storage import create_database_tables, get_connection, store_raw_data_to_db
+from pipeline.data_transformation import transform_new_articles
+from pipeline.model_files import model_file, model_version
+from pipeline.model_training import train_model
+from pipeline.rollups import FEATURE_COLUMNS, out_of_fold_features, rollup_features
+
+
+def articles(n=600, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'author_name': [f"Writer {a}" for a in rng.integers(0, 40, n)],
+        'tag': rng.choice(['ai', 'business'], n),
+        'date': pd.to_datetime('2020-01-01') + pd.to_timedelta(rng.integers(0, 700, n), unit='D'),
+        'claps': np.floor(rng.pareto(1.1, n) * 200),
+        'responses': 0,
+        'reading_time_mins': rng.integers(1, 20, n),
+    })
+
+
+def test_features_ignore_each_rows_own_claps_and_the_test_split():
+    df = articles()
+    train_idx, test_idx = np.arange(480), np.arange(480, 600)
+    features = out_of_fold_features(df, train_idx)
+    assert list(features.columns) == FEATURE_COLUMNS
+    assert features.notna().all().all()
+
+    # Flipping one training row's label, or every test row's, leaves that row's features alone
+    flipped = df.copy()
+    flipped.loc[7, 'claps'] = 0 if df.loc[7, 'claps'] > 500 else 10_000
+    pd.testing.assert_series_equal(features.loc[7], out_of_fold_features(flipped, train_idx).loc[7])
+    flipped = df.copy()
+    flipped.loc[test_idx, 'claps'] = 10_000
+    pd.testing.assert_frame_equal(features, out_of_fold_features(flipped, train_idx))
+
+
+def test_the_rollup_model_scores_stored_articles_from_the_stored_rollups(workdir, monkeypatch):
+    monkeypatch.setitem(MODEL_CONFIG, 'rollup_features', True)
+    create_database_tables.fn()
+    synthetic_raw(400, seed=3).to_csv('raw.csv', index=False)
+    store_raw_data_to_db.fn('raw.csv', 'ai')
+
+    model_path = train_model.fn(transform_new_articles.fn())
+    assert model_path == model_file('rollup')
+    assert score_articles.fn(model_path, workers=1) > 0
+
+    conn = get_connection()
+    articles = pd.read_sql("SELECT id, title, author_name, tag, date, reading_time_mins FROM articles ORDER BY id", conn)
+    stored = pd.read_sql("SELECT article_id, probability FROM predictions WHERE model_version = ? ORDER BY article_id",
+                         conn, params=(model_version(model_path),))
+    frame = pd.concat([articles['title'].fillna(''), rollup_features(conn, articles)], axis=1)
+    conn.close()
+    expected = joblib.load(model_path).predict_proba(frame)[:, 1]
+    assert stored['article_id'].tolist() == articles['id'].tolist()
+    np.testing.assert_allclose(stored['probability'], expected, atol=1e-6)
@@ -0,0 +1,68 @@
+import logging
+
+from pipeline.data_storage import create_database_tables
+from pipeline.stage_cache import fingerprint, run_cached
+
+logger = logging.getLogger(__name__)
+
+
+class Stage:
+    """A stage that writes `out.txt` and counts its runs"""
+
+    def __init__(self, path):
+        self.path, self.runs = str(path), 0
+
+    def __call__(self):
+        self.runs += 1
+        with open(self.path, 'w') as f:
+            f.write(str(self.runs))
+        return self.path
+
+
+def test_same_fingerprint_skips_the_stage(workdir):
+    create_database_tables.fn()
+    stage = Stage(workdir / 'out.txt')
+    key = fingerprint('articles', {'chunk_size': 10})
+
+    assert run_cached(logger, 'transform', key, stage) == stage.path
+    assert run_cached(logger, 'transform', key, stage) == stage.path
+    assert stage.runs == 1
+
+
+def test_changed_fingerprint_reruns_the_stage(workdir):
+    create_database_tables.fn()
+    stage = Stage(workdir / 'out.txt')
+
+    run_cached(logger, 'transform', fingerprint('articles', False), stage)
+    # e.g. the same articles transformed incrementally instead of in full
+    run_cached(logger, 'transform', fingerprint('articles', True), stage)
+    assert stage.runs == 2
+    # Only the last run is remembered
+    run_cached(logger, 'transform', fingerprint('articles', False), stage)
+    assert stage.runs == 3
+
+
+def test_force_and_changed_output_rerun_the_stage(workdir):
+    create_database_tables.fn()
+    stage = Stage(workdir / 'out.txt')
+    key = fingerprint('articles')
+
+    run_cached(logger, 'transform', key, stage)
+    run_cached(logger, 'transform', key, stage, force=True)
+    assert stage.runs == 2
+    # An output edited or removed since it was recorded is not reused
+    (workdir / 'out.txt').unlink()
+    run_cached(logger, 'transform', key, stage)
+    assert stage.runs == 3
+    assert run_cached(logger, 'transform', key, stage) == stage.path
+    assert stage.runs == 3
+
+
+def test_failed_stage_is_not_cached(workdir):
+    create_database_tables.fn()
+    stage = Stage(workdir / 'out.txt')
+    key = fingerprint('articles')
+
+    assert run_cached(logger, 'transform', key, lambda: None) is None
+    run_cached(logger, 'transform', key, stage)
+    assert stage.runs == 1
@@ -0,0 +1,29 @@
+from pipeline.data_storage import create_database_tables, get_connection
+from pipeline.telemetry import mark_run, pipeline_run
+
+
+def run_statuses():
+    conn = get_connection()
+    try:
+        return [status for status, in conn.execute("SELECT status FROM pipeline_runs ORDER BY id")]
+    finally:
+        conn.close()
+
+
+def test_runs_that_return_early_are_not_recorded_as_completed(workdir):
+    create_database_tables.fn()
+    with pipeline_run({}):
+        pass
+    with pipeline_run({}):
+        mark_run('skipped')
+        # A later failure doesn't hide why the run stopped first
+        mark_run('failed')
+    with pipeline_run({}):
+        mark_run('failed')
+    try:
+        with pipeline_run({}):
+            raise RuntimeError
+    except RuntimeError:
+        pass
+
+    assert run_statuses() == ['completed', 'skipped', 'failed', 'failed']